@@ -10,6 +10,7 @@ if project_home not in sys.path:
 
 from app import create_app, db
 from app.models import User
+from app.services.analytics_service import record_new_users
 
 # Create an app instance to work with the database.
 app = create_app()
@@ -26,6 +27,9 @@ with app.app_context():
         print(f"Admin user with email '{admin_email}' already exists.")
         print("Updating password and ensuring admin status is set correctly.")
         existing_admin.password = generate_password_hash(admin_password)
+        if not existing_admin.is_admin:
+            # Admins are not counted in the user analytics
+            record_new_users([existing_admin.created_at], delta=-1)
         existing_admin.is_admin = True
         if not existing_admin.first_name:
             existing_admin.first_name = "Admin"
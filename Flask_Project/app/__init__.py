@@ -1,21 +1,55 @@
 
-from flask import Flask, jsonify, render_template_string, request
-from .extensions import db, cors
+from flask import Flask, Response, jsonify, render_template_string, request
+from .extensions import db, cors, tracking_cache, count_cache, event_bus
 from .auth.routes import auth_bp
 from .shipments.routes import shipments_bp
 from .admin.routes import admin_bp
 from .domestic.routes import domestic_bp
 from .international.routes import international_bp
+from .services.search_service import search_index
+from .services.export_jobs import export_jobs
+from .services.parallel_queries import parallel_queries
+from .services.table_versions import install_table_versions
+from .db_profile import engine_options, install_statement_timeouts
+from .transactions import install_transaction_hooks
+from .db_routing import READ_AFTER_HEADER, REPLICA_BIND_KEY, pin_after_writes
+from .warmup import prime_pool, warm_up
+from .instrumentation import install_request_metrics, query_budget
+from .metrics import render_latest
+from prometheus_client import CONTENT_TYPE_LATEST
 from config import config
 
 def create_app(env="development"):
     app = Flask(__name__)
     app.config.from_object(config[env])
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        **engine_options(app.config),
+        **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+    }
+    replica_url = app.config.get("DATABASE_REPLICA_URL")
+    if replica_url:
+        app.config["SQLALCHEMY_BINDS"] = {
+            **app.config.get("SQLALCHEMY_BINDS", {}),
+            REPLICA_BIND_KEY: {"url": replica_url, **engine_options({**app.config, "SQLALCHEMY_DATABASE_URI": replica_url})}
+        }
 
     db.init_app(app)
-    cors.init_app(app, origins=app.config.get("CORS_ORIGINS", "*"), supports_credentials=True)
+    install_statement_timeouts(db)
+    install_transaction_hooks(db)
+    install_table_versions(db)
+    install_request_metrics(app)
+    app.after_request(pin_after_writes)
+    cors.init_app(app, origins=app.config.get("CORS_ORIGINS", "*"), supports_credentials=True,
+                  expose_headers=[READ_AFTER_HEADER])
+    tracking_cache.init_app(app)
+    count_cache.init_app(app)
+    event_bus.init_app(app)
+    search_index.init_app(app)
+    export_jobs.init_app(app)
+    parallel_queries.init_app(app)
 
     @app.route("/")
+    @query_budget(0)
     def index():
         return render_template_string("""
         <!DOCTYPE html>
@@ -83,7 +117,30 @@ def create_app(env="development"):
         </html>
         """)
 
+    @app.route("/healthz", methods=["GET"])
+    @query_budget(0)
+    def healthz():
+        # Liveness only: the process is up and serving; no database round trip
+        return jsonify({"status": "ok"}), 200
+
+    @app.route("/readyz", methods=["GET"])
+    @query_budget(3)
+    def readyz():
+        state = app.extensions.setdefault("warmup", {"ready": False})
+        if not state["ready"]:
+            # Warmup skipped or the database was unreachable; try again
+            state["ready"] = prime_pool(app)
+        if not state["ready"]:
+            return jsonify({"status": "warming up"}), 503
+        return jsonify({"status": "ready", "rate_cards": state.get("rate_cards", False)}), 200
+
+    @app.route("/metrics", methods=["GET"])
+    @query_budget(0)
+    def metrics():
+        return Response(render_latest(), mimetype=CONTENT_TYPE_LATEST)
+
     @app.route("/api/company-details", methods=["GET"])
+    @query_budget(0)
     def company_details():
         details = {
           "rs_swift": {
@@ -113,6 +170,7 @@ def create_app(env="development"):
 
 
     @app.route("/api/destination-suggestion", methods=["POST"])
+    @query_budget(0)
     def destination_suggestion():
         data = request.get_json()
         amount = data.get("amount")
@@ -163,4 +221,7 @@ def create_app(env="development"):
     def not_found(err):
         return jsonify({"error": "Not found"}), 404
 
+    if app.config.get("WARMUP_ON_START", True):
+        warm_up(app)
+
     return app
@@ -1,182 +1,229 @@
 
-from flask import Blueprint, request, jsonify, make_response
-from app.models import Shipment, User, PaymentRequest
-from app.extensions import db
-from sqlalchemy import or_, func
-from datetime import datetime, timedelta
-import csv
-from io import StringIO
+from flask import Blueprint, Response, current_app, g, request, jsonify, send_file, stream_with_context
+from app.models import Shipment, User, PaymentRequest, ExportJob, PAID_SHIPMENT_STATUSES, SHIPMENT_STATUSES
+from app.extensions import db, count_cache
+from app.services.tracking_service import notify_shipment_changed
+from app.services.hub_scan_service import ingest_scans
+from app.services.payment_service import decide_payments, notify_booked
+from app.services.reconciliation_service import parse_statement, reconcile_pending_payments
+from app.services.desktop_sync_service import upgrade_placeholder_user
+from app.services.count_service import count_rows, total_pages
+from app.services.admin_filters import (
+    SHIPMENT_FILTER_KEYS, USER_FILTER_KEYS, filter_shipments, filter_signature, filter_users, parse_date_range
+)
+from app.services.export_service import export_filename, iter_export
+from app.services.export_jobs import ACTIVE_STATUSES, built_on_this_host, export_jobs, serialize_export_job
+from app.services.parallel_queries import parallel_queries
+from app.services.change_feed import change_feed_page
+from app.services.conditional_get import conditional, validator_state
+from app.services.table_versions import table_versions
+from app.db_routing import read_replica
+from app.instrumentation import query_budget
+from app.services.analytics_service import (
+    LANE_GROUPS, LANE_SORTS, SHIPMENT_GROUPS, record_status_changes, rollup_totals, shipment_breakdown, top_lanes,
+    user_breakdown
+)
+from app.schemas import signup_schema
+from sqlalchemy import case, func
+from datetime import datetime
+import json
+import os
+from io import TextIOWrapper
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/api/admin")
 
+def _shipment_facets(args):
+    """
+    Per-status and per-service-type counts for the current search/date filter,
+    from one grouped query. Status counts ignore the status filter so every tab
+    shows its own total; service type counts honour it.
+    """
+    signature = (filter_signature("shipment_facets", args, SHIPMENT_FILTER_KEYS), validator_state())
+    hit, facets = count_cache.get(signature)
+    if hit:
+        return facets
+
+    query = filter_shipments(db.session.query(Shipment), args, include_status=False)
+    rows = query.with_entities(
+        Shipment.status,
+        Shipment.service_type,
+        func.count(Shipment.id)
+    ).group_by(Shipment.status, Shipment.service_type).all()
+
+    status_filter = args.get("status")
+    facets = {"status": {}, "service_type": {}}
+    for status, service_type, count in rows:
+        facets["status"][status] = facets["status"].get(status, 0) + count
+        if not status_filter or status == status_filter:
+            facets["service_type"][service_type] = facets["service_type"].get(service_type, 0) + count
+
+    count_cache.set(signature, facets)
+    return facets
+
+def _serialize_shipment_summary(s):
+    return {
+        "id": s.id,
+        "shipment_id_str": s.shipment_id_str,
+        "sender_name": s.sender_name,
+        "receiver_name": s.receiver_name,
+        "receiver_address_city": s.receiver_address_city,
+        "service_type": s.service_type,
+        "package_weight_kg": float(s.package_weight_kg),
+        "booking_date": s.booking_date.isoformat(),
+        "status": s.status,
+        "price_without_tax": float(s.price_without_tax),
+        "tax_amount_18_percent": float(s.tax_amount_18_percent),
+        "total_with_tax_18_percent": float(s.total_with_tax_18_percent),
+    }
+
+def _shipments_marker():
+    return table_versions("shipments")
+
+def _payments_marker():
+    # Payment rows show the customer's name, so user edits change the list too
+    return table_versions("payment_requests", "users")
+
+def _users_marker():
+    # User rows carry shipment stats, so shipment changes change the list too
+    return table_versions("users", "shipments")
+
 @admin_bp.route("/shipments", methods=["GET"])
+@query_budget(6)
+@read_replica
+@conditional(_shipments_marker)
 def get_all_shipments():
     page = int(request.args.get("page", 1))
     limit = int(request.args.get("limit", 10))
-    status = request.args.get("status")
-    q = request.args.get("q")
-    start_date = request.args.get("start_date")
-    end_date = request.args.get("end_date")
-    query = Shipment.query
-
-    if status:
-        query = query.filter_by(status=status)
-    if q:
-        like_q = f"%{q}%"
-        query = query.filter(
-            or_(
-                Shipment.shipment_id_str.ilike(like_q),
-                Shipment.sender_name.ilike(like_q),
-                Shipment.receiver_name.ilike(like_q)
-            )
-        )
-
-    # Date filtering
-    if start_date:
-        try:
-            start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            query = query.filter(Shipment.booking_date >= start_dt)
-        except ValueError:
-            return jsonify({"error": "Invalid start_date format. Use ISO format (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)"}), 400
-
-    if end_date:
-        try:
-            end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            # Add one day to include the entire end date
-            end_dt = end_dt + timedelta(days=1)
-            query = query.filter(Shipment.booking_date < end_dt)
-        except ValueError:
-            return jsonify({"error": "Invalid end_date format. Use ISO format (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)"}), 400
-
-    total_count = query.count()
-    pagination = query.order_by(Shipment.booking_date.desc()).paginate(page=page, per_page=limit, error_out=False)
+    try:
+        query = filter_shipments(Shipment.query, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    total_count, count_is_estimate = count_rows(
+        query,
+        filter_signature("shipments", request.args, SHIPMENT_FILTER_KEYS),
+        Shipment.__tablename__,
+        filtered=any(request.args.get(key) for key in SHIPMENT_FILTER_KEYS)
+    )
+    # The total comes from count_rows, so skip paginate()'s own COUNT
+    pagination = query.order_by(Shipment.booking_date.desc()).paginate(page=page, per_page=limit, error_out=False, count=False)
     shipments = pagination.items
 
-    result = []
-    for s in shipments:
-        result.append({
-            "id": s.id,
-            "shipment_id_str": s.shipment_id_str,
-            "sender_name": s.sender_name,
-            "receiver_name": s.receiver_name,
-            "receiver_address_city": s.receiver_address_city,
-            "service_type": s.service_type,
-            "package_weight_kg": float(s.package_weight_kg),
-            "booking_date": s.booking_date.isoformat(),
-            "status": s.status,
-            "price_without_tax": float(s.price_without_tax),
-            "tax_amount_18_percent": float(s.tax_amount_18_percent),
-            "total_with_tax_18_percent": float(s.total_with_tax_18_percent),
-        })
-    return jsonify({
+    result = [_serialize_shipment_summary(s) for s in shipments]
+    response = {
         "shipments": result,
-        "totalPages": pagination.pages or 1,
+        "totalPages": total_pages(total_count, limit),
         "currentPage": page,
-        "totalCount": total_count
-    }), 200
+        "totalCount": total_count,
+        "totalCountIsEstimate": count_is_estimate
+    }
+    if request.args.get("facets", "").lower() in ("1", "true", "yes"):
+        response["facets"] = _shipment_facets(request.args)
+    return jsonify(response), 200
+
+def _stream_export(kind):
+    """
+    Streams a CSV export built from the request's filters. Pass ?gzip=true to
+    download it gzip-compressed.
+    """
+    try:
+        parse_date_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    compress = request.args.get("gzip", "").lower() in ("1", "true", "yes")
+    chunk_size = current_app.config.get("EXPORT_CHUNK_SIZE", 1000)
+    chunks = iter_export(kind, request.args.to_dict(), chunk_size=chunk_size, compress=compress)
+
+    response = Response(stream_with_context(chunks), mimetype="application/gzip" if compress else "text/csv")
+    response.headers["Content-Disposition"] = f"attachment; filename={export_filename(kind, compress)}"
+    return response
 
 @admin_bp.route("/shipments/export", methods=["GET"])
+@query_budget(2)
+@read_replica
 def export_shipments_csv():
-    status = request.args.get("status")
-    q = request.args.get("q")
-    start_date = request.args.get("start_date")
-    end_date = request.args.get("end_date")
-    query = Shipment.query
-
-    # Apply same filters as get_all_shipments
-    if status:
-        query = query.filter_by(status=status)
-    if q:
-        like_q = f"%{q}%"
-        query = query.filter(
-            or_(
-                Shipment.shipment_id_str.ilike(like_q),
-                Shipment.sender_name.ilike(like_q),
-                Shipment.receiver_name.ilike(like_q)
-            )
-        )
-
-    # Date filtering
-    if start_date:
-        try:
-            start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
-            query = query.filter(Shipment.booking_date >= start_dt)
-        except ValueError:
-            return jsonify({"error": "Invalid start_date format. Use ISO format (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)"}), 400
-
-    if end_date:
-        try:
-            end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
-            end_dt = end_dt + timedelta(days=1)
-            query = query.filter(Shipment.booking_date < end_dt)
-        except ValueError:
-            return jsonify({"error": "Invalid end_date format. Use ISO format (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)"}), 400
-
-    # Get all shipments (no pagination for export)
-    shipments = query.order_by(Shipment.booking_date.desc()).all()
-
-    # Create CSV
-    si = StringIO()
-    writer = csv.writer(si)
-
-    # Write headers
-    writer.writerow([
-        "Order #",
-        "Type",
-        "Sender",
-        "Sender City",
-        "Receiver",
-        "Receiver City",
-        "Weight (kg)",
-        "Date",
-        "Price (excl. tax)",
-        "Tax (18%)",
-        "Total Amount",
-        "Status"
-    ])
-
-    # Write data rows
-    for s in shipments:
-        writer.writerow([
-            s.shipment_id_str,
-            s.service_type,
-            s.sender_name,
-            s.sender_address_city,
-            s.receiver_name,
-            s.receiver_address_city,
-            float(s.package_weight_kg),
-            s.booking_date.strftime('%Y-%m-%d %H:%M'),
-            float(s.price_without_tax),
-            float(s.tax_amount_18_percent),
-            float(s.total_with_tax_18_percent),
-            s.status
-        ])
-
-    output = si.getvalue()
-    si.close()
-
-    # Create response
-    response = make_response(output)
-    response.headers["Content-Disposition"] = f"attachment; filename=orders_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-    response.headers["Content-Type"] = "text/csv"
-
-    return response
+    return _stream_export("shipments")
+
+@admin_bp.route("/payments/export", methods=["GET"])
+@query_budget(2)
+@read_replica
+def export_payments_csv():
+    return _stream_export("payments")
+
+@admin_bp.route("/users/export", methods=["GET"])
+@query_budget(2)
+@read_replica
+def export_users_csv():
+    return _stream_export("users")
+
+@admin_bp.route("/exports", methods=["POST"])
+@query_budget(10)
+def create_export_job():
+    """
+    Queues a background export ({kind, filters, gzip}) and returns its job.
+    An identical export that is already queued or running is returned instead.
+    """
+    data = request.get_json() or {}
+    try:
+        job, created = export_jobs.submit(data.get("kind"), data.get("filters") or {}, bool(data.get("gzip")))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify(serialize_export_job(job)), 202 if created else 200
+
+@admin_bp.route("/exports/<job_id>", methods=["GET"])
+@query_budget(8)
+def get_export_job(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if not job:
+        return jsonify({"error": "Export job not found"}), 404
+    if job.status in ACTIVE_STATUSES and export_jobs.expire_stale():
+        db.session.refresh(job)
+    return jsonify(serialize_export_job(job)), 200
+
+@admin_bp.route("/exports/<job_id>/download", methods=["GET"])
+@query_budget(3)
+def download_export_job(job_id):
+    job = db.session.get(ExportJob, job_id)
+    if not job:
+        return jsonify({"error": "Export job not found"}), 404
+    if job.status != 'completed':
+        return jsonify({"error": f"Export is {job.status}"}), 409
+    if not job.file_path or not os.path.exists(job.file_path):
+        if not built_on_this_host(job):
+            # EXPORT_DIR is local disk; the file is on the host that built it
+            return jsonify({"error": "Export file is stored on another server"}), 404
+        return jsonify({"error": "Export file is no longer available"}), 410
+
+    # conditional=True adds ETag/Last-Modified and HTTP Range support
+    return send_file(
+        job.file_path,
+        mimetype="application/gzip" if job.compress else "text/csv",
+        as_attachment=True,
+        download_name=export_filename(job.kind, job.compress, job.created_at),
+        conditional=True,
+        max_age=0
+    )
 
 @admin_bp.route("/shipments/<shipment_id_str>/status", methods=["PUT"])
+@query_budget(8)
 def update_shipment_status(shipment_id_str):
     data = request.get_json()
     new_status = data.get("status")
     location = data.get("location")
     activity = data.get("activity")
 
-    valid_statuses = ['Booked', 'In Transit', 'Out for Delivery', 'Delivered', 'Cancelled']
-    if not new_status or new_status not in valid_statuses:
+    if not new_status or new_status not in SHIPMENT_STATUSES:
         return jsonify({"error": "Invalid or missing status"}), 400
 
-    shipment = Shipment.query.filter_by(shipment_id_str=shipment_id_str).first()
+    # Locked so the status we move away from is still current when the rollups are adjusted
+    shipment = Shipment.query.filter_by(shipment_id_str=shipment_id_str).with_for_update().first()
     if not shipment:
         return jsonify({"error": "Shipment not found"}), 404
 
+    record_status_changes([(shipment.booking_date, shipment.service_type, shipment.total_with_tax_18_percent,
+                            shipment.status, new_status)])
     shipment.status = new_status
     entry = {
         "stage": new_status,
@@ -184,9 +231,9 @@ def update_shipment_status(shipment_id_str):
         "location": location or "",
         "activity": activity or f"Status updated to {new_status}",
     }
-    history = shipment.tracking_history or []
-    history.append(entry)
-    shipment.tracking_history = history
+    # Assign a new list so SQLAlchemy sees the JSONB column as modified
+    shipment.tracking_history = list(shipment.tracking_history or []) + [entry]
+    notify_shipment_changed(shipment.shipment_id_str, shipment.user_email, shipment.status, entry)
     db.session.commit()
 
     return jsonify({
@@ -198,21 +245,154 @@ def update_shipment_status(shipment_id_str):
         }
     }), 200
 
-@admin_bp.route("/web_analytics", methods=["GET"])
-def web_analytics():
-    total_orders = db.session.query(func.count(Shipment.id)).scalar() or 0
-    total_revenue = db.session.query(func.coalesce(func.sum(Shipment.total_with_tax_18_percent), 0)).scalar() or 0.0
-    total_users = db.session.query(func.count(User.id)).filter(User.is_admin == False).scalar() or 0
+@admin_bp.route("/scans", methods=["POST"])
+# The body runs the same few statements once per micro-batch
+@query_budget(None, max_repeats=False)
+def ingest_hub_scans():
+    """
+    Accepts NDJSON hub-scan events ({shipment_id_str, status, location, ts}) and
+    streams back one NDJSON outcome per event, applying them in micro-batches.
+    Outcomes are "applied", "rejected" (bad event, resending it will not help) or
+    "error" (its batch could not be saved; it can be resent).
+    """
+    batch_size = current_app.config.get("HUB_SCAN_BATCH_SIZE", 200)
+    # The batches are written while the body streams, after pin_after_writes has run
+    g.db_wrote = True
+
+    def generate():
+        totals = {"applied": 0, "rejected": 0, "error": 0}
+        for outcome in ingest_scans(request.stream, batch_size):
+            totals[outcome["result"]] += 1
+            yield json.dumps(outcome) + "\n"
+        yield json.dumps({"done": True, "applied": totals["applied"], "rejected": totals["rejected"],
+                          "failed": totals["error"]}) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+def _headline_analytics():
+    # Read from the daily rollups, so the cost does not grow with the shipments table
+    total_orders, total_revenue, total_users = rollup_totals()
     avg_revenue = (total_revenue / total_orders) if total_orders > 0 else 0.0
-
-    return jsonify({
+    return {
         "total_orders": total_orders,
         "total_revenue": float(total_revenue),
         "avg_revenue": float(avg_revenue),
         "total_users": total_users
+    }
+
+@admin_bp.route("/web_analytics", methods=["GET"])
+@query_budget(4)
+@read_replica
+def web_analytics():
+    return jsonify(_headline_analytics()), 200
+
+@admin_bp.route("/dashboard", methods=["GET"])
+@query_budget(8)
+@read_replica
+def dashboard():
+    """
+    Everything the admin dashboard shows on load in one response: headline
+    analytics, the latest shipments, the pending payment count and recent users.
+    The four queries are independent and run concurrently on separate connections.
+    """
+    limit = min(max(int(request.args.get("limit", 5)), 1), 50)
+
+    def latest_shipments():
+        shipments = Shipment.query.order_by(Shipment.booking_date.desc()).limit(limit).all()
+        return [_serialize_shipment_summary(s) for s in shipments]
+
+    def pending_payments():
+        return db.session.query(func.count(PaymentRequest.id)).filter(PaymentRequest.status == 'Pending').scalar()
+
+    def recent_users():
+        users = User.query.filter(User.is_admin == False).order_by(User.created_at.desc()).limit(limit).all()
+        return [{
+            "id": user.id,
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "email": user.email,
+            "is_placeholder": user.is_placeholder,
+            "created_at": user.created_at.isoformat(),
+        } for user in users]
+
+    return jsonify(parallel_queries.run(
+        analytics=_headline_analytics,
+        latest_shipments=latest_shipments,
+        pending_payments_count=pending_payments,
+        recent_users=recent_users
+    )), 200
+
+@admin_bp.route("/analytics/shipments", methods=["GET"])
+@query_budget(3)
+@read_replica
+def shipment_analytics():
+    """
+    Orders and revenue for a date range from the daily rollups.
+    ``group_by`` is a comma-separated list of day|week|month, status and service_type.
+    """
+    group_by = [g for g in request.args.get("group_by", "day").split(",") if g]
+    if not group_by or any(g not in SHIPMENT_GROUPS for g in group_by) or len(set(group_by)) != len(group_by):
+        return jsonify({"error": f"group_by must be a comma-separated list of: {', '.join(SHIPMENT_GROUPS)}"}), 400
+    if sum(g in ("day", "week", "month") for g in group_by) > 1:
+        return jsonify({"error": "Use only one of day, week or month in group_by"}), 400
+    try:
+        start_dt, end_dt = parse_date_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "group_by": group_by,
+        "results": shipment_breakdown(start_dt, end_dt, group_by)
+    }), 200
+
+@admin_bp.route("/analytics/users", methods=["GET"])
+@query_budget(3)
+@read_replica
+def user_analytics():
+    """New users per day, week or month (``interval``) for a date range, from the daily rollups."""
+    interval = request.args.get("interval", "day")
+    if interval not in ("day", "week", "month"):
+        return jsonify({"error": "interval must be day, week or month"}), 400
+    try:
+        start_dt, end_dt = parse_date_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "interval": interval,
+        "results": user_breakdown(start_dt, end_dt, interval)
+    }), 200
+
+@admin_bp.route("/analytics/lanes", methods=["GET"])
+@query_budget(3)
+@read_replica
+def lane_analytics():
+    """
+    Top lanes (``group_by=lane``) or destination countries (``group_by=country``) for a
+    date range, ranked by ``sort`` (shipments or revenue), from the lane rollups.
+    """
+    group_by = request.args.get("group_by", "lane")
+    sort = request.args.get("sort", "shipments")
+    if group_by not in LANE_GROUPS:
+        return jsonify({"error": f"group_by must be one of: {', '.join(LANE_GROUPS)}"}), 400
+    if sort not in LANE_SORTS:
+        return jsonify({"error": f"sort must be one of: {', '.join(LANE_SORTS)}"}), 400
+    limit = min(max(int(request.args.get("limit", 10)), 1), 100)
+    try:
+        start_dt, end_dt = parse_date_range(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({
+        "group_by": group_by,
+        "sort": sort,
+        "results": top_lanes(start_dt, end_dt, group_by, sort, limit)
     }), 200
 
 @admin_bp.route("/payments", methods=["GET"])
+@query_budget(6)
+@read_replica
+@conditional(_payments_marker)
 def get_payments():
     payments_query = db.session.query(
         PaymentRequest,
@@ -239,7 +419,58 @@ def get_payments():
         })
     return jsonify(result), 200
 
+@admin_bp.route("/shipments/changes", methods=["GET"])
+@query_budget(3)
+def shipment_changes():
+    """Shipments created or changed since ``cursor``, oldest first."""
+    def serialize(s):
+        return {**_serialize_shipment_summary(s), "updated_at": s.updated_at.isoformat()}
+
+    try:
+        return jsonify(change_feed_page(Shipment.query, Shipment, request.args, serialize)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+@admin_bp.route("/payments/changes", methods=["GET"])
+@query_budget(3)
+def payment_changes():
+    """Payment requests created or changed since ``cursor``, oldest first (e.g. to pick up new UTRs)."""
+    query = db.session.query(
+        PaymentRequest.id,
+        PaymentRequest.amount,
+        PaymentRequest.utr,
+        PaymentRequest.status,
+        PaymentRequest.created_at,
+        PaymentRequest.updated_at,
+        User.first_name,
+        User.last_name,
+        Shipment.shipment_id_str
+    ).join(
+        User, PaymentRequest.user_id == User.id
+    ).join(
+        Shipment, PaymentRequest.shipment_id == Shipment.id
+    )
+
+    def serialize(p):
+        return {
+            "id": p.id,
+            "order_id": p.shipment_id_str,
+            "first_name": p.first_name,
+            "last_name": p.last_name,
+            "amount": float(p.amount),
+            "utr": p.utr,
+            "status": p.status,
+            "created_at": p.created_at.isoformat(),
+            "updated_at": p.updated_at.isoformat()
+        }
+
+    try:
+        return jsonify(change_feed_page(query, PaymentRequest, request.args, serialize)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 @admin_bp.route("/payments/<int:payment_id>/status", methods=["PUT"])
+@query_budget(8)
 def update_payment_status(payment_id):
     data = request.get_json()
     new_status = data.get("status")
@@ -247,81 +478,135 @@ def update_payment_status(payment_id):
     if new_status not in ["Approved", "Rejected"]:
         return jsonify({"error": "Invalid status"}), 400
 
-    payment = PaymentRequest.query.get(payment_id)
-    if not payment:
+    outcomes, changes = decide_payments([payment_id], new_status)
+    notify_booked(changes)
+    db.session.commit()
+
+    outcome = outcomes[payment_id]
+    if outcome == "not_found":
         return jsonify({"error": "Payment not found"}), 404
-    
-    if payment.status != 'Pending':
+    if outcome == "already_processed":
         return jsonify({"error": "Payment has already been processed"}), 400
+    if outcome == "locked":
+        return jsonify({"error": "Payment is being processed by another request"}), 409
+    return jsonify({"message": f"Payment {new_status.lower()} successfully"}), 200
 
-    payment.status = new_status
-
-    if new_status == "Approved":
-        shipment = Shipment.query.get(payment.shipment_id)
-        if shipment:
-            shipment.status = "Booked"
-            now_iso = datetime.utcnow().isoformat()
-            history = shipment.tracking_history or []
-            found = False
-            for entry in history:
-                if entry.get("stage") == "Pending Payment":
-                    entry["stage"] = "Booked"
-                    entry["date"] = now_iso
-                    entry["activity"] = "Shipment booked and payment confirmed."
-                    found = True
-                    break
-            if not found:
-                 history.insert(0, {
-                    "stage": "Booked",
-                    "date": now_iso,
-                    "location": shipment.sender_address_city,
-                    "activity": "Shipment booked and payment confirmed."
-                 })
-            shipment.tracking_history = history
+@admin_bp.route("/payments/status", methods=["PUT"])
+@query_budget(10)
+def bulk_update_payment_status():
+    """Approves or rejects many payments in one transaction, reporting an outcome per payment."""
+    data = request.get_json() or {}
+    new_status = data.get("status")
+    payment_ids = data.get("payment_ids")
 
+    if new_status not in ["Approved", "Rejected"]:
+        return jsonify({"error": "Invalid status"}), 400
+    if not isinstance(payment_ids, list) or not payment_ids or not all(isinstance(i, int) for i in payment_ids):
+        return jsonify({"error": "payment_ids must be a non-empty list of integers"}), 400
+    max_batch = current_app.config.get("BULK_PAYMENT_MAX_BATCH", 500)
+    if len(payment_ids) > max_batch:
+        return jsonify({"error": f"At most {max_batch} payments can be updated per request"}), 400
+
+    payment_ids = list(dict.fromkeys(payment_ids))
+    outcomes, changes = decide_payments(payment_ids, new_status)
+    notify_booked(changes)
     db.session.commit()
-    return jsonify({"message": f"Payment {new_status.lower()} successfully"}), 200
+
+    summary = {}
+    for outcome in outcomes.values():
+        summary[outcome] = summary.get(outcome, 0) + 1
+    return jsonify({
+        "results": {str(payment_id): outcomes[payment_id] for payment_id in payment_ids},
+        "summary": summary
+    }), 200
+
+@admin_bp.route("/payments/reconcile", methods=["POST"])
+@query_budget(12)
+def reconcile_payments():
+    """
+    Reconciles pending payments against a bank statement CSV, uploaded as the
+    "statement" file or sent as the raw request body. Pass ?dry_run=true to get the
+    report without approving anything.
+    """
+    statement = request.files.get("statement")
+    if statement:
+        lines = TextIOWrapper(statement.stream, encoding="utf-8-sig", newline="")
+    else:
+        lines = request.get_data(as_text=True).lstrip("\ufeff").splitlines()
+
+    index, statement_duplicates, errors = parse_statement(lines)
+    if not index and not statement_duplicates:
+        return jsonify({"error": "No usable rows in statement", "details": errors}), 400
+
+    dry_run = request.args.get("dry_run", "").lower() in ("1", "true", "yes")
+    report = reconcile_pending_payments(index, statement_duplicates, dry_run=dry_run)
+    report["statement"] = {
+        "rows_indexed": len(index),
+        "duplicate_utrs": sorted(statement_duplicates),
+        "errors": errors,
+    }
+    return jsonify(report), 200
 
 @admin_bp.route("/users", methods=["GET"])
+@query_budget(8)
+@read_replica
+@conditional(_users_marker)
 def get_all_users():
     page = int(request.args.get("page", 1))
     limit = int(request.args.get("limit", 10))
-    q = request.args.get("q")
-    query = User.query.filter(User.is_admin == False)
-
-    if q:
-        like_q = f"%{q}%"
-        query = query.filter(
-            or_(
-                User.first_name.ilike(like_q),
-                User.last_name.ilike(like_q),
-                User.email.ilike(like_q)
-            )
-        )
-    
-    total_count = query.count()
-    pagination = query.order_by(User.created_at.desc()).paginate(page=page, per_page=limit, error_out=False)
+    query = filter_users(User.query, request.args)
+
+    total_count, count_is_estimate = count_rows(
+        query,
+        filter_signature("users", request.args, USER_FILTER_KEYS),
+        User.__tablename__,
+        filtered=bool(request.args.get("q"))
+    )
+    pagination = query.order_by(User.created_at.desc()).paginate(page=page, per_page=limit, error_out=False, count=False)
     users = pagination.items
 
+    # Per-user stats for this page only, from one grouped query instead of
+    # lazy-loading every user's shipments
+    stats = {
+        row.user_id: row
+        for row in db.session.query(
+            Shipment.user_id,
+            func.count(Shipment.id).label("shipment_count"),
+            # Unpaid (Pending Payment) and cancelled shipments are not spend
+            func.coalesce(func.sum(case(
+                (Shipment.status.in_(PAID_SHIPMENT_STATUSES), Shipment.total_with_tax_18_percent), else_=0
+            )), 0).label("total_spend"),
+            func.max(Shipment.booking_date).label("last_booking_date")
+        ).filter(
+            Shipment.user_id.in_([user.id for user in users])
+        ).group_by(Shipment.user_id).all()
+    } if users else {}
+
     result = []
     for user in users:
+        user_stats = stats.get(user.id)
         result.append({
             "id": user.id,
             "first_name": user.first_name,
             "last_name": user.last_name,
             "email": user.email,
+            "is_placeholder": user.is_placeholder,
             "created_at": user.created_at.isoformat(),
-            "shipment_count": len(user.shipments)
+            "shipment_count": user_stats.shipment_count if user_stats else 0,
+            "total_spend": float(user_stats.total_spend) if user_stats else 0.0,
+            "last_booking_date": user_stats.last_booking_date.isoformat() if user_stats else None
         })
 
     return jsonify({
         "users": result,
-        "totalPages": pagination.pages or 1,
+        "totalPages": total_pages(total_count, limit),
         "currentPage": page,
-        "totalCount": total_count
+        "totalCount": total_count,
+        "totalCountIsEstimate": count_is_estimate
     }), 200
 
 @admin_bp.route("/users/<int:user_id>", methods=["GET"])
+@query_budget(5)
 def get_user_details(user_id):
     user = User.query.get_or_404(user_id)
     if user.is_admin:
@@ -339,14 +624,19 @@ def get_user_details(user_id):
             "total_with_tax_18_percent": float(s.total_with_tax_18_percent),
         })
 
-    payments_query = PaymentRequest.query.filter_by(user_id=user.id).order_by(PaymentRequest.created_at.desc()).all()
+    payments_query = db.session.query(
+        PaymentRequest,
+        Shipment.shipment_id_str
+    ).outerjoin(
+        Shipment, PaymentRequest.shipment_id == Shipment.id
+    ).filter(
+        PaymentRequest.user_id == user.id
+    ).order_by(PaymentRequest.created_at.desc()).all()
     payments_result = []
-    for p in payments_query:
-        shipment_for_payment = Shipment.query.get(p.shipment_id)
-        shipment_id_str_for_payment = shipment_for_payment.shipment_id_str if shipment_for_payment else "N/A"
+    for p, shipment_id_str in payments_query:
         payments_result.append({
             "id": p.id,
-            "shipment_id_str": shipment_id_str_for_payment,
+            "shipment_id_str": shipment_id_str or "N/A",
             "amount": float(p.amount),
             "utr": p.utr,
             "status": p.status,
@@ -359,8 +649,30 @@ def get_user_details(user_id):
             "first_name": user.first_name,
             "last_name": user.last_name,
             "email": user.email,
+            "is_placeholder": user.is_placeholder,
             "created_at": user.created_at.isoformat()
         },
         "shipments": shipments_result,
         "payments": payments_result
     }), 200
+
+@admin_bp.route("/users/<int:user_id>/upgrade", methods=["POST"])
+@query_budget(8)
+def upgrade_placeholder(user_id):
+    """Converts a desktop-app placeholder account into a real account with a password."""
+    user = User.query.get_or_404(user_id)
+    if not user.is_placeholder:
+        return jsonify({"error": "User is not a placeholder account"}), 400
+
+    try:
+        user_data = signup_schema.load(request.get_json())
+    except Exception as e:
+        return jsonify({"error": e.messages}), 400
+
+    if user_data["email"] != user.email and User.query.filter_by(email=user_data["email"]).first():
+        return jsonify({"error": "Email already exists"}), 409
+
+    upgrade_placeholder_user(user, user_data["email"], user_data["password"],
+                             user_data["first_name"], user_data["last_name"])
+    db.session.commit()
+    return jsonify({"message": "Placeholder account upgraded successfully"}), 200
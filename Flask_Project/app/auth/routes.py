@@ -2,16 +2,18 @@ from flask import Blueprint, request, jsonify
 from werkzeug.security import generate_password_hash, check_password_hash
 from app.models import User
 from app.extensions import db
-from app.schemas import SignupSchema, LoginSchema
+from app.schemas import signup_schema, login_schema
+from app.services.analytics_service import record_new_users
+from app.instrumentation import query_budget
 
 auth_bp = Blueprint('auth', __name__, url_prefix="/api/auth")
 
 @auth_bp.route("/signup", methods=["POST"])
+@query_budget(5)
 def signup():
     data = request.get_json()
-    schema = SignupSchema()
     try:
-        user_data = schema.load(data)
+        user_data = signup_schema.load(data)
     except Exception as e:
         return jsonify({"error": e.messages}), 400
 
@@ -27,20 +29,23 @@ def signup():
         is_admin=False
     )
     db.session.add(new_user)
+    db.session.flush()
+    record_new_users([new_user.created_at])
     db.session.commit()
     return jsonify({"message": "User created successfully"}), 201
 
 @auth_bp.route("/login", methods=["POST"])
+@query_budget(3)
 def login():
     data = request.get_json()
-    schema = LoginSchema()
     try:
-        credentials = schema.load(data)
+        credentials = login_schema.load(data)
     except Exception as e:
         return jsonify({"error": e.messages}), 400
 
     user = User.query.filter_by(email=credentials["email"]).first()
-    if not user or not check_password_hash(user.password, credentials["password"]):
+    # Placeholder accounts have no password and can never log in
+    if not user or not user.password or not check_password_hash(user.password, credentials["password"]):
         return jsonify({"error": "Invalid email or password"}), 401
     
     return jsonify({
@@ -0,0 +1,66 @@
+import threading
+import time
+from collections import OrderedDict
+from .metrics import CACHE_LOOKUPS
+
+_MISSING = object()
+
+
+class TTLCache:
+    """
+    A small thread-safe, in-process LRU cache whose entries expire after a TTL.
+
+    Configured like the other extensions through ``init_app``; settings are read
+    from ``<PREFIX>_TTL`` and ``<PREFIX>_MAX_ENTRIES`` in the app config. The
+    cache is local to one worker process, so writers must invalidate explicitly
+    and the TTL bounds how stale other workers can be.
+    """
+
+    def __init__(self, config_prefix, ttl=60, max_entries=10000):
+        self.config_prefix = config_prefix
+        self.name = config_prefix.lower()
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.ttl = app.config.get(f"{self.config_prefix}_TTL", self.ttl)
+        self.max_entries = app.config.get(f"{self.config_prefix}_MAX_ENTRIES", self.max_entries)
+        self.clear()
+
+    def get(self, key):
+        """Returns ``(hit, value)``; ``value`` may legitimately be ``None`` on a hit."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key, _MISSING)
+            if entry is not _MISSING:
+                expires_at, value = entry
+                if expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    CACHE_LOOKUPS.labels(self.name, "hit").inc()
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            CACHE_LOOKUPS.labels(self.name, "miss").inc()
+            return False, None
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,85 @@
+import time
+from flask import current_app, has_request_context, request
+from sqlalchemy import event, exc
+from sqlalchemy.pool import NullPool, QueuePool
+from .metrics import DB_POOL_CHECKOUT_SECONDS, DB_POOL_CHECKOUT_TIMEOUTS
+
+
+class _TimedCheckout:
+    """Pool mixin recording how long each connection checkout waited."""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            DB_POOL_CHECKOUT_TIMEOUTS.inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.observe(time.perf_counter() - start)
+
+
+class TimedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class TimedNullPool(_TimedCheckout, NullPool):
+    pass
+
+
+def engine_options(config):
+    """
+    Builds SQLALCHEMY_ENGINE_OPTIONS for PostgreSQL from the DB_* settings.
+
+    Normally the app keeps its own pool, pings connections before use (the host
+    drops idle ones) and recycles them before the host's idle limit; the default
+    statement timeout is set once per connection. With DB_PGBOUNCER the app runs
+    behind PgBouncer in transaction-pooling mode: PgBouncer does the pooling, so
+    every checkout opens a fresh client connection and startup options are not
+    passed through. Other databases keep SQLAlchemy's defaults.
+    """
+    if not config["SQLALCHEMY_DATABASE_URI"].startswith("postgres"):
+        return {}
+
+    if config["DB_PGBOUNCER"]:
+        return {"poolclass": TimedNullPool}
+
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": config["DB_POOL_SIZE"],
+        "max_overflow": config["DB_MAX_OVERFLOW"],
+        "pool_timeout": config["DB_POOL_TIMEOUT"],
+        "pool_recycle": config["DB_POOL_RECYCLE"],
+        "pool_pre_ping": config["DB_POOL_PRE_PING"],
+        "connect_args": {"options": f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"},
+    }
+
+
+def install_statement_timeouts(db):
+    """
+    Applies a statement timeout to every PostgreSQL transaction with SET LOCAL,
+    which lasts only for that transaction and so also works through PgBouncer.
+
+    Admin endpoints, and work outside a request (export jobs, scripts), get
+    DB_LONG_STATEMENT_TIMEOUT_MS; everything else DB_STATEMENT_TIMEOUT_MS. Outside
+    PgBouncer mode the default is already set on the connection, so only the long
+    timeout costs a statement.
+    """
+    if not event.contains(db.session, "after_begin", _set_statement_timeout):
+        event.listen(db.session, "after_begin", _set_statement_timeout)
+
+
+def _set_statement_timeout(session, transaction, connection):
+    if connection.dialect.name != "postgresql":
+        return
+    config = current_app.config
+    default_ms = config["DB_STATEMENT_TIMEOUT_MS"]
+    long_running = not has_request_context() or request.blueprint == "admin"
+    timeout_ms = config["DB_LONG_STATEMENT_TIMEOUT_MS"] if long_running else default_ms
+    if config["DB_PGBOUNCER"] or timeout_ms != default_ms:
+        # Session setup, not the view's own SQL: kept out of the request's query budget
+        connection.info["uncounted_statement"] = True
+        try:
+            connection.exec_driver_sql(f"SET LOCAL statement_timeout = {int(timeout_ms)}")
+        finally:
+            connection.info.pop("uncounted_statement", None)
@@ -0,0 +1,128 @@
+import time
+from functools import wraps
+from flask import current_app, g, has_app_context, make_response, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import exc
+from sqlalchemy.sql.elements import TextClause
+
+REPLICA_BIND_KEY = "replica"
+PIN_COOKIE = "db_primary_until"
+# Cross-origin clients do not keep cookies, so the time of the client's last write
+# is also returned in this header for it to send back on later requests
+READ_AFTER_HEADER = "X-Read-After"
+
+# Monotonic time until which the replica is treated as unavailable (per process)
+_replica_down_until = 0.0
+
+
+class RoutingSession(Session):
+    """
+    Session that sends SELECTs to the "replica" bind while a ``@read_replica`` view
+    is running. Flushes, DML and anything else go to the primary, and a request
+    that writes is remembered so ``pin_after_writes`` can pin the client.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            if self._flushing or (clause is not None and _is_write(clause)):
+                g.db_wrote = True
+            elif g.get("db_use_replica"):
+                replica = self._db.engines.get(REPLICA_BIND_KEY)
+                if replica is not None:
+                    g.db_replica_used = True
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _is_write(clause):
+    # INSERT/UPDATE/DELETE constructs, and raw SQL unless it is a plain SELECT
+    # (e.g. count_service's pg_class estimate); DDL and locks stay on the primary
+    if isinstance(clause, TextClause):
+        return not clause.text.lstrip().upper().startswith("SELECT")
+    return clause.is_dml or getattr(clause, "is_ddl", False)
+
+
+def replica_enabled():
+    return REPLICA_BIND_KEY in current_app.config.get("SQLALCHEMY_BINDS", {})
+
+
+def _pinned_to_primary():
+    now = time.time()
+    try:
+        if float(request.cookies.get(PIN_COOKIE, 0)) > now:
+            return True
+        wrote_at = float(request.headers.get(READ_AFTER_HEADER, 0))
+    except ValueError:
+        return False
+    return wrote_at + current_app.config.get("REPLICA_PIN_SECONDS", 10) > now
+
+
+def read_replica(view):
+    """
+    Runs a read-only view against the replica when one is configured.
+
+    The primary is used instead while the client is pinned after its own writes
+    (see ``pin_after_writes``: a recent X-Read-After header or the pin cookie) and
+    while the replica is marked down. If the replica fails at the connection level
+    the view is retried once on the primary and the replica is skipped for
+    REPLICA_RETRY_SECONDS. Errors raised by the server itself (e.g. a statement
+    timeout) are not retried.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        global _replica_down_until
+        if not replica_enabled() or _pinned_to_primary() or time.monotonic() < _replica_down_until:
+            return view(*args, **kwargs)
+
+        g.db_use_replica = True
+        g.db_replica_used = False
+        try:
+            response = make_response(view(*args, **kwargs))
+        except exc.DBAPIError as e:
+            g.db_use_replica = False
+            if not g.db_replica_used or getattr(e.orig, "pgcode", None):
+                raise
+            current_app.extensions["sqlalchemy"].session.rollback()
+            _replica_down_until = time.monotonic() + current_app.config.get("REPLICA_RETRY_SECONDS", 30)
+            return view(*args, **kwargs)
+
+        if response.is_streamed:
+            # A streamed body (CSV export) keeps reading after the view returns
+            ctx_g = g._get_current_object()
+            response.call_on_close(lambda: ctx_g.pop("db_use_replica", None))
+        else:
+            g.db_use_replica = False
+        return response
+    return wrapper
+
+
+class use_replica:
+    """Context manager routing SELECTs to the replica (if configured) outside a view, e.g. in export jobs."""
+
+    def __enter__(self):
+        self._previous = g.get("db_use_replica", False)
+        g.db_use_replica = time.monotonic() >= _replica_down_until
+        return self
+
+    def __exit__(self, *exc_info):
+        g.db_use_replica = self._previous
+
+
+def pin_after_writes(response):
+    """
+    after_request hook: a client that just wrote reads from the primary for
+    REPLICA_PIN_SECONDS, through a cookie for same-origin clients and the
+    X-Read-After header (the write's Unix time) that other clients echo back.
+    Views whose streamed body writes set ``g.db_wrote`` themselves, since the
+    body runs after this hook.
+    """
+    if g.pop("db_wrote", False) and replica_enabled():
+        now = time.time()
+        pin_seconds = current_app.config.get("REPLICA_PIN_SECONDS", 10)
+        response.set_cookie(
+            PIN_COOKIE, str(now + pin_seconds),
+            max_age=pin_seconds, httponly=True, samesite="Lax"
+        )
+        response.headers[READ_AFTER_HEADER] = f"{now:.3f}"
+    return response
+
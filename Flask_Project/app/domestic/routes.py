@@ -1,6 +1,7 @@
 
 from flask import Blueprint, request, jsonify
 from app.services.domestic_pricing_service import calculate_domestic_price
+from app.instrumentation import query_budget
 import json
 import os
 import math
@@ -9,6 +10,7 @@ import random
 domestic_bp = Blueprint("domestic", __name__, url_prefix="/api/domestic")
 
 @domestic_bp.route("/price", methods=["POST"])
+@query_budget(0)
 def price_calculator():
     try:
         data = request.get_json()
@@ -43,6 +45,7 @@ def price_calculator():
         return jsonify({"error": str(e)}), 500
 
 @domestic_bp.route("/reverse-price", methods=["POST"])
+@query_budget(0)
 def reverse_price():
     data = request.get_json()
     target_amount = data.get("amount")
@@ -1,5 +1,11 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from .cache import TTLCache
+from .db_routing import RoutingSession
+from .services.event_broker import EventBus
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 cors = CORS()
+tracking_cache = TTLCache("TRACKING_CACHE")
+count_cache = TTLCache("COUNT_CACHE", ttl=30, max_entries=1000)
+event_bus = EventBus()
@@ -0,0 +1,137 @@
+import threading
+import time
+from collections import Counter
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from .metrics import DB_QUERIES_PER_REQUEST, DB_QUERY_SECONDS_PER_REQUEST, HTTP_REQUEST_SECONDS
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised under TESTING when a request breaks its route's query budget."""
+
+
+def query_budget(max_queries, max_repeats=None):
+    """
+    Declares the most SQL statements a view may run per request (``None`` for batch
+    endpoints whose count grows with the payload), and how many times any one
+    statement may repeat, which is the N+1 signature of a SELECT issued once per
+    row. ``max_repeats`` and undeclared routes fall back to QUERY_REPEAT_LIMIT and
+    QUERY_BUDGET_DEFAULT; ``max_repeats=False`` turns the repeat check off for
+    streams that run the same statements once per micro-batch. Over budget logs a
+    warning, or raises QueryBudgetExceeded in testing.
+    """
+    def decorator(view):
+        view.query_budget = (max_queries, max_repeats)
+        return view
+    return decorator
+
+
+def install_request_metrics(app):
+    """
+    Records per-request latency, SQL statement count and SQL time (see app/metrics.py)
+    and checks each request against its query budget.
+
+    Statements are timed with cursor events on every engine and added to the
+    request's ``QueryStats`` on ``g``. Pool threads doing work for the request
+    (``parallel_queries``) are handed the same object, and for a streamed response
+    the totals are recorded and the budget checked when the body has been sent, so
+    statements run by the body count too. Background work with its own app context
+    (export jobs) is not attributed to any request, nor are statements run on a
+    connection flagged ``uncounted_statement`` (the SET LOCAL statement_timeout
+    issued when a transaction begins, see db_profile.py).
+    """
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    app.before_request(_start_request)
+    app.after_request(_observe_request)
+
+
+class QueryStats:
+    """SQL statements run for one request, from its own thread and any it hands work to."""
+
+    def __init__(self):
+        self.queries = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, statement, seconds, executemany):
+        with self._lock:
+            self.queries += 1
+            self.seconds += seconds
+            if not executemany:
+                # Bulk inserts may arrive as several executemany batches; they are not N+1
+                self.statements[statement] += 1
+
+
+def request_query_stats():
+    """The running request's ``QueryStats`` (or None), for handing to threads that work on its behalf."""
+    return g.get("db_stats") if has_app_context() else None
+
+
+def _start_request():
+    g.request_started = time.perf_counter()
+    g.db_stats = QueryStats()
+
+
+def _observe_request(response):
+    started = g.pop("request_started", None)
+    if started is None:
+        return response
+    blueprint = request.blueprint or "app"
+    route = request.url_rule.rule if request.url_rule else "unmatched"
+    HTTP_REQUEST_SECONDS.labels(blueprint, route, request.method, str(response.status_code)).observe(
+        time.perf_counter() - started
+    )
+
+    app = current_app._get_current_object()
+    view = app.view_functions.get(request.endpoint)
+    budget = getattr(view, "query_budget", (app.config.get("QUERY_BUDGET_DEFAULT"), None))
+    arguments = (app, g.db_stats, blueprint, route, request.method, budget)
+    if response.is_streamed:
+        # The body still runs statements after this hook, and the request context
+        # may be gone when it is closed, so everything needed is bound here
+        response.call_on_close(lambda: _observe_queries(*arguments))
+    else:
+        _observe_queries(*arguments)
+    return response
+
+
+def _observe_queries(app, stats, blueprint, route, method, budget):
+    DB_QUERIES_PER_REQUEST.labels(blueprint, route).observe(stats.queries)
+    DB_QUERY_SECONDS_PER_REQUEST.labels(blueprint, route).observe(stats.seconds)
+    _check_query_budget(app, stats, method, route, budget)
+
+
+def _check_query_budget(app, stats, method, route, budget):
+    max_queries, max_repeats = budget
+    if max_repeats is None:
+        max_repeats = app.config.get("QUERY_REPEAT_LIMIT")
+    problems = []
+    if max_queries is not None and stats.queries > max_queries:
+        problems.append(f"{stats.queries} queries, budget {max_queries}")
+    if max_repeats and stats.statements:
+        statement, count = stats.statements.most_common(1)[0]
+        if count > max_repeats:
+            problems.append(f"statement ran {count} times, likely N+1: {' '.join(statement.split())[:300]}")
+    if not problems:
+        return
+    message = f"Query budget exceeded on {method} {route}: " + "; ".join(problems)
+    if app.testing:
+        raise QueryBudgetExceeded(message)
+    app.logger.warning(message)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info["query_started"] = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.pop("query_started", None)
+    if started is None or conn.info.get("uncounted_statement"):
+        return
+    stats = request_query_stats()
+    if stats is not None:
+        stats.add(statement, time.perf_counter() - started, executemany)
@@ -1,6 +1,7 @@
 
 from flask import Blueprint, request, jsonify
 from app.services.pricing_service import calculate_international_price
+from app.instrumentation import query_budget
 import json
 import os
 import random
@@ -8,6 +9,7 @@ import random
 international_bp = Blueprint("international", __name__, url_prefix="/api/international")
 
 @international_bp.route("/price", methods=["POST"])
+@query_budget(0)
 def intl_price():
     try:
         data = request.get_json()
@@ -43,6 +45,7 @@ def intl_price():
 
 
 @international_bp.route("/reverse-price", methods=["POST"])
+@query_budget(0)
 def reverse_price():
     data = request.get_json()
     target_amount = data.get("amount")
@@ -0,0 +1,54 @@
+import os
+from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+
+# Time a request waits for a pooled database connection (connect time under PgBouncer mode)
+DB_POOL_CHECKOUT_SECONDS = Histogram(
+    "shedload_db_pool_checkout_seconds",
+    "Time spent waiting to check a connection out of the database pool",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+DB_POOL_CHECKOUT_TIMEOUTS = Counter(
+    "shedload_db_pool_checkout_timeouts_total",
+    "Connection checkouts that gave up after DB_POOL_TIMEOUT"
+)
+
+# Request latency by blueprint and route template (time to the response object; a
+# streamed body such as SSE is not included)
+HTTP_REQUEST_SECONDS = Histogram(
+    "shedload_http_request_seconds",
+    "Time spent handling a request",
+    ["blueprint", "route", "method", "status"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+DB_QUERIES_PER_REQUEST = Histogram(
+    "shedload_db_queries_per_request",
+    "SQL statements executed while handling a request",
+    ["blueprint", "route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250, 1000)
+)
+DB_QUERY_SECONDS_PER_REQUEST = Histogram(
+    "shedload_db_query_seconds_per_request",
+    "Total time spent in SQL statements while handling a request",
+    ["blueprint", "route"],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+
+# In-process cache lookups; hit ratio = hits / (hits + misses) per cache
+CACHE_LOOKUPS = Counter(
+    "shedload_cache_lookups_total",
+    "Lookups in the in-process caches",
+    ["cache", "result"]
+)
+
+
+def render_latest():
+    """
+    Text exposition for GET /metrics. Under gunicorn every worker writes its samples
+    to PROMETHEUS_MULTIPROC_DIR (set in gunicorn.conf.py) and they are merged here,
+    so any worker answers for the whole server.
+    """
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
@@ -2,21 +2,53 @@ from .extensions import db
 from sqlalchemy.dialects.postgresql import JSONB
 from datetime import datetime
 
+
+def trigram_index(table_name, column_name):
+    """pg_trgm GIN index so ILIKE '%q%' on the column is not a sequential scan (PostgreSQL only)."""
+    return db.Index(
+        f"ix_{table_name}_{column_name}_trgm",
+        column_name,
+        postgresql_using="gin",
+        postgresql_ops={column_name: "gin_trgm_ops"}
+    ).ddl_if(dialect="postgresql")
+
+# Statuses staff may move a shipment to once it has been paid for.
+SHIPMENT_STATUSES = ['Booked', 'In Transit', 'Out for Delivery', 'Delivered', 'Cancelled']
+# Statuses of shipments that were paid for and not cancelled, i.e. real spend
+PAID_SHIPMENT_STATUSES = ['Booked', 'In Transit', 'Out for Delivery', 'Delivered']
+
+# Columns matched by the admin search box
+USER_SEARCH_COLUMNS = ("first_name", "last_name", "email")
+
 class User(db.Model):
     __tablename__ = "users"
+    __table_args__ = tuple(trigram_index("users", c) for c in USER_SEARCH_COLUMNS)
 
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(255), unique=True, nullable=False, index=True)
-    password = db.Column(db.String(255), nullable=False)
+    password = db.Column(db.String(255))  # NULL for placeholder accounts, which cannot log in
     first_name = db.Column(db.String(100), nullable=False)
     last_name = db.Column(db.String(100), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
+    # Created on behalf of a desktop-app sender; can be upgraded to a real account later
+    is_placeholder = db.Column(db.Boolean, nullable=False, default=False, server_default=db.false())
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, index=True)
 
     shipments = db.relationship('Shipment', backref='user', lazy=True)
 
+# Columns matched by the admin search box
+SHIPMENT_SEARCH_COLUMNS = (
+    "shipment_id_str", "sender_name", "receiver_name", "sender_phone", "receiver_phone",
+    "sender_address_pincode", "receiver_address_pincode",
+)
+
 class Shipment(db.Model):
     __tablename__ = "shipments"
+    __table_args__ = tuple(trigram_index("shipments", c) for c in SHIPMENT_SEARCH_COLUMNS) + (
+        # Change feed order (see services/change_feed.py)
+        db.Index("ix_shipments_updated_at_id", "updated_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
@@ -54,9 +86,14 @@ class Shipment(db.Model):
     total_with_tax_18_percent = db.Column(db.Numeric(10, 2), nullable=False)
 
     tracking_history = db.Column(JSONB, default=list)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
 class PaymentRequest(db.Model):
     __tablename__ = "payment_requests"
+    __table_args__ = (
+        # Change feed order (see services/change_feed.py)
+        db.Index("ix_payment_requests_updated_at_id", "updated_at", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -65,3 +102,85 @@ class PaymentRequest(db.Model):
     utr = db.Column(db.String(64), nullable=False)
     status = db.Column(db.String(20), default='Pending')  # Pending, Approved, Rejected
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
+class IdempotencyKey(db.Model):
+    __tablename__ = "idempotency_keys"
+    __table_args__ = (db.UniqueConstraint('key', 'endpoint', name='uq_idempotency_key_endpoint'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    key = db.Column(db.String(255), nullable=False)
+    endpoint = db.Column(db.String(255), nullable=False)
+    request_hash = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='in_progress')  # in_progress, committed, completed
+    response_status = db.Column(db.Integer)
+    response_body = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+class ExportJob(db.Model):
+    __tablename__ = "export_jobs"
+    __table_args__ = (
+        # At most one active job per identical request; duplicates attach to it
+        db.Index(
+            "uq_export_jobs_active_fingerprint",
+            "fingerprint",
+            unique=True,
+            postgresql_where=db.text("status IN ('queued', 'running')"),
+            sqlite_where=db.text("status IN ('queued', 'running')")
+        ),
+    )
+
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)  # shipments, payments, users
+    filters = db.Column(JSONB, default=dict)
+    compress = db.Column(db.Boolean, nullable=False, default=False)
+    fingerprint = db.Column(db.String(64), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')  # queued, running, completed, failed
+    rows_total = db.Column(db.Integer)
+    rows_written = db.Column(db.Integer, nullable=False, default=0)
+    file_path = db.Column(db.String(500))
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # Lease: the process holding the job ("host:pid") and when it last reported in
+    owner = db.Column(db.String(100))
+    heartbeat_at = db.Column(db.DateTime)
+
+class DailyShipmentRollup(db.Model):
+    """Orders and revenue per booking day, status and service type, kept current by analytics_service."""
+    __tablename__ = "daily_shipment_rollups"
+
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(50), primary_key=True)
+    service_type = db.Column(db.String(50), primary_key=True)
+    orders = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+class DailyUserRollup(db.Model):
+    """Non-admin sign-ups (including placeholder accounts) per day, kept current by analytics_service."""
+    __tablename__ = "daily_user_rollups"
+
+    day = db.Column(db.Date, primary_key=True)
+    new_users = db.Column(db.Integer, nullable=False, default=0)
+
+class DailyLaneRollup(db.Model):
+    """Shipments, revenue and weight per booking day and lane (origin city -> destination city), kept current by analytics_service."""
+    __tablename__ = "daily_lane_rollups"
+
+    day = db.Column(db.Date, primary_key=True)
+    origin_city = db.Column(db.String(100), primary_key=True)
+    destination_city = db.Column(db.String(100), primary_key=True)
+    destination_country = db.Column(db.String(100), primary_key=True)
+    shipments = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    weight_kg = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+
+
+class TableVersion(db.Model):
+    """A counter per table, bumped inside every transaction that writes to it; conditional GETs validate against it."""
+    __tablename__ = "table_versions"
+
+    table_name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.BigInteger, nullable=False, default=0)
@@ -42,3 +42,10 @@ class PaymentSubmitSchema(Schema):
     shipment_id_str = fields.Str(required=True)
     utr = fields.Str(required=True, validate=validate.Length(min=12, max=12, error="UTR must be 12 digits."))
     amount = fields.Float(required=True)
+
+# Shared instances, built once at import: instantiating a schema copies all of its
+# declared fields, and load() keeps no per-call state on the instance
+signup_schema = SignupSchema()
+login_schema = LoginSchema()
+shipment_create_schema = ShipmentCreateSchema()
+payment_submit_schema = PaymentSubmitSchema()
@@ -0,0 +1,79 @@
+from datetime import datetime, timedelta
+from app.models import Shipment, User, PaymentRequest
+from app.services.search_service import search_index
+
+SHIPMENT_FILTER_KEYS = ("status", "q", "start_date", "end_date")
+PAYMENT_FILTER_KEYS = ("status", "start_date", "end_date")
+USER_FILTER_KEYS = ("q",)
+
+
+def parse_date_range(args):
+    """
+    Parses ``start_date``/``end_date`` (ISO format) from a mapping of filters.
+    The end date is made exclusive by adding a day, so the whole day is included.
+    Raises ValueError with a user-facing message on bad input.
+    """
+    start_dt = end_dt = None
+    start_date = args.get("start_date")
+    end_date = args.get("end_date")
+
+    if start_date:
+        try:
+            start_dt = datetime.fromisoformat(start_date.replace('Z', '+00:00'))
+        except ValueError:
+            raise ValueError("Invalid start_date format. Use ISO format (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)")
+
+    if end_date:
+        try:
+            end_dt = datetime.fromisoformat(end_date.replace('Z', '+00:00'))
+            # Add one day to include the entire end date
+            end_dt = end_dt + timedelta(days=1)
+        except ValueError:
+            raise ValueError("Invalid end_date format. Use ISO format (YYYY-MM-DD or YYYY-MM-DDTHH:MM:SS)")
+
+    return start_dt, end_dt
+
+
+def filter_shipments(query, args, include_status=True):
+    """Applies the admin shipment filters (status, q, start_date, end_date)."""
+    status = args.get("status")
+    q = args.get("q")
+    start_dt, end_dt = parse_date_range(args)
+
+    if status and include_status:
+        query = query.filter(Shipment.status == status)
+    if q:
+        query = search_index.filter(query, Shipment, q)
+    if start_dt:
+        query = query.filter(Shipment.booking_date >= start_dt)
+    if end_dt:
+        query = query.filter(Shipment.booking_date < end_dt)
+    return query
+
+
+def filter_payments(query, args):
+    """Applies the admin payment filters (status, start_date, end_date)."""
+    status = args.get("status")
+    start_dt, end_dt = parse_date_range(args)
+
+    if status:
+        query = query.filter(PaymentRequest.status == status)
+    if start_dt:
+        query = query.filter(PaymentRequest.created_at >= start_dt)
+    if end_dt:
+        query = query.filter(PaymentRequest.created_at < end_dt)
+    return query
+
+
+def filter_users(query, args):
+    """Applies the admin user filters (q) on top of excluding admins."""
+    query = query.filter(User.is_admin == False)
+    q = args.get("q")
+    if q:
+        query = search_index.filter(query, User, q)
+    return query
+
+
+def filter_signature(name, args, keys):
+    """Cache key for a filtered listing."""
+    return (name,) + tuple(args.get(key) or "" for key in keys)
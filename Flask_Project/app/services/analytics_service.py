@@ -0,0 +1,257 @@
+from datetime import date, timedelta
+from decimal import Decimal
+from sqlalchemy import delete, func, insert, select, text
+from app.extensions import db
+from app.models import Shipment, User, DailyShipmentRollup, DailyUserRollup, DailyLaneRollup
+from app.utils import dialect_insert
+
+SHIPMENT_GROUPS = ("day", "week", "month", "status", "service_type")
+LANE_GROUPS = ("lane", "country")
+LANE_SORTS = ("shipments", "revenue")
+
+
+def _day(value):
+    return value.date() if hasattr(value, "date") else value
+
+
+def _upsert(model, keys, increments, rows):
+    """
+    Adds ``rows`` (dicts of key and counter columns) onto the existing rollup rows
+    with one INSERT ... ON CONFLICT DO UPDATE. Rows are sorted by key so concurrent
+    writers lock rollup rows in the same order and cannot deadlock each other.
+    """
+    if not rows:
+        return
+    rows = sorted(rows, key=lambda r: tuple(r[k] for k in keys))
+    stmt = dialect_insert(model).values(rows)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[getattr(model, k) for k in keys],
+        set_={c: getattr(model, c) + getattr(stmt.excluded, c) for c in increments}
+    )
+    db.session.execute(stmt)
+
+
+def _apply_shipment_deltas(deltas):
+    rows = [
+        {"day": day, "status": status, "service_type": service_type, "orders": orders, "revenue": revenue}
+        for (day, status, service_type), (orders, revenue) in deltas.items()
+        if orders or revenue
+    ]
+    _upsert(DailyShipmentRollup, ("day", "status", "service_type"), ("orders", "revenue"), rows)
+
+
+def _add(deltas, key, orders, revenue):
+    current = deltas.get(key, (0, Decimal("0")))
+    deltas[key] = (current[0] + orders, current[1] + revenue)
+
+
+def record_shipments(shipments):
+    """
+    Counts newly created shipments into the rollups. Call after the shipments are
+    flushed (so ``booking_date`` is set) and before the commit, so the rollups
+    change in the same transaction as the rows they summarize.
+    """
+    deltas = {}
+    lanes = {}
+    for s in shipments:
+        day = _day(s.booking_date)
+        revenue = Decimal(str(s.total_with_tax_18_percent))
+        _add(deltas, (day, s.status, s.service_type), 1, revenue)
+
+        lane = (day, s.sender_address_city, s.receiver_address_city, s.receiver_address_country)
+        count, lane_revenue, weight = lanes.get(lane, (0, Decimal("0"), Decimal("0")))
+        lanes[lane] = (count + 1, lane_revenue + revenue, weight + Decimal(str(s.package_weight_kg)))
+    _apply_shipment_deltas(deltas)
+
+    rows = [
+        {"day": day, "origin_city": origin, "destination_city": destination, "destination_country": country,
+         "shipments": count, "revenue": revenue, "weight_kg": weight}
+        for (day, origin, destination, country), (count, revenue, weight) in lanes.items()
+    ]
+    _upsert(DailyLaneRollup, ("day", "origin_city", "destination_city", "destination_country"),
+            ("shipments", "revenue", "weight_kg"), rows)
+
+
+def record_status_changes(changes):
+    """
+    Moves shipments between status buckets. ``changes`` holds
+    ``(booking_date, service_type, total, old_status, new_status)`` tuples; the old
+    status must be the one read under the same transaction. Call before commit.
+    """
+    deltas = {}
+    for booking_date, service_type, total, old_status, new_status in changes:
+        if old_status == new_status:
+            continue
+        revenue = Decimal(str(total))
+        day = _day(booking_date)
+        _add(deltas, (day, old_status, service_type), -1, -revenue)
+        _add(deltas, (day, new_status, service_type), 1, revenue)
+    _apply_shipment_deltas(deltas)
+
+
+def record_new_users(created_ats, delta=1):
+    """Counts non-admin accounts created at ``created_ats``; pass ``delta=-1`` when an account stops counting."""
+    counts = {}
+    for created_at in created_ats:
+        day = _day(created_at)
+        counts[day] = counts.get(day, 0) + delta
+    rows = [{"day": day, "new_users": n} for day, n in counts.items() if n]
+    _upsert(DailyUserRollup, ("day",), ("new_users",), rows)
+
+
+def rebuild_rollups():
+    """
+    Recomputes every rollup from the base tables in one transaction.
+
+    On PostgreSQL the rollup tables are locked in EXCLUSIVE mode first (reads keep
+    working): writers already holding rollup rows finish before the base tables are
+    read, and writers arriving later wait and then apply their increments on top.
+    """
+    if db.engine.dialect.name == "postgresql":
+        db.session.execute(text(
+            "LOCK TABLE daily_shipment_rollups, daily_user_rollups, daily_lane_rollups IN EXCLUSIVE MODE"
+        ))
+
+    db.session.execute(delete(DailyShipmentRollup))
+    db.session.execute(delete(DailyUserRollup))
+    db.session.execute(delete(DailyLaneRollup))
+
+    shipment_day = func.date(Shipment.booking_date)
+    db.session.execute(insert(DailyShipmentRollup).from_select(
+        ["day", "status", "service_type", "orders", "revenue"],
+        select(
+            shipment_day,
+            Shipment.status,
+            Shipment.service_type,
+            func.count(Shipment.id),
+            func.coalesce(func.sum(Shipment.total_with_tax_18_percent), 0)
+        ).group_by(shipment_day, Shipment.status, Shipment.service_type)
+    ))
+
+    lane = (Shipment.sender_address_city, Shipment.receiver_address_city, Shipment.receiver_address_country)
+    db.session.execute(insert(DailyLaneRollup).from_select(
+        ["day", "origin_city", "destination_city", "destination_country", "shipments", "revenue", "weight_kg"],
+        select(
+            shipment_day,
+            *lane,
+            func.count(Shipment.id),
+            func.coalesce(func.sum(Shipment.total_with_tax_18_percent), 0),
+            func.coalesce(func.sum(Shipment.package_weight_kg), 0)
+        ).group_by(shipment_day, *lane)
+    ))
+
+    user_day = func.date(User.created_at)
+    db.session.execute(insert(DailyUserRollup).from_select(
+        ["day", "new_users"],
+        select(user_day, func.count(User.id)).where(User.is_admin == False).group_by(user_day)
+    ))
+    db.session.commit()
+
+
+def rollup_totals():
+    orders, revenue = db.session.query(
+        func.coalesce(func.sum(DailyShipmentRollup.orders), 0),
+        func.coalesce(func.sum(DailyShipmentRollup.revenue), 0)
+    ).one()
+    users = db.session.query(func.coalesce(func.sum(DailyUserRollup.new_users), 0)).scalar()
+    return int(orders), Decimal(revenue), int(users)
+
+
+def _bucket(day, interval):
+    if interval == "week":
+        return day - timedelta(days=day.weekday())
+    if interval == "month":
+        return day.replace(day=1)
+    return day
+
+
+def shipment_breakdown(start_dt=None, end_dt=None, group_by=("day",)):
+    """
+    Orders and revenue from the rollups, grouped by any of ``SHIPMENT_GROUPS``.
+    ``end_dt`` is exclusive. The rollups are per day, so the range is applied to
+    whole days. Week and month buckets are folded from day rows here; at most one
+    of day, week or month may be requested.
+    """
+    interval = next((g for g in group_by if g in ("day", "week", "month")), None)
+    columns = (["day"] if interval else []) + [g for g in group_by if g in ("status", "service_type")]
+
+    query = db.session.query(
+        *(getattr(DailyShipmentRollup, c) for c in columns),
+        func.sum(DailyShipmentRollup.orders),
+        func.sum(DailyShipmentRollup.revenue)
+    )
+    if start_dt:
+        query = query.filter(DailyShipmentRollup.day >= _day(start_dt))
+    if end_dt:
+        query = query.filter(DailyShipmentRollup.day < _day(end_dt))
+    if columns:
+        query = query.group_by(*(getattr(DailyShipmentRollup, c) for c in columns))
+
+    buckets = {}
+    for row in query.all():
+        key = dict(zip(columns, row[:len(columns)]))
+        if interval:
+            key[interval] = _bucket(key.pop("day"), interval)
+        ident = tuple(key.get(g) for g in group_by)
+        orders, revenue = buckets.get(ident, (0, Decimal("0")))
+        buckets[ident] = (orders + int(row[-2] or 0), revenue + Decimal(row[-1] or 0))
+
+    result = []
+    for ident in sorted(buckets, key=lambda k: tuple(str(v) for v in k)):
+        orders, revenue = buckets[ident]
+        if not orders:
+            continue
+        item = {g: (v.isoformat() if isinstance(v, date) else v) for g, v in zip(group_by, ident)}
+        item["orders"] = orders
+        item["revenue"] = float(revenue)
+        result.append(item)
+    return result
+
+
+def user_breakdown(start_dt=None, end_dt=None, interval="day"):
+    """New non-admin users per day, week or month from the rollups. ``end_dt`` is exclusive."""
+    query = db.session.query(DailyUserRollup.day, DailyUserRollup.new_users)
+    if start_dt:
+        query = query.filter(DailyUserRollup.day >= _day(start_dt))
+    if end_dt:
+        query = query.filter(DailyUserRollup.day < _day(end_dt))
+
+    buckets = {}
+    for day, new_users in query.all():
+        bucket = _bucket(day, interval)
+        buckets[bucket] = buckets.get(bucket, 0) + new_users
+    return [{interval: b.isoformat(), "new_users": n} for b, n in sorted(buckets.items()) if n]
+
+
+def top_lanes(start_dt=None, end_dt=None, group_by="lane", sort="shipments", limit=10):
+    """
+    Top ``limit`` lanes (origin city -> destination city) or destination countries
+    by shipments or revenue for a date range, from the lane rollups. Every booked
+    shipment counts whatever its current status. The work depends on the number of
+    days and lanes in the range, not on the size of the shipments table.
+    """
+    if group_by == "lane":
+        columns = (DailyLaneRollup.origin_city, DailyLaneRollup.destination_city, DailyLaneRollup.destination_country)
+    else:
+        columns = (DailyLaneRollup.destination_country,)
+    shipments = func.sum(DailyLaneRollup.shipments)
+    revenue = func.sum(DailyLaneRollup.revenue)
+    weight = func.sum(DailyLaneRollup.weight_kg)
+
+    query = db.session.query(*columns, shipments, revenue, weight)
+    if start_dt:
+        query = query.filter(DailyLaneRollup.day >= _day(start_dt))
+    if end_dt:
+        query = query.filter(DailyLaneRollup.day < _day(end_dt))
+    order = revenue if sort == "revenue" else shipments
+    query = query.group_by(*columns).having(shipments > 0).order_by(order.desc(), *columns).limit(limit)
+
+    result = []
+    for row in query.all():
+        item = {c.key: value for c, value in zip(columns, row)}
+        count, total_revenue, total_weight = row[-3:]
+        item["shipments"] = int(count)
+        item["revenue"] = float(total_revenue)
+        item["avg_weight_kg"] = round(float(total_weight) / int(count), 2)
+        result.append(item)
+    return result
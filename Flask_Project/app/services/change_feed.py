@@ -0,0 +1,97 @@
+import base64
+import json
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import and_, or_, text
+
+
+def encode_cursor(updated_at, row_id):
+    raw = json.dumps([updated_at.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """Returns ``(updated_at, id)`` for an opaque cursor, or raises ValueError."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        updated_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(updated_at), int(row_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def changes_since(query, model, cursor=None, limit=100, settle_seconds=2):
+    """
+    Returns ``(rows, next_cursor, has_more)``: rows of ``query`` (which must expose
+    ``updated_at`` and ``id``) changed after
+    ``cursor`` in ``(updated_at, id)`` order, served by the ``(updated_at, id)``
+    index, so each poll reads only what changed.
+
+    ``updated_at`` is stamped by the application before commit, so a slow
+    transaction can commit a timestamp older than rows already served. Rows are
+    only served up to a watermark that no in-flight write can still land behind
+    (see ``settled_before``). Without a cursor the feed starts from the oldest row.
+    """
+    updated_at_col = model.updated_at
+    id_col = model.id
+
+    if cursor:
+        after_ts, after_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            updated_at_col > after_ts,
+            and_(updated_at_col == after_ts, id_col > after_id)
+        ))
+    query = query.filter(updated_at_col <= settled_before(query.session, settle_seconds))
+
+    rows = query.order_by(updated_at_col, id_col).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    if rows:
+        cursor = encode_cursor(rows[-1].updated_at, rows[-1].id)
+    return rows, cursor, has_more
+
+
+def settled_before(session, settle_seconds):
+    """
+    The newest ``updated_at`` the feed may serve.
+
+    On PostgreSQL this is the start of the oldest transaction that has written and
+    not yet committed, because every timestamp that transaction stamped is later
+    than its start. It is never older than DB_LONG_STATEMENT_TIMEOUT_MS, so one
+    stuck session cannot stall the feed indefinitely. ``settle_seconds`` is taken
+    off either way to cover clock skew between app hosts and the stamp-to-UPDATE
+    gap. Elsewhere (SQLite has a single writer) only ``settle_seconds`` applies.
+    """
+    now = datetime.utcnow()
+    watermark = now
+    if session.get_bind().dialect.name == "postgresql":
+        oldest_write = session.execute(text(
+            "SELECT min(xact_start) AT TIME ZONE 'UTC' FROM pg_stat_activity "
+            "WHERE backend_xid IS NOT NULL AND datname = current_database() AND pid <> pg_backend_pid()"
+        )).scalar()
+        if oldest_write is not None:
+            long_timeout = timedelta(milliseconds=current_app.config.get("DB_LONG_STATEMENT_TIMEOUT_MS", 120000))
+            watermark = min(now, max(oldest_write, now - long_timeout))
+    return watermark - timedelta(seconds=settle_seconds)
+
+
+def change_feed_page(query, model, args, serialize):
+    """
+    Builds a change feed response body from request ``args`` (``cursor``, ``limit``).
+    Raises ValueError on a bad cursor or limit.
+    """
+    try:
+        limit = int(args.get("limit", 100))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    limit = min(max(limit, 1), current_app.config.get("CHANGE_FEED_MAX_LIMIT", 500))
+
+    rows, cursor, has_more = changes_since(
+        query, model, args.get("cursor"), limit,
+        current_app.config.get("CHANGE_FEED_SETTLE_SECONDS", 2)
+    )
+    return {
+        "changes": [serialize(row) for row in rows],
+        "cursor": cursor,
+        "has_more": has_more
+    }
@@ -0,0 +1,52 @@
+import hashlib
+from functools import wraps
+from flask import g, make_response, request
+
+
+def conditional(marker):
+    """
+    Adds an ETag validator to a read endpoint.
+
+    ``marker`` is called with the view's arguments before the view runs and returns
+    a tuple describing the state of everything the response is built from
+    (typically ``table_versions(...)`` of the tables it reads), or None to skip
+    validation (e.g. the view will 404). A request whose If-None-Match still
+    matches gets a 304 straight away, without loading rows or serializing. The
+    ETag is weak because it describes the data, not the bytes.
+
+    There is no Last-Modified / If-Modified-Since: timestamps are taken before
+    the writing transaction commits and have one-second resolution, so a date
+    cannot tell a client reliably that nothing changed since its copy.
+
+    The state is also left on ``g`` for ``validator_state()``: anything the view
+    caches must be keyed by it, otherwise a cached value from before a write would
+    go out under the new ETag and then be served as 304 indefinitely.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            state = marker(*args, **kwargs)
+            if state is None:
+                return view(*args, **kwargs)
+            g.conditional_state = tuple(state)
+            etag = hashlib.sha1(
+                repr((request.path, request.query_string, tuple(state))).encode()
+            ).hexdigest()
+            not_modified = request.if_none_match.contains_weak(etag)
+
+            try:
+                response = make_response("", 304) if not_modified else make_response(view(*args, **kwargs))
+            finally:
+                g.pop("conditional_state", None)
+            if response.status_code in (200, 304):
+                response.set_etag(etag, weak=True)
+                # Cacheable by the client only, and always revalidated
+                response.headers["Cache-Control"] = "private, no-cache"
+            return response
+        return wrapper
+    return decorator
+
+
+def validator_state():
+    """The marker state of the running ``@conditional`` view, or None; include it in cache keys."""
+    return g.get("conditional_state")
@@ -0,0 +1,48 @@
+import math
+from flask import current_app
+from sqlalchemy import text
+from app.extensions import db, count_cache
+from app.services.conditional_get import validator_state
+
+
+def count_rows(query, signature, table_name, filtered):
+    """
+    Returns ``(total, is_estimate)`` for an admin listing.
+
+    Counts are cached for COUNT_CACHE_TTL seconds per filter ``signature``. An
+    unfiltered listing over a PostgreSQL table with at least COUNT_ESTIMATE_THRESHOLD
+    rows uses the planner's row estimate instead of scanning the table; everything
+    else gets one exact COUNT. Under ``@conditional`` the key includes the
+    validator state, so a write starts a fresh count instead of serving a stale
+    total under the new ETag.
+    """
+    signature = (signature, validator_state())
+    hit, cached = count_cache.get(signature)
+    if hit:
+        return cached
+
+    result = None
+    if not filtered and db.engine.dialect.name == "postgresql":
+        estimate = _planner_estimate(table_name)
+        if estimate is not None and estimate >= current_app.config.get("COUNT_ESTIMATE_THRESHOLD", 100000):
+            result = (estimate, True)
+    if result is None:
+        result = (query.order_by(None).count(), False)
+
+    count_cache.set(signature, result)
+    return result
+
+
+def total_pages(total, per_page):
+    return max(1, math.ceil(total / per_page)) if per_page > 0 else 1
+
+
+def _planner_estimate(table_name):
+    # reltuples is -1 (PG 14+) or 0 for a table that has never been analyzed
+    estimate = db.session.execute(
+        text("SELECT reltuples::bigint FROM pg_class WHERE oid = to_regclass(:table_name)"),
+        {"table_name": table_name}
+    ).scalar()
+    if estimate is None or estimate <= 0:
+        return None
+    return int(estimate)
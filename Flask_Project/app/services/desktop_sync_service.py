@@ -0,0 +1,296 @@
+from datetime import datetime
+from werkzeug.security import generate_password_hash
+from app.extensions import db
+from app.models import Shipment, User, PaymentRequest
+from app.services.analytics_service import record_new_users, record_shipments
+from app.services.tracking_service import notify_shipment_changed
+from app.utils import dialect_insert, generate_shipment_id_str
+
+PLACEHOLDER_EMAIL_DOMAIN = "desktop-app-user.local"
+
+# Payload fields stored in NOT NULL shipment columns, by payload section
+REQUIRED_PARTY_FIELDS = {
+    section: {
+        key: getattr(Shipment, f"{section}_{column}")
+        for key, column in (
+            ("name", "name"), ("city", "address_city"), ("state", "address_state"),
+            ("pincode", "address_pincode"), ("country", "address_country"), ("phone", "phone"),
+        )
+    }
+    for section in ("sender", "receiver")
+}
+
+
+def placeholder_email(sender_name):
+    """
+    Desktop transactions carry no user session, so shipments are attached to a
+    placeholder user whose email is derived from the sender's name.
+    Returns None when the name has no usable characters.
+    """
+    sender_name_slug = "".join(filter(str.isalnum, sender_name or '')).lower()
+    if not sender_name_slug:
+        return None
+    return f"{sender_name_slug}@{PLACEHOLDER_EMAIL_DOMAIN}"
+
+
+def _split_name(sender_name):
+    name_parts = (sender_name or 'Placeholder').split(' ')
+    first_name = name_parts[0]
+    last_name = ' '.join(name_parts[1:]) if len(name_parts) > 1 else 'User'
+    return first_name, last_name
+
+
+def upsert_placeholder_users(senders):
+    """
+    Returns ``{email: row}`` (rows have ``id`` and ``email``) for the given
+    ``{email: sender_name}`` mapping.
+
+    Existing and missing users are resolved by one INSERT ... ON CONFLICT ... RETURNING.
+    Placeholder accounts have no password, so no password hash is computed here.
+    Newly inserted users are counted into the analytics rollups.
+    """
+    if not senders:
+        return {}
+
+    now = datetime.utcnow()
+    values = []
+    for email, sender_name in senders.items():
+        first_name, last_name = _split_name(sender_name)
+        values.append({
+            "email": email,
+            "password": None,
+            "first_name": first_name,
+            "last_name": last_name,
+            "is_admin": False,
+            "is_placeholder": True,
+            "created_at": now,
+            "updated_at": now,
+        })
+
+    stmt = dialect_insert(User).values(values)
+    # A no-op update instead of DO NOTHING so RETURNING also yields the existing rows
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.email],
+        set_={"email": stmt.excluded.email}
+    ).returning(User.id, User.email, User.created_at)
+    users = {row.email: row for row in db.session.execute(stmt)}
+    # Existing rows keep their own created_at, so only fresh inserts carry ``now``
+    record_new_users([row.created_at for row in users.values() if row.created_at == now])
+    return users
+
+
+def upgrade_placeholder_user(user, email, password, first_name, last_name):
+    """
+    Turns a placeholder account into a real one that can log in. The user's
+    shipments follow the email change. The caller commits.
+
+    Only admins may do this: placeholder emails are guessable from sender names,
+    so a public signup must never be allowed to claim one.
+    """
+    if email != user.email:
+        Shipment.query.filter_by(user_id=user.id).update({"user_email": email}, synchronize_session=False)
+    user.email = email
+    user.password = generate_password_hash(password)
+    user.first_name = first_name
+    user.last_name = last_name
+    user.is_placeholder = False
+
+
+def build_desktop_shipment(user, transaction, sender, receiver, shipment_id_str):
+    """Builds the already-paid ("Booked") shipment for a desktop-app transaction."""
+    total_amount = float(transaction.get('amount', 0))
+    price_without_tax = round(total_amount / 1.18, 2)
+    tax_amount = round(total_amount - price_without_tax, 2)
+
+    now_iso = datetime.utcnow().isoformat()
+    tracking_history = [{
+        "stage": "Booked",
+        "date": now_iso,
+        "location": sender.get("city", "Origin"),
+        "activity": "Shipment booked and payment confirmed via desktop app."
+    }]
+
+    return Shipment(
+        user_id=user.id,
+        user_email=user.email,
+        shipment_id_str=shipment_id_str,
+        status="Booked",  # Directly set to "Booked"
+        tracking_history=tracking_history,
+        price_without_tax=price_without_tax,
+        tax_amount_18_percent=tax_amount,
+        total_with_tax_18_percent=total_amount,
+        sender_name=sender.get('name'),
+        sender_address_street=f"{sender.get('address_line1', '')}, {sender.get('address_line2', '')}",
+        sender_address_city=sender.get('city'),
+        sender_address_state=sender.get('state'),
+        sender_address_pincode=sender.get('pincode'),
+        sender_address_country=sender.get('country'),
+        sender_phone=sender.get('phone'),
+        receiver_name=receiver.get('name'),
+        receiver_address_street=f"{receiver.get('address_line1', '')}, {receiver.get('address_line2', '')}",
+        receiver_address_city=receiver.get('city'),
+        receiver_address_state=receiver.get('state'),
+        receiver_address_pincode=receiver.get('pincode'),
+        receiver_address_country=receiver.get('country'),
+        receiver_phone=receiver.get('phone'),
+        package_weight_kg=transaction.get('weight', 1),
+        # Using dummy values for dimensions as they are not in the request
+        package_width_cm=10,
+        package_height_cm=10,
+        package_length_cm=10,
+        pickup_date=datetime.strptime(transaction.get('date'), '%Y-%m-%d').date(),
+        service_type="Express" # Defaulting to Express, can be changed if needed
+    )
+
+
+def generate_unique_shipment_ids(count):
+    """
+    Returns ``count`` distinct shipment IDs not yet used by any shipment. Candidates
+    are checked against the table with one IN query per round and only the
+    colliding ones are regenerated.
+    """
+    ids = set()
+    while len(ids) < count:
+        candidates = set()
+        while len(candidates) < count - len(ids):
+            candidate = generate_shipment_id_str()
+            if candidate not in ids:
+                candidates.add(candidate)
+        taken = {
+            shipment_id_str for (shipment_id_str,) in db.session.query(Shipment.shipment_id_str).filter(
+                Shipment.shipment_id_str.in_(candidates)
+            )
+        }
+        ids |= candidates - taken
+    return list(ids)
+
+
+def sync_desktop_transactions(items):
+    """
+    Creates Booked shipments with approved payment requests for a batch of desktop
+    transactions in one database transaction.
+
+    Placeholder users are upserted once per distinct sender, and shipments and
+    payment requests are each inserted with a single flush, and each new shipment
+    is published as "created" when the transaction commits. Returns ``results``
+    keyed by UTR. UTRs that already have an approved payment are reported as
+    duplicates so a client can safely re-send a partially synced day.
+    """
+    results = {}
+    valid = []
+    for index, item in enumerate(items):
+        error, utr = _validate_item(item)
+        key = utr or f"#{index}"
+        if key in results:
+            results[key] = {"status": "error", "error": "UTR appears more than once in this batch."}
+            valid = [(u, i) for u, i in valid if u != key]
+        elif error:
+            results[key] = {"status": "error", "error": error}
+        else:
+            results[key] = None
+            valid.append((utr, item))
+
+    existing = dict(db.session.query(PaymentRequest.utr, Shipment.shipment_id_str).join(
+        Shipment, PaymentRequest.shipment_id == Shipment.id
+    ).filter(
+        PaymentRequest.utr.in_([utr for utr, _ in valid]),
+        PaymentRequest.status == 'Approved'
+    ).all()) if valid else {}
+
+    pending = []
+    for utr, item in valid:
+        if utr in existing:
+            results[utr] = {"status": "duplicate", "shipment_id_str": existing[utr]}
+        else:
+            pending.append((utr, item))
+
+    senders = {}
+    for _, item in pending:
+        senders.setdefault(placeholder_email(item['sender'].get('name')), item['sender'].get('name'))
+    users = upsert_placeholder_users(senders)
+
+    shipments = []
+    for (utr, item), shipment_id_str in zip(pending, generate_unique_shipment_ids(len(pending))):
+        user = users[placeholder_email(item['sender'].get('name'))]
+        shipments.append(build_desktop_shipment(user, item['transaction'], item['sender'], item['receiver'], shipment_id_str))
+    db.session.add_all(shipments)
+    db.session.flush()
+    record_shipments(shipments)
+
+    payments = [
+        PaymentRequest(
+            user_id=shipment.user_id,
+            shipment_id=shipment.id,
+            amount=shipment.total_with_tax_18_percent,
+            utr=utr,
+            status='Approved'
+        )
+        for (utr, _), shipment in zip(pending, shipments)
+    ]
+    db.session.add_all(payments)
+    db.session.flush()
+
+    # Read everything needed before commit expires the new rows, which would
+    # otherwise reload each shipment and payment with its own SELECT
+    for (utr, _), shipment, payment in zip(pending, shipments, payments):
+        results[utr] = {
+            "status": "created",
+            "shipment_id_str": shipment.shipment_id_str,
+            "payment_id": payment.id,
+            "shipment_status": shipment.status,
+            "payment_status": payment.status
+        }
+        notify_shipment_changed(shipment.shipment_id_str, shipment.user_email, shipment.status,
+                                shipment.tracking_history[0], event_type="created")
+    db.session.commit()
+    return results
+
+
+def _validate_item(item):
+    """Returns ``(error, utr)`` for one batch entry."""
+    if not isinstance(item, dict) or not all(isinstance(item.get(k), dict) for k in ("transaction", "sender", "receiver")):
+        return "Missing transaction, sender, or receiver.", None
+
+    transaction = item['transaction']
+    utr = transaction.get('utr')
+    if not utr:
+        return "Transaction UTR is required.", None
+    utr = str(utr)
+    if not placeholder_email(item['sender'].get('name')):
+        return "Sender name is required to associate a user.", utr
+
+    try:
+        if float(transaction.get('amount', 0)) <= 0:
+            return "Transaction amount must be positive.", utr
+    except (TypeError, ValueError):
+        return "Invalid transaction amount.", utr
+
+    return validate_desktop_fields(transaction, item['sender'], item['receiver']), utr
+
+
+def validate_desktop_fields(transaction, sender, receiver):
+    """
+    Checks everything ``build_desktop_shipment`` stores in a NOT NULL or bounded
+    column, so a bad entry is reported instead of failing the whole transaction.
+    Returns an error message or None.
+    """
+    for section, party in (("sender", sender), ("receiver", receiver)):
+        for key, column in REQUIRED_PARTY_FIELDS[section].items():
+            value = party.get(key)
+            if value is None or not str(value).strip():
+                return f"{section.title()} {key} is required."
+            if len(str(value)) > column.type.length:
+                return f"{section.title()} {key} must be at most {column.type.length} characters."
+
+    try:
+        weight = float(transaction.get('weight', 1))
+    except (TypeError, ValueError):
+        return "Invalid package weight."
+    if not 0 < weight < 10 ** 8:
+        return "Package weight must be positive."
+
+    try:
+        datetime.strptime(transaction.get('date') or '', '%Y-%m-%d')
+    except (TypeError, ValueError):
+        return "Transaction date must be in YYYY-MM-DD format."
+    return None
@@ -17,6 +17,13 @@ def _load_json_data(filename):
 DOMESTIC_ZONES = _load_json_data('domestic.json')
 DOMESTIC_PRICES = _load_json_data('dom_prices.json')
 
+# Lowercased city/state -> zone column, built once at import. The first column
+# listing a location wins, matching the order the zones are declared in.
+ZONE_INDEX = {}
+for _column, _locations in (DOMESTIC_ZONES or {}).items():
+    for _location in _locations:
+        ZONE_INDEX.setdefault(_location.lower(), _column)
+
 def calculate_domestic_price(state_name: str, city_name: str, mode: str, weight_kg: float):
     """
     Calculates domestic shipping price based on state, mode, and weight.
@@ -26,23 +33,8 @@ def calculate_domestic_price(state_name: str, city_name: str, mode: str, weight_
         return {"error": "Pricing data could not be loaded."}
 
     # 1. FIND COLUMN NUMBER (ZONE) - City first, then State
-    selected_column = None
-    destination_lower = city_name.lower()
+    selected_column = ZONE_INDEX.get(city_name.lower()) or ZONE_INDEX.get(state_name.lower())
 
-    # Check city first
-    for column, locations in DOMESTIC_ZONES.items():
-        if any(loc.lower() == destination_lower for loc in locations):
-            selected_column = column
-            break
-    
-    # If city not found, check state
-    if not selected_column:
-        destination_lower = state_name.lower()
-        for column, locations in DOMESTIC_ZONES.items():
-            if any(loc.lower() == destination_lower for loc in locations):
-                selected_column = column
-                break
-            
     if not selected_column:
         return {"error": f"The destination '{city_name}, {state_name}' is not currently serviced."}
 
@@ -0,0 +1,271 @@
+import json
+import os
+import select
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from flask import current_app
+from sqlalchemy import text
+from app.transactions import after_commit, before_commit, transaction_state
+
+
+class EventBroker(ABC):
+    """
+    Interface for the live-update pub/sub used by the Server-Sent Events streams.
+
+    Events are ``(id, type, data)`` tuples published to a named channel and sent
+    when the publishing transaction commits. IDs are increasing integers assigned by
+    the publisher; they are what a reconnecting client sends back as
+    ``Last-Event-ID``. Listeners receive events in delivery (commit) order, which
+    across workers is not necessarily ID order.
+    """
+
+    @abstractmethod
+    def publish(self, channel, event_type, data):
+        """Queues an event on ``channel`` for when the current transaction commits and returns its ID."""
+
+    @abstractmethod
+    def position(self):
+        """An opaque marker of the events delivered so far, for ``listen(position=...)``."""
+
+    @abstractmethod
+    def listen(self, channel, last_event_id=None, heartbeat=15, max_duration=300, position=None):
+        """
+        Yields events on ``channel`` after ``last_event_id``, or after ``position``
+        (default: now), and ``None`` when ``heartbeat`` seconds pass without one.
+        Stops after ``max_duration`` seconds.
+        """
+
+
+class InMemoryBroker(EventBroker):
+    """
+    Keeps the last ``backlog`` events per channel in process memory, for at most
+    ``max_channels`` channels; the least recently used channel's backlog is dropped
+    first, so one channel per shipment and user does not grow without bound.
+
+    Each delivered event gets a local sequence number, and listeners follow that
+    sequence rather than the publisher's ID, so an event that is delivered late
+    (a slower transaction, another worker) is never skipped.
+
+    Only subscribers in the same worker process see the events, which is enough for
+    development, tests and single-worker deployments.
+    """
+
+    def __init__(self, backlog=100, max_channels=10000):
+        self.backlog = backlog
+        self.max_channels = max_channels
+        self._channels = OrderedDict()
+        self._last_id = 0
+        self._seq = 0
+        self._cond = threading.Condition()
+
+    def publish(self, channel, event_type, data):
+        event_id = self._next_id()
+        after_commit(lambda: self._deliver(channel, event_id, event_type, data))
+        return event_id
+
+    def position(self):
+        with self._cond:
+            return self._seq
+
+    def listen(self, channel, last_event_id=None, heartbeat=15, max_duration=300, position=None):
+        # The starting point is fixed now, not when the caller first iterates
+        deadline = time.monotonic() + max_duration
+        with self._cond:
+            cursor, replay = self._resume(channel, last_event_id, position)
+        return self._follow(channel, cursor, replay, heartbeat, deadline)
+
+    def _follow(self, channel, cursor, replay, heartbeat, deadline):
+        for seq, event_id, event_type, data in replay:
+            yield event_id, event_type, data
+
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            with self._cond:
+                events = self._events_after(channel, cursor)
+                if not events:
+                    self._cond.wait(timeout=min(heartbeat, remaining))
+                    events = self._events_after(channel, cursor)
+            if not events:
+                yield None
+                continue
+            for seq, event_id, event_type, data in events:
+                cursor = seq
+                yield event_id, event_type, data
+
+    def _resume(self, channel, last_event_id, position):
+        # Returns (cursor, events to replay first). A client resuming from an event
+        # this process delivered continues right after it; otherwise (it was
+        # connected to another worker, or the backlog moved on) it is sent the
+        # backlog events with a newer ID.
+        if last_event_id is None:
+            return (self._seq if position is None else position), []
+        events = self._channels.get(channel, ())
+        for event in events:
+            if event[1] == last_event_id:
+                return event[0], []
+        return self._seq, [e for e in events if e[1] > last_event_id]
+
+    def _next_id(self):
+        # Microsecond timestamps keep IDs roughly ordered across worker processes,
+        # so Last-Event-ID still means something after reconnecting to another one.
+        with self._cond:
+            self._last_id = max(self._last_id + 1, time.time_ns() // 1000)
+            return self._last_id
+
+    def _deliver(self, channel, event_id, event_type, data):
+        with self._cond:
+            self._seq += 1
+            events = self._channels.get(channel)
+            if events is None:
+                events = self._channels[channel] = deque(maxlen=self.backlog)
+                if len(self._channels) > self.max_channels:
+                    self._channels.popitem(last=False)
+            else:
+                self._channels.move_to_end(channel)
+            events.append((self._seq, event_id, event_type, data))
+            self._cond.notify_all()
+
+    def _events_after(self, channel, cursor):
+        events = self._channels.get(channel)
+        if events is None:
+            return []
+        # Being listened to counts as use, so a watched channel keeps its backlog
+        self._channels.move_to_end(channel)
+        return [e for e in events if e[0] > cursor]
+
+
+class PostgresBroker(InMemoryBroker):
+    """
+    Shares events between worker processes through Postgres LISTEN/NOTIFY.
+
+    Events published during a transaction are sent with one ``pg_notify`` statement
+    on that transaction's connection just before it commits, so Postgres delivers
+    them only if it commits, in commit order. Every process runs one listener
+    thread that feeds the notifications into its local backlog, so resuming works
+    the same as in memory.
+    """
+
+    pg_channel = "shipment_events"
+    max_payload = 7500  # bytes; NOTIFY payloads must stay under 8000
+
+    def __init__(self, engine, backlog=100, max_channels=10000):
+        super().__init__(backlog, max_channels)
+        self.engine = engine
+        self._listener_pid = None
+        self._listener_lock = threading.Lock()
+
+    def publish(self, channel, event_type, data):
+        event_id = self._next_id()
+        state = transaction_state()
+        pending = state.get("notifies")
+        if pending is None:
+            session = current_app.extensions["sqlalchemy"].session
+            pending = state["notifies"] = []
+            before_commit(lambda: self._send(session, pending))
+        pending.append(json.dumps({"id": event_id, "channel": channel, "type": event_type, "data": data}))
+        return event_id
+
+    def _send(self, session, events):
+        payloads, chunk, size = [], [], 0
+        for event in events:
+            if len(event.encode()) + 2 > self.max_payload:
+                # Too big for NOTIFY; the change itself still reaches pollers
+                continue
+            if chunk and size + len(event.encode()) + 1 > self.max_payload:
+                payloads.append("[" + ",".join(chunk) + "]")
+                chunk, size = [], 0
+            chunk.append(event)
+            size += len(event.encode()) + 1
+        if chunk:
+            payloads.append("[" + ",".join(chunk) + "]")
+        if payloads:
+            session.connection(bind_arguments={"bind": self.engine}).execute(
+                text("SELECT pg_notify(:pg_channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+                {"pg_channel": self.pg_channel, "payloads": payloads}
+            )
+
+    def listen(self, channel, last_event_id=None, heartbeat=15, max_duration=300, position=None):
+        self._ensure_listener()
+        return super().listen(channel, last_event_id, heartbeat, max_duration, position)
+
+    def position(self):
+        self._ensure_listener()
+        return super().position()
+
+    def _ensure_listener(self):
+        # Started lazily so that each forked worker gets its own thread and connection.
+        with self._listener_lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            threading.Thread(target=self._run_listener, name="event-broker-listener", daemon=True).start()
+
+    def _run_listener(self):
+        while True:
+            try:
+                raw = self.engine.raw_connection()
+                try:
+                    conn = raw.driver_connection
+                    conn.autocommit = True
+                    with conn.cursor() as cur:
+                        cur.execute(f"LISTEN {self.pg_channel}")
+                    while True:
+                        if select.select([conn], [], [], 30) == ([], [], []):
+                            continue
+                        conn.poll()
+                        while conn.notifies:
+                            notify = conn.notifies.pop(0)
+                            for event in json.loads(notify.payload):
+                                self._deliver(event["channel"], event["id"], event["type"], event["data"])
+                finally:
+                    raw.invalidate()
+            except Exception:
+                # Connection dropped; back off and listen again.
+                time.sleep(1)
+
+
+class EventBus:
+    """
+    Flask extension that picks the broker from ``EVENT_BROKER`` ("memory" or
+    "postgres") and limits this process to SSE_MAX_STREAMS open streams.
+    """
+
+    def __init__(self):
+        self.broker = None
+        self._stream_slots = None
+
+    def init_app(self, app):
+        self._stream_slots = threading.BoundedSemaphore(app.config.get("SSE_MAX_STREAMS", 4))
+        backlog = app.config.get("EVENT_BACKLOG", 100)
+        max_channels = app.config.get("EVENT_MAX_CHANNELS", 10000)
+        if app.config.get("EVENT_BROKER", "memory") == "postgres":
+            if app.config.get("DB_PGBOUNCER"):
+                # LISTEN needs a session-mode connection; through transaction pooling
+                # notifications would silently never arrive
+                raise RuntimeError("EVENT_BROKER=postgres does not work with DB_PGBOUNCER=1 (transaction pooling)")
+            from app.extensions import db
+            with app.app_context():
+                self.broker = PostgresBroker(db.engine, backlog, max_channels)
+        else:
+            self.broker = InMemoryBroker(backlog, max_channels)
+
+    def publish(self, channel, event_type, data):
+        """Queues an event for when the current transaction commits; call before committing."""
+        return self.broker.publish(channel, event_type, data)
+
+    def position(self):
+        return self.broker.position()
+
+    def listen(self, channel, last_event_id=None, heartbeat=15, max_duration=300, position=None):
+        return self.broker.listen(channel, last_event_id, heartbeat, max_duration, position)
+
+    def open_stream(self):
+        """Reserves a stream slot without waiting; False when this process is at SSE_MAX_STREAMS."""
+        return self._stream_slots.acquire(blocking=False)
+
+    def close_stream(self):
+        self._stream_slots.release()
@@ -0,0 +1,258 @@
+import hashlib
+import json
+import os
+import socket
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from sqlalchemy import or_, update
+from sqlalchemy.exc import IntegrityError
+from app.db_routing import use_replica
+from app.extensions import db
+from app.models import ExportJob
+from app.services.admin_filters import SHIPMENT_FILTER_KEYS, PAYMENT_FILTER_KEYS, USER_FILTER_KEYS, parse_date_range
+from app.services.export_service import EXPORTS, export_filename, iter_export
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+EXPORT_FILTER_KEYS = {
+    "shipments": SHIPMENT_FILTER_KEYS,
+    "payments": PAYMENT_FILTER_KEYS,
+    "users": USER_FILTER_KEYS,
+}
+
+
+class ExportJobRunner:
+    """
+    Flask extension running export jobs on a thread pool in the process that
+    accepted them. Job state lives in the export_jobs table, so any worker can
+    report progress. Artifacts are written to EXPORT_DIR, which is local disk: a
+    finished file exists only on the host that built it, and only workers on that
+    host can serve it or delete it when it expires. With more than one host,
+    EXPORT_DIR has to be shared storage (or downloads routed to the owning host).
+
+    Each job holds a lease (``owner`` and ``heartbeat_at``). A job whose process
+    died, through a restart, a deploy or a crash, is failed by ``expire_stale``:
+    at once if it belonged to a process on this host that no longer exists, and
+    otherwise once its heartbeat is older than EXPORT_JOB_LEASE_SECONDS.
+    """
+
+    def __init__(self):
+        self.app = None
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+        app.config.setdefault("EXPORT_DIR", os.path.join(app.instance_path, "exports"))
+
+    def submit(self, kind, filters, compress=False):
+        """
+        Returns the job for this export, creating and scheduling it unless an
+        identical job is already queued or running. Raises ValueError on bad input.
+        """
+        if kind not in EXPORTS:
+            raise ValueError(f"Unknown export kind. Use one of: {', '.join(EXPORTS)}")
+        if not isinstance(filters, dict):
+            raise ValueError("filters must be an object")
+        filters = {key: str(filters[key]) for key in EXPORT_FILTER_KEYS[kind] if filters.get(key)}
+        parse_date_range(filters)
+
+        self.expire_stale()
+        self.purge_expired()
+        fingerprint = hashlib.sha256(
+            json.dumps([kind, filters, bool(compress)], sort_keys=True).encode()
+        ).hexdigest()
+
+        existing = self._active_job(fingerprint)
+        if existing:
+            return existing, False
+
+        job = ExportJob(
+            id=uuid.uuid4().hex,
+            kind=kind,
+            filters=filters,
+            compress=bool(compress),
+            fingerprint=fingerprint,
+            status='queued',
+            owner=_owner_id(),
+            heartbeat_at=datetime.utcnow()
+        )
+        db.session.add(job)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # An identical request won the race; attach to its job
+            db.session.rollback()
+            return self._active_job(fingerprint), False
+
+        self._get_executor().submit(self._run, job.id)
+        return job, True
+
+    def purge_expired(self):
+        """Deletes finished jobs older than EXPORT_JOB_RETENTION_HOURS along with their files."""
+        cutoff = datetime.utcnow() - timedelta(hours=self.app.config.get("EXPORT_JOB_RETENTION_HOURS", 24))
+        expired = ExportJob.query.filter(
+            ExportJob.created_at < cutoff,
+            ExportJob.status.in_(['completed', 'failed'])
+        ).all()
+        for job in expired:
+            if job.file_path and os.path.exists(job.file_path):
+                os.remove(job.file_path)
+            db.session.delete(job)
+        if expired:
+            db.session.commit()
+
+    def expire_stale(self):
+        """Fails queued or running jobs whose process is gone. Returns how many were failed."""
+        now = datetime.utcnow()
+        cutoff = now - timedelta(seconds=self.app.config.get("EXPORT_JOB_LEASE_SECONDS", 900))
+        local_prefix = f"{socket.gethostname()}:"
+        dead_owners = {
+            owner for (owner,) in db.session.query(ExportJob.owner).filter(
+                ExportJob.status.in_(ACTIVE_STATUSES),
+                ExportJob.owner.startswith(local_prefix, autoescape=True)
+            ).distinct()
+            if not _process_alive(int(owner[len(local_prefix):]))
+        }
+        expired = db.session.execute(
+            update(ExportJob).where(
+                ExportJob.status.in_(ACTIVE_STATUSES),
+                or_(ExportJob.heartbeat_at < cutoff, ExportJob.heartbeat_at.is_(None), ExportJob.owner.in_(dead_owners))
+            ).values(
+                status='failed',
+                error="The export was interrupted (its worker stopped); submit it again",
+                finished_at=now
+            )
+        ).rowcount
+        db.session.commit()
+        return expired
+
+    def _active_job(self, fingerprint):
+        return ExportJob.query.filter(
+            ExportJob.fingerprint == fingerprint,
+            ExportJob.status.in_(ACTIVE_STATUSES)
+        ).first()
+
+    def _get_executor(self):
+        # Created lazily (and again after a fork) so pool threads belong to this process
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.app.config.get("EXPORT_JOB_WORKERS", 2),
+                    thread_name_prefix="export-job"
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+    def _run(self, job_id):
+        with self.app.app_context():
+            job = db.session.get(ExportJob, job_id)
+            export_dir = self.app.config["EXPORT_DIR"]
+            os.makedirs(export_dir, exist_ok=True)
+            final_path = os.path.join(export_dir, f"{job.id}.csv" + (".gz" if job.compress else ""))
+            tmp_path = final_path + ".part"
+
+            try:
+                _, _, build_query, _ = EXPORTS[job.kind]
+                now = datetime.utcnow()
+                claimed = db.session.execute(
+                    update(ExportJob).where(ExportJob.id == job_id, ExportJob.status == 'queued').values(
+                        status='running', started_at=now, heartbeat_at=now, owner=_owner_id()
+                    )
+                ).rowcount
+                db.session.commit()
+                if not claimed:
+                    # Expired while waiting for a pool thread
+                    return
+                db.session.refresh(job)
+                with use_replica():
+                    job.rows_total = build_query(job.filters).order_by(None).count()
+                db.session.commit()
+
+                written = [0]
+
+                def progress(rows):
+                    written[0] = rows
+                    if db.engine.dialect.name == "sqlite":
+                        # Committing would hand back the connection the open cursor is
+                        # reading from, and a second connection cannot write while it
+                        # reads (database is locked); SQLite exports report only at the end
+                        return
+                    # Committing the session would close the server-side cursor the
+                    # export is reading from, so write on a separate connection
+                    with db.engine.begin() as conn:
+                        conn.execute(update(ExportJob).where(ExportJob.id == job_id).values(
+                            rows_written=rows, heartbeat_at=datetime.utcnow()
+                        ))
+
+                chunk_size = self.app.config.get("EXPORT_CHUNK_SIZE", 1000)
+                with open(tmp_path, "wb") as f, use_replica():
+                    for chunk in iter_export(job.kind, job.filters, chunk_size=chunk_size,
+                                             compress=job.compress, progress=progress):
+                        f.write(chunk)
+                os.replace(tmp_path, final_path)
+
+                # Only while this process still holds the lease: if expire_stale failed
+                # the job meanwhile (a missed heartbeat), a resubmitted job may already
+                # be running, and this one must stay failed
+                finished = self._finish(job_id, status='completed', rows_written=written[0], file_path=final_path)
+                if not finished and os.path.exists(final_path):
+                    os.remove(final_path)
+            except Exception as e:
+                db.session.rollback()
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                self._finish(job_id, status='failed', error=str(e))
+
+    def _finish(self, job_id, **values):
+        finished = db.session.execute(
+            update(ExportJob).where(
+                ExportJob.id == job_id,
+                ExportJob.status == 'running',
+                ExportJob.owner == _owner_id()
+            ).values(finished_at=datetime.utcnow(), **values)
+        ).rowcount
+        db.session.commit()
+        return finished
+
+
+def _owner_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def built_on_this_host(job):
+    """Whether the job ran on this host, the only one whose EXPORT_DIR can hold its file."""
+    return (job.owner or "").rpartition(":")[0] == socket.gethostname()
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def serialize_export_job(job):
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "filters": job.filters,
+        "gzip": job.compress,
+        "status": job.status,
+        "rows_total": job.rows_total,
+        "rows_written": job.rows_written,
+        "progress": round(job.rows_written / job.rows_total, 4) if job.rows_total else (1.0 if job.status == 'completed' else 0.0),
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "download_name": export_filename(job.kind, job.compress, job.created_at) if job.status == 'completed' else None,
+    }
+
+
+export_jobs = ExportJobRunner()
@@ -0,0 +1,174 @@
+import csv
+import zlib
+from datetime import datetime
+from io import StringIO
+from sqlalchemy import func
+from app.extensions import db
+from app.models import Shipment, User, PaymentRequest
+from app.services.admin_filters import filter_shipments, filter_payments, filter_users
+
+
+def _shipments_query(filters):
+    return filter_shipments(db.session.query(
+        Shipment.shipment_id_str,
+        Shipment.service_type,
+        Shipment.sender_name,
+        Shipment.sender_address_city,
+        Shipment.receiver_name,
+        Shipment.receiver_address_city,
+        Shipment.package_weight_kg,
+        Shipment.booking_date,
+        Shipment.price_without_tax,
+        Shipment.tax_amount_18_percent,
+        Shipment.total_with_tax_18_percent,
+        Shipment.status
+    ), filters).order_by(Shipment.booking_date.desc())
+
+
+def _shipment_row(s):
+    return [
+        s.shipment_id_str,
+        s.service_type,
+        s.sender_name,
+        s.sender_address_city,
+        s.receiver_name,
+        s.receiver_address_city,
+        float(s.package_weight_kg),
+        s.booking_date.strftime('%Y-%m-%d %H:%M'),
+        float(s.price_without_tax),
+        float(s.tax_amount_18_percent),
+        float(s.total_with_tax_18_percent),
+        s.status
+    ]
+
+
+def _payments_query(filters):
+    return filter_payments(db.session.query(
+        PaymentRequest.id,
+        Shipment.shipment_id_str,
+        User.first_name,
+        User.last_name,
+        PaymentRequest.amount,
+        PaymentRequest.utr,
+        PaymentRequest.status,
+        PaymentRequest.created_at
+    ).join(
+        User, PaymentRequest.user_id == User.id
+    ).join(
+        Shipment, PaymentRequest.shipment_id == Shipment.id
+    ), filters).order_by(PaymentRequest.created_at.desc())
+
+
+def _payment_row(p):
+    return [
+        p.id,
+        p.shipment_id_str,
+        f"{p.first_name} {p.last_name}",
+        float(p.amount),
+        p.utr,
+        p.status,
+        p.created_at.strftime('%Y-%m-%d %H:%M')
+    ]
+
+
+def _users_query(filters):
+    shipment_counts = db.session.query(
+        Shipment.user_id,
+        func.count(Shipment.id).label("shipment_count")
+    ).group_by(Shipment.user_id).subquery()
+    return filter_users(db.session.query(
+        User.id,
+        User.first_name,
+        User.last_name,
+        User.email,
+        User.is_placeholder,
+        User.created_at,
+        func.coalesce(shipment_counts.c.shipment_count, 0).label("shipment_count")
+    ).outerjoin(
+        shipment_counts, shipment_counts.c.user_id == User.id
+    ), filters).order_by(User.created_at.desc())
+
+
+def _user_row(u):
+    return [
+        u.id,
+        u.first_name,
+        u.last_name,
+        u.email,
+        "Yes" if u.is_placeholder else "No",
+        u.created_at.strftime('%Y-%m-%d %H:%M'),
+        u.shipment_count
+    ]
+
+
+# kind -> (filename prefix, CSV headers, query builder taking a filters mapping, row formatter)
+EXPORTS = {
+    "shipments": (
+        "orders",
+        ["Order #", "Type", "Sender", "Sender City", "Receiver", "Receiver City", "Weight (kg)",
+         "Date", "Price (excl. tax)", "Tax (18%)", "Total Amount", "Status"],
+        _shipments_query,
+        _shipment_row,
+    ),
+    "payments": (
+        "payments",
+        ["Payment #", "Order #", "Customer", "Amount", "UTR", "Status", "Date"],
+        _payments_query,
+        _payment_row,
+    ),
+    "users": (
+        "users",
+        ["User #", "First Name", "Last Name", "Email", "Placeholder", "Joined", "Shipments"],
+        _users_query,
+        _user_row,
+    ),
+}
+
+
+def export_filename(kind, compress=False, timestamp=None):
+    prefix = EXPORTS[kind][0]
+    timestamp = timestamp or datetime.now()
+    return f"{prefix}_{timestamp.strftime('%Y%m%d_%H%M%S')}.csv" + (".gz" if compress else "")
+
+
+def iter_export(kind, filters, chunk_size=1000, compress=False, progress=None):
+    """
+    Yields the CSV export for ``kind`` as byte chunks, optionally gzip-compressed.
+
+    Rows are read through a server-side cursor ``chunk_size`` at a time and each
+    chunk is encoded and handed on before the next is fetched, so memory stays
+    flat whatever the size of the export. ``progress`` is called with the running
+    row count after every chunk.
+    """
+    _, headers, build_query, format_row = EXPORTS[kind]
+    query = build_query(filters).yield_per(chunk_size)
+    compressor = zlib.compressobj(wbits=31) if compress else None  # wbits=31 writes a gzip container
+
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(headers)
+
+    def drain():
+        data = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate()
+        return compressor.compress(data) if compressor else data
+
+    rows = 0
+    for row in query:
+        writer.writerow(format_row(row))
+        rows += 1
+        if rows % chunk_size == 0:
+            chunk = drain()
+            if chunk:
+                yield chunk
+            if progress:
+                progress(rows)
+
+    chunk = drain()
+    if compressor:
+        chunk += compressor.flush()
+    if chunk:
+        yield chunk
+    if progress:
+        progress(rows)
@@ -0,0 +1,161 @@
+import json
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import update
+from app.extensions import db
+from app.models import Shipment, SHIPMENT_STATUSES
+from app.services.analytics_service import record_status_changes
+from app.services.tracking_service import notify_shipment_changed
+
+
+def parse_scan_events(lines):
+    """
+    Parses NDJSON hub-scan lines lazily.
+
+    Yields ``(line_no, event, error)`` where exactly one of ``event`` and ``error``
+    is set. Blank lines are skipped.
+    """
+    for line_no, raw in enumerate(lines, start=1):
+        if isinstance(raw, bytes):
+            raw = raw.decode("utf-8", errors="replace")
+        raw = raw.strip()
+        if not raw:
+            continue
+
+        try:
+            data = json.loads(raw)
+        except ValueError:
+            yield line_no, None, "Invalid JSON"
+            continue
+        if not isinstance(data, dict):
+            yield line_no, None, "Each line must be a JSON object"
+            continue
+
+        shipment_id_str = data.get("shipment_id_str")
+        status = data.get("status")
+        if not shipment_id_str:
+            yield line_no, None, "shipment_id_str is required"
+            continue
+        if status not in SHIPMENT_STATUSES:
+            yield line_no, None, "Invalid or missing status"
+            continue
+
+        ts = data.get("ts")
+        if ts:
+            try:
+                scanned_at = datetime.fromisoformat(str(ts).replace('Z', '+00:00'))
+            except ValueError:
+                yield line_no, None, "Invalid ts format. Use ISO format (YYYY-MM-DDTHH:MM:SS)"
+                continue
+        else:
+            scanned_at = datetime.utcnow()
+
+        yield line_no, {
+            "shipment_id_str": shipment_id_str,
+            "status": status,
+            "location": data.get("location") or "",
+            "activity": data.get("activity") or f"Status updated to {status}",
+            "date": scanned_at.isoformat(),
+        }, None
+
+
+def apply_scan_batch(batch):
+    """
+    Applies a list of ``(line_no, event)`` pairs in one transaction.
+
+    The affected shipments are loaded with a single IN query and written back with
+    one executemany UPDATE keyed by primary key. Events for the same shipment are
+    applied in arrival order, so the last scan wins the status. If anything in the
+    batch fails (including taking the row locks, e.g. a lock or statement timeout)
+    the batch is rolled back and every event in it gets an ``error`` outcome; the
+    stream carries on with the next batch.
+    """
+    try:
+        return _apply_scan_batch(batch)
+    except Exception:
+        db.session.rollback()
+        current_app.logger.exception("Hub scan batch of %d events could not be saved", len(batch))
+        return [_outcome(line_no, event, "error", "Batch could not be saved") for line_no, event in batch]
+
+
+def _apply_scan_batch(batch):
+    shipment_ids = {event["shipment_id_str"] for _, event in batch}
+    rows = db.session.query(
+        Shipment.id,
+        Shipment.shipment_id_str,
+        Shipment.user_email,
+        Shipment.tracking_history,
+        Shipment.status,
+        Shipment.booking_date,
+        Shipment.service_type,
+        Shipment.total_with_tax_18_percent
+    ).filter(Shipment.shipment_id_str.in_(shipment_ids)).with_for_update().all()
+    found = {
+        row.shipment_id_str: {"id": row.id, "user_email": row.user_email, "tracking_history": list(row.tracking_history or [])}
+        for row in rows
+    }
+    originals = {row.shipment_id_str: row for row in rows}
+
+    outcomes = []
+    applied = []
+    for line_no, event in batch:
+        target = found.get(event["shipment_id_str"])
+        if target is None:
+            outcomes.append(_outcome(line_no, event, "rejected", "Shipment not found"))
+            continue
+        entry = {
+            "stage": event["status"],
+            "date": event["date"],
+            "location": event["location"],
+            "activity": event["activity"],
+        }
+        target["status"] = event["status"]
+        target["tracking_history"].append(entry)
+        applied.append((event["shipment_id_str"], target["user_email"], entry))
+        outcomes.append(_outcome(line_no, event, "applied"))
+
+    params = [
+        {"id": t["id"], "status": t["status"], "tracking_history": t["tracking_history"]}
+        for t in found.values() if "status" in t
+    ]
+    if not params:
+        db.session.rollback()  # release the row locks
+        return outcomes
+
+    status_changes = [
+        (row.booking_date, row.service_type, row.total_with_tax_18_percent, row.status, found[shipment_id_str]["status"])
+        for shipment_id_str, row in originals.items() if "status" in found[shipment_id_str]
+    ]
+    db.session.execute(update(Shipment), params)
+    record_status_changes(status_changes)
+    for shipment_id_str, user_email, entry in applied:
+        notify_shipment_changed(shipment_id_str, user_email, entry["stage"], entry)
+    db.session.commit()
+    return outcomes
+
+
+def ingest_scans(lines, batch_size):
+    """Groups parsed scan events into micro-batches and yields per-event outcomes as they are applied."""
+    batch = []
+    for line_no, event, error in parse_scan_events(lines):
+        if error:
+            yield {"line": line_no, "result": "rejected", "error": error}
+            continue
+        batch.append((line_no, event))
+        if len(batch) >= batch_size:
+            yield from apply_scan_batch(batch)
+            batch = []
+    if batch:
+        yield from apply_scan_batch(batch)
+
+
+def _outcome(line_no, event, result, error=None):
+    outcome = {
+        "line": line_no,
+        "shipment_id_str": event["shipment_id_str"],
+        "status": event["status"],
+        "result": result,
+    }
+    if error:
+        outcome["error"] = error
+    return outcome
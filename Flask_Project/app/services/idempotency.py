@@ -0,0 +1,202 @@
+import hashlib
+import random
+import time
+from datetime import datetime, timedelta
+from functools import wraps
+from flask import Response, current_app, jsonify, make_response, request
+from sqlalchemy import event
+from sqlalchemy.exc import IntegrityError
+from app.extensions import db
+from app.models import IdempotencyKey
+
+
+class IdempotencyKeyLost(RuntimeError):
+    """Raised from a view's commit when its Idempotency-Key now belongs to another request."""
+
+
+def idempotent(view):
+    """
+    Adds ``Idempotency-Key`` support to a write endpoint.
+
+    The first request with a key runs the view and stores its response; repeats
+    within IDEMPOTENCY_TTL_HOURS replay the stored response without touching any
+    domain table. A repeat that arrives while the first is still running waits for
+    it (up to IDEMPOTENCY_WAIT_SECONDS) instead of racing it. Requests without the
+    header are unaffected.
+
+    The key is marked ``committed`` inside the view's own commit, so it records
+    atomically whether the domain writes happened; the response is stored right
+    after. A key left ``in_progress`` for IDEMPOTENCY_STALE_SECONDS (its process
+    died before committing anything) is taken over by the next identical request
+    rather than blocking retries until the key expires. A key left ``committed``
+    without a response (the process died after the writes) is never run again;
+    retries get a 409.
+
+    With a key, a request runs up to six more statements (claim, takeover, marking
+    and storing); the route's ``@query_budget`` has to allow for them.
+    """
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        key = request.headers.get("Idempotency-Key")
+        if not key:
+            return view(*args, **kwargs)
+        if len(key) > 255:
+            return jsonify({"error": "Idempotency-Key must be at most 255 characters"}), 400
+
+        endpoint = request.path
+        request_hash = hashlib.sha256(request.get_data()).hexdigest()
+        deadline = time.monotonic() + current_app.config.get("IDEMPOTENCY_WAIT_SECONDS", 10)
+
+        while True:
+            record, claimed_at = _claim(key, endpoint, request_hash)
+            if claimed_at:
+                break
+            if record is not None:
+                if record.request_hash != request_hash:
+                    return jsonify({"error": "Idempotency-Key was already used with a different request"}), 422
+                if record.status == "completed":
+                    return _replay(record)
+                if record.status == "committed" and _is_stale(record):
+                    return jsonify({
+                        "error": "The request with this Idempotency-Key was applied, but its response was not recorded"
+                    }), 409
+            if time.monotonic() >= deadline:
+                return jsonify({"error": "A request with this Idempotency-Key is still being processed"}), 409
+            time.sleep(0.1)
+
+        session = db.session()
+        mark_committed = _marker(record.id, claimed_at)
+        event.listen(session, "before_commit", mark_committed)
+        try:
+            response = make_response(view(*args, **kwargs))
+        except Exception:
+            db.session.rollback()
+            _release(record.id, claimed_at)
+            raise
+        finally:
+            event.remove(session, "before_commit", mark_committed)
+
+        # Whatever the view left uncommitted (e.g. a 4xx after partial work) must not
+        # ride along with the commit that stores the response
+        db.session.rollback()
+        if response.status_code >= 500 or response.is_streamed:
+            _release(record.id, claimed_at)
+        else:
+            _store(record.id, claimed_at, response)
+        return response
+
+    return wrapper
+
+
+def purge_expired_idempotency_keys():
+    deleted = IdempotencyKey.query.filter(IdempotencyKey.expires_at <= datetime.utcnow()).delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
+
+
+def _claim(key, endpoint, request_hash):
+    """
+    Inserts an in-progress record for the key. Returns ``(record, claimed_at)``
+    when this request owns the key (``claimed_at`` identifies this claim, since a
+    stale key can be taken over), or the existing record (possibly None) and None.
+    """
+    now = datetime.utcnow()
+    if random.random() < current_app.config.get("IDEMPOTENCY_PURGE_PROBABILITY", 0.01):
+        purge_expired_idempotency_keys()
+
+    # An expired key is free to be reused
+    IdempotencyKey.query.filter(
+        IdempotencyKey.key == key,
+        IdempotencyKey.endpoint == endpoint,
+        IdempotencyKey.expires_at <= now
+    ).delete(synchronize_session=False)
+
+    record = IdempotencyKey(
+        key=key,
+        endpoint=endpoint,
+        request_hash=request_hash,
+        status="in_progress",
+        created_at=now,
+        expires_at=now + timedelta(hours=current_app.config.get("IDEMPOTENCY_TTL_HOURS", 24))
+    )
+    db.session.add(record)
+    try:
+        db.session.flush()
+        # Detached with its values loaded, so the commit does not expire them
+        db.session.expunge(record)
+        db.session.commit()
+        return record, now
+    except IntegrityError:
+        db.session.rollback()
+
+    # Plain row rather than an ORM object, so it stays readable after the rollback
+    existing = db.session.query(
+        IdempotencyKey.id,
+        IdempotencyKey.request_hash,
+        IdempotencyKey.status,
+        IdempotencyKey.response_status,
+        IdempotencyKey.response_body,
+        IdempotencyKey.created_at
+    ).filter_by(key=key, endpoint=endpoint).first()
+    # End the read transaction so the next poll sees the first request's commit
+    db.session.rollback()
+
+    if (existing is not None and existing.status == "in_progress"
+            and existing.request_hash == request_hash and _is_stale(existing)):
+        # Take over; the conditional update lets only one waiting retry win
+        taken = IdempotencyKey.query.filter(
+            IdempotencyKey.id == existing.id,
+            IdempotencyKey.status == "in_progress",
+            IdempotencyKey.created_at == existing.created_at
+        ).update({"created_at": now}, synchronize_session=False)
+        db.session.commit()
+        if taken:
+            return existing, now
+    return existing, None
+
+
+def _is_stale(record):
+    stale_before = datetime.utcnow() - timedelta(seconds=current_app.config.get("IDEMPOTENCY_STALE_SECONDS", 300))
+    return record.created_at < stale_before
+
+
+def _marker(record_id, claimed_at):
+    """
+    A before_commit listener marking the key committed in the same transaction as
+    the view's writes. If a retry took the key over in the meantime (this request
+    was slow enough to look dead), the commit is refused so the writes are not
+    applied twice.
+    """
+    def mark_committed(session):
+        owned = session.query(IdempotencyKey).filter(
+            IdempotencyKey.id == record_id,
+            IdempotencyKey.created_at == claimed_at,
+            IdempotencyKey.status.in_(("in_progress", "committed"))
+        ).update({"status": "committed"}, synchronize_session=False)
+        if not owned:
+            raise IdempotencyKeyLost("Idempotency-Key was taken over by a retry; not committing")
+    return mark_committed
+
+
+def _store(record_id, claimed_at, response):
+    IdempotencyKey.query.filter_by(id=record_id, created_at=claimed_at).update({
+        "status": "completed",
+        "response_status": response.status_code,
+        "response_body": response.get_data(as_text=True),
+    }, synchronize_session=False)
+    db.session.commit()
+
+
+def _release(record_id, claimed_at):
+    # Let a retry run the request again after a failure, unless the view had
+    # already committed its writes: then the key stays committed and is not rerun
+    IdempotencyKey.query.filter_by(
+        id=record_id, created_at=claimed_at, status="in_progress"
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _replay(record):
+    response = Response(record.response_body, status=record.response_status, mimetype="application/json")
+    response.headers["Idempotent-Replayed"] = "true"
+    return response
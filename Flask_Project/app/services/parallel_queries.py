@@ -0,0 +1,61 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import g
+from app.instrumentation import request_query_stats
+
+
+class ParallelQueries:
+    """
+    Flask extension that runs independent read queries at the same time.
+
+    Each task runs on a pool thread inside its own app context, so it gets its own
+    scoped session and therefore its own pooled connection; the context teardown
+    returns the connection. A request using ``run`` holds up to
+    PARALLEL_QUERY_WORKERS connections at once, so size SQLALCHEMY_ENGINE_OPTIONS
+    accordingly. The tasks' statements count towards the calling request's query
+    budget (see app/instrumentation.py).
+    """
+
+    def __init__(self):
+        self.app = None
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.app = app
+
+    def run(self, **tasks):
+        """Calls every ``name=function`` concurrently and returns ``{name: result}``. The first error is re-raised."""
+        executor = self._get_executor()
+        # Tasks follow the caller's replica routing (see db_routing.read_replica)
+        use_replica = g.get("db_use_replica", False)
+        if use_replica:
+            # The tasks' own contexts record nothing on the caller's g; mark it here so a
+            # replica failure in a task is retried on the primary by read_replica
+            g.db_replica_used = True
+        stats = request_query_stats()
+        futures = {name: executor.submit(self._call, fn, use_replica, stats) for name, fn in tasks.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+    def _call(self, fn, use_replica, stats):
+        with self.app.app_context():
+            g.db_use_replica = use_replica
+            if stats is not None:
+                g.db_stats = stats
+            return fn()
+
+    def _get_executor(self):
+        # Created lazily (and again after a fork) so pool threads belong to this process
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.app.config.get("PARALLEL_QUERY_WORKERS", 4),
+                    thread_name_prefix="parallel-query"
+                )
+                self._executor_pid = os.getpid()
+            return self._executor
+
+
+parallel_queries = ParallelQueries()
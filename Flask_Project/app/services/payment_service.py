@@ -0,0 +1,158 @@
+from datetime import datetime
+from sqlalchemy import select, update
+from app.extensions import db
+from app.models import Shipment, PaymentRequest
+from app.services.analytics_service import record_status_changes
+from app.services.tracking_service import notify_shipment_changed
+
+
+def booked_tracking_history(history, sender_city, now_iso):
+    """
+    Returns ``(new_history, booked_entry)`` with the "Pending Payment" entry turned
+    into "Booked", or a Booked entry prepended if there was none. The input is not
+    modified, so assigning the result marks the JSONB column as changed.
+    """
+    history = [dict(entry) for entry in history or []]
+    for entry in history:
+        if entry.get("stage") == "Pending Payment":
+            entry["stage"] = "Booked"
+            entry["date"] = now_iso
+            entry["activity"] = "Shipment booked and payment confirmed."
+            return history, entry
+
+    booked_entry = {
+        "stage": "Booked",
+        "date": now_iso,
+        "location": sender_city,
+        "activity": "Shipment booked and payment confirmed."
+    }
+    return [booked_entry] + history, booked_entry
+
+
+def claim_pending_payments(payment_ids):
+    """
+    Locks the given payments that are still Pending for the rest of the current
+    transaction and returns their IDs.
+
+    On PostgreSQL this is SELECT ... FOR UPDATE SKIP LOCKED, so rows another admin
+    is already deciding are skipped instead of waited on. SQLite has no row locks;
+    a no-op UPDATE takes the database write lock first, which serializes
+    concurrent deciders so the Pending check below cannot race. It only matches
+    Pending rows (SQLite takes the lock even when none match), so the
+    ``updated_at`` onupdate does not touch payments that are already decided.
+    """
+    if not payment_ids:
+        return []
+
+    stmt = select(PaymentRequest.id).where(
+        PaymentRequest.id.in_(payment_ids),
+        PaymentRequest.status == 'Pending'
+    )
+    if db.engine.dialect.name == "sqlite":
+        db.session.execute(
+            update(PaymentRequest)
+            .where(PaymentRequest.id.in_(payment_ids), PaymentRequest.status == 'Pending')
+            .values(status=PaymentRequest.status),
+            execution_options={"synchronize_session": False}
+        )
+    else:
+        stmt = stmt.with_for_update(skip_locked=True)
+    return list(db.session.scalars(stmt))
+
+
+def decide_payments(payment_ids, new_status):
+    """
+    Approves or rejects a set of payments in one transaction and returns
+    ``(outcomes, changes)``. ``outcomes`` maps every requested ID to "approved",
+    "rejected", "not_found", "already_processed" or "locked" (being decided by a
+    concurrent request). The caller passes ``changes`` to ``notify_booked`` and
+    then commits.
+    """
+    claimed = claim_pending_payments(payment_ids)
+    changes = []
+    if new_status == "Approved":
+        changes = approve_payments(claimed)
+    else:
+        reject_payments(claimed)
+
+    outcomes = {payment_id: new_status.lower() for payment_id in claimed}
+    unclaimed = [payment_id for payment_id in payment_ids if payment_id not in outcomes]
+    if unclaimed:
+        statuses = dict(db.session.query(PaymentRequest.id, PaymentRequest.status).filter(
+            PaymentRequest.id.in_(unclaimed)
+        ).all())
+        for payment_id in unclaimed:
+            if payment_id not in statuses:
+                outcomes[payment_id] = "not_found"
+            elif statuses[payment_id] != 'Pending':
+                outcomes[payment_id] = "already_processed"
+            else:
+                outcomes[payment_id] = "locked"
+    return outcomes, changes
+
+
+def approve_payments(payment_ids):
+    """
+    Approves the given payments, which must already be claimed with
+    ``claim_pending_payments``, and books their shipments in bulk: one UPDATE for
+    the payments, one SELECT for the shipments and one executemany UPDATE to write
+    them back. The shipments are locked so their old status is accurate for the
+    analytics rollups. The caller passes the returned changes to ``notify_booked``
+    and then commits.
+    """
+    if not payment_ids:
+        return []
+
+    db.session.execute(
+        update(PaymentRequest)
+        .where(PaymentRequest.id.in_(payment_ids), PaymentRequest.status == 'Pending')
+        .values(status='Approved'),
+        execution_options={"synchronize_session": False}
+    )
+    rows = db.session.query(
+        Shipment.id,
+        Shipment.shipment_id_str,
+        Shipment.user_email,
+        Shipment.sender_address_city,
+        Shipment.tracking_history,
+        Shipment.status,
+        Shipment.booking_date,
+        Shipment.service_type,
+        Shipment.total_with_tax_18_percent
+    ).join(
+        PaymentRequest, PaymentRequest.shipment_id == Shipment.id
+    ).filter(PaymentRequest.id.in_(payment_ids)).with_for_update(of=Shipment).all()
+
+    now_iso = datetime.utcnow().isoformat()
+    params = {}
+    changes = []
+    status_changes = []
+    for row in rows:
+        if row.id in params:
+            # Several approved payments for the same shipment book it only once
+            continue
+        history, booked_entry = booked_tracking_history(row.tracking_history, row.sender_address_city, now_iso)
+        params[row.id] = {"id": row.id, "status": "Booked", "tracking_history": history}
+        changes.append((row.shipment_id_str, row.user_email, "Booked", booked_entry))
+        status_changes.append((row.booking_date, row.service_type, row.total_with_tax_18_percent, row.status, "Booked"))
+    if params:
+        db.session.execute(update(Shipment), list(params.values()))
+        record_status_changes(status_changes)
+    return changes
+
+
+def reject_payments(payment_ids):
+    if not payment_ids:
+        return
+    db.session.execute(
+        update(PaymentRequest)
+        .where(PaymentRequest.id.in_(payment_ids), PaymentRequest.status == 'Pending')
+        .values(status='Rejected'),
+        execution_options={"synchronize_session": False}
+    )
+
+
+def notify_booked(changes):
+    """Publishes the shipment changes returned by ``approve_payments``. Call before commit."""
+    for shipment_id_str, user_email, status, entry in changes:
+        notify_shipment_changed(shipment_id_str, user_email, status, entry)
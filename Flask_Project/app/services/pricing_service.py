@@ -2,6 +2,35 @@
 import json
 import math
 import os
+from functools import lru_cache
+from app.metrics import CACHE_LOOKUPS
+
+
+def load_rate_card():
+    """
+    Reads pricing.json once per process and indexes it by lowercased country name
+    (the first entry wins, as the old linear search did). Returns None if the file
+    cannot be read; only a successful read is cached, so a failed one is retried
+    on the next call. Called at startup so preloaded workers share the parsed card.
+    """
+    try:
+        return _read_rate_card()
+    except (IOError, json.JSONDecodeError):
+        return None
+
+@lru_cache(maxsize=1)
+def _read_rate_card():
+    # Raises instead of returning None, which lru_cache would keep for good
+    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    json_path = os.path.join(base_dir, '..', 'Data', 'pricing.json')
+
+    with open(json_path, 'r') as f:
+        pricing_list = json.load(f)
+
+    rate_card = {}
+    for item in pricing_list:
+        rate_card.setdefault(item.get("country", "").lower(), item)
+    return rate_card
 
 def calculate_international_price(target_country: str, weight_in_kg: float):
     """
@@ -14,21 +43,16 @@ def calculate_international_price(target_country: str, weight_in_kg: float):
     Returns:
         A dictionary with pricing details or an error message.
     """
-    # Construct the full path to the JSON file
-    base_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-    json_path = os.path.join(base_dir, '..', 'Data', 'pricing.json')
-
-    try:
-        with open(json_path, 'r') as f:
-            pricing_list = json.load(f)
-    except (IOError, json.JSONDecodeError):
+    # A miss means this process had to read pricing.json (warmup normally does it).
+    # The card is never evicted, so whether it is cached yet is a per-call answer,
+    # unlike a difference in the shared miss counter while other threads call too
+    cached = _read_rate_card.cache_info().currsize > 0
+    rate_card = load_rate_card()
+    CACHE_LOOKUPS.labels("rate_card", "hit" if cached else "miss").inc()
+    if rate_card is None:
         return {"error": "Could not load pricing data."}
 
-    country_data = None
-    for item in pricing_list:
-        if item.get("country", "").lower() == target_country.lower():
-            country_data = item
-            break
+    country_data = rate_card.get(target_country.lower())
     
     if not country_data:
         return {"error": f"We do not offer services to {target_country.title()} at the moment."}
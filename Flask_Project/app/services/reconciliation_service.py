@@ -0,0 +1,138 @@
+import csv
+from collections import Counter
+from decimal import Decimal, InvalidOperation
+from app.extensions import db
+from app.models import Shipment, PaymentRequest
+from app.services.payment_service import approve_payments, claim_pending_payments, notify_booked
+
+# Header names banks commonly use for the two columns we need (compared lowercased)
+UTR_HEADERS = ("utr", "utr no", "utr number", "utr_no", "reference", "ref no", "reference no", "transaction reference")
+AMOUNT_HEADERS = ("amount", "credit", "credit amount", "deposit", "deposit amount")
+
+
+def parse_statement(lines):
+    """
+    Builds a hash index of ``UTR -> amount`` from bank statement CSV lines.
+
+    Returns ``(index, duplicate_utrs, errors)``. A UTR that appears more than once in
+    the statement is kept out of the index and reported in ``duplicate_utrs``, as it
+    cannot be matched safely.
+    """
+    reader = csv.reader(lines)
+    header = next(reader, None)
+    if not header:
+        return {}, set(), ["Statement is empty"]
+
+    columns = [h.strip().lower() for h in header]
+    utr_col = next((i for i, h in enumerate(columns) if h in UTR_HEADERS), None)
+    amount_col = next((i for i, h in enumerate(columns) if h in AMOUNT_HEADERS), None)
+    if utr_col is None or amount_col is None:
+        return {}, set(), ["Statement must have a UTR column and an amount column"]
+
+    index = {}
+    seen = Counter()
+    errors = []
+    for row_no, row in enumerate(reader, start=2):
+        if not row or len(row) <= max(utr_col, amount_col):
+            continue
+        utr = row[utr_col].strip()
+        if not utr:
+            continue
+        amount = _parse_amount(row[amount_col])
+        if amount is None:
+            errors.append(f"Row {row_no}: invalid amount {row[amount_col]!r}")
+            continue
+        seen[utr] += 1
+        index[utr] = amount
+
+    duplicate_utrs = {utr for utr, count in seen.items() if count > 1}
+    for utr in duplicate_utrs:
+        del index[utr]
+    return index, duplicate_utrs, errors
+
+
+def reconcile_pending_payments(index, statement_duplicates, dry_run=False):
+    """
+    Matches every pending PaymentRequest against the statement index in one pass.
+
+    Exact UTR and amount matches are approved in bulk (advancing their shipments to
+    "Booked") unless ``dry_run`` is set. Amount mismatches, UTRs listed twice in the
+    statement and UTRs submitted for more than one payment are flagged for manual
+    review. Pending payments with no statement line are left untouched.
+    """
+    pending = db.session.query(
+        PaymentRequest.id,
+        PaymentRequest.utr,
+        PaymentRequest.amount,
+        Shipment.shipment_id_str
+    ).join(
+        Shipment, PaymentRequest.shipment_id == Shipment.id
+    ).filter(PaymentRequest.status == 'Pending').all()
+
+    pending_utr_counts = Counter(p.utr for p in pending)
+    already_approved = {
+        utr for (utr,) in db.session.query(PaymentRequest.utr).filter(
+            PaymentRequest.utr.in_(list(pending_utr_counts)),
+            PaymentRequest.status == 'Approved'
+        ).distinct()
+    } if pending else set()
+    matched = []
+    flagged = []
+    unmatched = 0
+    for p in pending:
+        reason = None
+        if p.utr in statement_duplicates:
+            reason = "UTR appears more than once in the statement"
+        elif pending_utr_counts[p.utr] > 1:
+            reason = "UTR was submitted for more than one pending payment"
+        elif p.utr in already_approved:
+            reason = "UTR was already approved for another payment"
+        elif p.utr not in index:
+            unmatched += 1
+            continue
+        elif index[p.utr] != p.amount:
+            reason = f"Amount mismatch: statement has {index[p.utr]}"
+
+        item = {
+            "payment_id": p.id,
+            "order_id": p.shipment_id_str,
+            "utr": p.utr,
+            "amount": float(p.amount),
+        }
+        if reason:
+            item["reason"] = reason
+            flagged.append(item)
+        else:
+            matched.append(item)
+
+    if not dry_run and matched:
+        claimed = set(claim_pending_payments([item["payment_id"] for item in matched]))
+        for item in matched:
+            if item["payment_id"] not in claimed:
+                item["reason"] = "Payment was processed concurrently"
+                flagged.append(item)
+        matched = [item for item in matched if item["payment_id"] in claimed]
+        changes = approve_payments(list(claimed))
+        notify_booked(changes)
+        db.session.commit()
+
+    return {
+        "dry_run": dry_run,
+        "summary": {
+            "pending": len(pending),
+            "approved": 0 if dry_run else len(matched),
+            "matched": len(matched),
+            "flagged": len(flagged),
+            "unmatched": unmatched,
+        },
+        "matched": matched,
+        "flagged": flagged,
+    }
+
+
+def _parse_amount(raw):
+    cleaned = raw.strip().replace(",", "").replace("₹", "").replace("INR", "").replace("Rs.", "").strip()
+    try:
+        return Decimal(cleaned).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        return None
@@ -0,0 +1,145 @@
+import threading
+from sqlalchemy import event, or_
+from app.models import Shipment, User, SHIPMENT_SEARCH_COLUMNS, USER_SEARCH_COLUMNS
+from app.transactions import after_commit
+
+SEARCH_COLUMNS = {
+    Shipment: tuple(getattr(Shipment, name) for name in SHIPMENT_SEARCH_COLUMNS),
+    User: tuple(getattr(User, name) for name in USER_SEARCH_COLUMNS),
+}
+
+
+def trigrams(value):
+    value = (value or "").lower()
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+
+def substring_filter(model, q):
+    like_q = f"%{q}%"
+    return or_(*(column.ilike(like_q) for column in SEARCH_COLUMNS[model]))
+
+
+class TrigramSearchBackend:
+    """
+    PostgreSQL backend: a plain ILIKE across the search columns, served by the
+    pg_trgm GIN indexes declared on the models. Nothing is kept in process.
+    """
+
+    def filter(self, query, model, q):
+        return query.filter(substring_filter(model, q))
+
+
+class NGramSearchBackend:
+    """
+    In-process trigram index for SQLite and test setups, where no index can serve
+    ``ILIKE '%q%'``.
+
+    Each model keeps ``trigram -> row ids``. A search intersects the posting sets of
+    the query's trigrams and asks the database only for those candidate IDs, still
+    applying the ILIKE so candidates whose trigrams matched in different columns
+    are dropped. New rows are picked up incrementally by primary key before each
+    search (SQLite serializes writers, so IDs become visible in order), and rows
+    changed by ORM updates are re-indexed once the update has committed.
+    """
+
+    def __init__(self, max_candidates=5000):
+        self.max_candidates = max_candidates
+        self._postings = {model: {} for model in SEARCH_COLUMNS}
+        self._row_grams = {model: {} for model in SEARCH_COLUMNS}
+        self._last_id = {model: 0 for model in SEARCH_COLUMNS}
+        self._stale = {model: set() for model in SEARCH_COLUMNS}
+        self._lock = threading.Lock()
+
+    def filter(self, query, model, q):
+        grams = trigrams(q)
+        if not grams:
+            # Queries shorter than three characters cannot use the index
+            return query.filter(substring_filter(model, q))
+
+        self._refresh(query.session, model)
+        with self._lock:
+            postings = self._postings[model]
+            candidates = None
+            for gram in sorted(grams, key=lambda g: len(postings.get(g, ()))):
+                ids = postings.get(gram)
+                if not ids:
+                    candidates = set()
+                    break
+                candidates = set(ids) if candidates is None else candidates & ids
+                if not candidates:
+                    break
+
+        if len(candidates) > self.max_candidates:
+            return query.filter(substring_filter(model, q))
+        return query.filter(model.id.in_(candidates), substring_filter(model, q))
+
+    def _refresh(self, session, model):
+        columns = SEARCH_COLUMNS[model]
+        with self._lock:
+            last_id = self._last_id[model]
+            stale = self._stale[model]
+            self._stale[model] = set()
+
+        criteria = model.id > last_id
+        if stale:
+            criteria = or_(criteria, model.id.in_(stale))
+        rows = session.query(model.id, *columns).filter(criteria).all()
+
+        with self._lock:
+            for row in rows:
+                row_id = row[0]
+                self._unindex(model, row_id)
+                grams = set()
+                for value in row[1:]:
+                    grams |= trigrams(value)
+                self._row_grams[model][row_id] = grams
+                for gram in grams:
+                    self._postings[model].setdefault(gram, set()).add(row_id)
+                self._last_id[model] = max(self._last_id[model], row_id)
+
+    def _unindex(self, model, row_id):
+        for gram in self._row_grams[model].pop(row_id, ()):
+            ids = self._postings[model].get(gram)
+            if ids:
+                ids.discard(row_id)
+
+    def mark_stale(self, model, row_id):
+        with self._lock:
+            self._stale[model].add(row_id)
+
+
+class SearchIndex:
+    """Flask extension that picks the search backend from ``SEARCH_BACKEND`` ("auto", "trigram" or "ngram")."""
+
+    def __init__(self):
+        self.backend = None
+
+    def init_app(self, app):
+        backend = app.config.get("SEARCH_BACKEND", "auto")
+        if backend == "auto":
+            uri = app.config.get("SQLALCHEMY_DATABASE_URI", "")
+            backend = "trigram" if uri.startswith("postgres") else "ngram"
+        if backend == "trigram":
+            self.backend = TrigramSearchBackend()
+        else:
+            self.backend = NGramSearchBackend(app.config.get("SEARCH_NGRAM_MAX_CANDIDATES", 5000))
+        # Listeners are per model class and live for the process, so they are added
+        # once and look up whichever backend is current
+        for model in SEARCH_COLUMNS:
+            if not event.contains(model, "after_update", _row_updated):
+                event.listen(model, "after_update", _row_updated)
+
+    def filter(self, query, model, q):
+        return self.backend.filter(query, model, q)
+
+
+def _row_updated(mapper, connection, target):
+    # Marked on commit, not at flush: a search in between would re-index the row
+    # from its committed (old) values and clear the mark, losing the update
+    backend = search_index.backend
+    if isinstance(backend, NGramSearchBackend):
+        model, row_id = mapper.class_, target.id
+        after_commit(lambda: backend.mark_stale(model, row_id))
+
+
+search_index = SearchIndex()
@@ -0,0 +1,69 @@
+from itertools import chain
+from sqlalchemy import event
+from app.extensions import db
+from app.models import TableVersion
+from app.transactions import before_commit, transaction_state
+from app.utils import dialect_insert
+
+# Tables whose list endpoints are validated with ETags (see conditional_get)
+VERSIONED_TABLES = frozenset({"shipments", "payment_requests", "users"})
+
+
+def install_table_versions(db):
+    """
+    Bumps ``table_versions`` for every versioned table a transaction writes to, in
+    that transaction, just before it commits.
+
+    ``updated_at`` values are stamped when a statement runs, so a transaction with
+    an older stamp can commit after one with a newer stamp and ``max(updated_at)``
+    never moves. The version counter changes on every commit that touched the
+    table, whatever the commit order. Writes are seen both from ORM flushes and
+    from ``session.execute`` of INSERT/UPDATE/DELETE constructs.
+    """
+    if not event.contains(db.session, "after_flush", _note_flushed_tables):
+        event.listen(db.session, "after_flush", _note_flushed_tables)
+        event.listen(db.session, "do_orm_execute", _note_executed_tables)
+
+
+def table_versions(*table_names):
+    """Returns the current version of each of ``table_names`` (0 if never written), in one query."""
+    versions = dict(
+        db.session.query(TableVersion.table_name, TableVersion.version)
+        .filter(TableVersion.table_name.in_(table_names))
+    )
+    return tuple(versions.get(name, 0) for name in table_names)
+
+
+def _note_flushed_tables(session, flush_context):
+    _mark_written(
+        getattr(obj, "__tablename__", None) for obj in chain(session.new, session.dirty, session.deleted)
+    )
+
+
+def _note_executed_tables(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        table = getattr(orm_execute_state.statement, "table", None)
+        _mark_written([getattr(table, "name", None)])
+
+
+def _mark_written(table_names):
+    table_names = VERSIONED_TABLES.intersection(table_names)
+    if not table_names:
+        return
+    state = transaction_state()
+    pending = state.get("written_tables")
+    if pending is None:
+        pending = state["written_tables"] = set()
+        before_commit(lambda: _bump(pending))
+    pending.update(table_names)
+
+
+def _bump(table_names):
+    # Sorted so concurrent writers lock the counter rows in the same order
+    stmt = dialect_insert(TableVersion).values([
+        {"table_name": name, "version": 1} for name in sorted(table_names)
+    ])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=[TableVersion.table_name],
+        set_={"version": TableVersion.version + 1}
+    ))
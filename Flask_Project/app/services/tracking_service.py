@@ -0,0 +1,94 @@
+from flask import current_app
+from app.extensions import tracking_cache, event_bus
+from app.models import Shipment
+from app.transactions import after_commit
+
+
+def serialize_shipment_detail(shipment):
+    return {
+        "id": shipment.id,
+        "shipment_id_str": shipment.shipment_id_str,
+        "sender_name": shipment.sender_name,
+        "sender_address_street": shipment.sender_address_street,
+        "sender_address_city": shipment.sender_address_city,
+        "sender_address_state": shipment.sender_address_state,
+        "sender_address_pincode": shipment.sender_address_pincode,
+        "sender_address_country": shipment.sender_address_country,
+        "sender_phone": shipment.sender_phone,
+        "receiver_name": shipment.receiver_name,
+        "receiver_address_street": shipment.receiver_address_street,
+        "receiver_address_city": shipment.receiver_address_city,
+        "receiver_address_state": shipment.receiver_address_state,
+        "receiver_address_pincode": shipment.receiver_address_pincode,
+        "receiver_address_country": shipment.receiver_address_country,
+        "receiver_phone": shipment.receiver_phone,
+        "package_weight_kg": float(shipment.package_weight_kg),
+        "booking_date": shipment.booking_date.isoformat(),
+        "status": shipment.status,
+        "price_without_tax": float(shipment.price_without_tax),
+        "tax_amount_18_percent": float(shipment.tax_amount_18_percent),
+        "total_with_tax_18_percent": float(shipment.total_with_tax_18_percent),
+        "tracking_history": shipment.tracking_history,
+    }
+
+
+def get_tracking_entry(shipment_id_str):
+    """
+    Returns ``(updated_at, payload)`` for a shipment's tracking response, or None if
+    it does not exist. ``updated_at`` is cached with the payload so conditional GETs
+    are validated against the same data the body comes from.
+
+    Both hits and misses are cached; unknown IDs are remembered for the shorter
+    TRACKING_CACHE_NEGATIVE_TTL so that ID scanners do not reach the database.
+    """
+    hit, entry = tracking_cache.get(shipment_id_str)
+    if hit:
+        return entry
+    return load_tracking_entry(shipment_id_str)
+
+
+def load_tracking_entry(shipment_id_str):
+    """Like ``get_tracking_entry`` but always reads the database, refreshing the cache."""
+    shipment = Shipment.query.filter_by(shipment_id_str=shipment_id_str).first()
+    if not shipment:
+        tracking_cache.set(shipment_id_str, None, ttl=current_app.config.get("TRACKING_CACHE_NEGATIVE_TTL", 10))
+        return None
+
+    entry = (shipment.updated_at, serialize_shipment_detail(shipment))
+    tracking_cache.set(shipment_id_str, entry)
+    return entry
+
+
+def get_tracking_payload(shipment_id_str):
+    """Returns the serialized tracking response for a shipment, or None if it does not exist."""
+    entry = get_tracking_entry(shipment_id_str)
+    return entry[1] if entry else None
+
+
+def invalidate_tracking(*shipment_id_strs):
+    """Drops cached tracking responses. Call after the write has been committed."""
+    tracking_cache.delete(*shipment_id_strs)
+
+
+def shipment_channel(shipment_id_str):
+    return f"shipment:{shipment_id_str}"
+
+
+def user_channel(user_email):
+    return f"user:{user_email}"
+
+
+def notify_shipment_changed(shipment_id_str, user_email, status, tracking_entry=None, event_type="status"):
+    """
+    Pushes a live update to the shipment's and the owner's event streams and drops
+    the cached tracking response, both once the current transaction commits (and
+    neither if it rolls back). Call before committing the write.
+    """
+    after_commit(lambda: invalidate_tracking(shipment_id_str))
+    data = {
+        "shipment_id_str": shipment_id_str,
+        "status": status,
+        "tracking_entry": tracking_entry,
+    }
+    event_bus.publish(shipment_channel(shipment_id_str), event_type, data)
+    event_bus.publish(user_channel(user_email), event_type, data)
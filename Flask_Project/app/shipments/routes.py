@@ -1,22 +1,38 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from app.extensions import event_bus
 from app.models import Shipment, User, PaymentRequest
 from app.extensions import db
-from app.schemas import ShipmentCreateSchema, PaymentSubmitSchema
+from app.schemas import shipment_create_schema, payment_submit_schema
 from app.utils import generate_shipment_id_str
+from app.services.idempotency import idempotent
+from app.services.analytics_service import record_shipments
+from app.services.change_feed import change_feed_page
+from app.services.conditional_get import conditional
+from app.services.table_versions import table_versions
+from app.instrumentation import query_budget
+from app.services.desktop_sync_service import (
+    build_desktop_shipment, placeholder_email, sync_desktop_transactions, upsert_placeholder_users,
+    validate_desktop_fields
+)
+from app.services.tracking_service import (
+    get_tracking_entry, get_tracking_payload, load_tracking_entry, notify_shipment_changed, shipment_channel,
+    user_channel
+)
 from datetime import datetime
-from werkzeug.security import generate_password_hash
+import json
 
 shipments_bp = Blueprint("shipments", __name__, url_prefix="/api")
 
 @shipments_bp.route("/shipments", methods=["POST"])
+@query_budget(12)
+@idempotent
 def create_shipment():
-    schema = ShipmentCreateSchema()
     data = request.get_json()
 
     final_total_price = data.pop("final_total_price_with_tax", None)
 
     try:
-        shipment_data = schema.load(data)
+        shipment_data = shipment_create_schema.load(data)
     except Exception as e:
         return jsonify({"error": "Invalid shipment details", "details": e.messages}), 400
 
@@ -49,6 +65,10 @@ def create_shipment():
         **shipment_data
     )
     db.session.add(new_shipment)
+    db.session.flush()
+    record_shipments([new_shipment])
+    notify_shipment_changed(new_shipment.shipment_id_str, new_shipment.user_email, new_shipment.status,
+                            tracking_history[0], event_type="created")
     db.session.commit()
     
     shipment_data['pickup_date'] = shipment_data['pickup_date'].isoformat()
@@ -68,6 +88,8 @@ def create_shipment():
     }), 201
 
 @shipments_bp.route("/create-invoice-from-payment", methods=["POST"])
+@query_budget(15)
+@idempotent
 def create_invoice_from_payment():
     data = request.get_json()
     if not data or "transaction" not in data or "sender" not in data or "receiver" not in data:
@@ -81,78 +103,27 @@ def create_invoice_from_payment():
     # Since there's no user session, we need a user to associate the shipment with.
     # We will create a dummy email based on the sender's name and check if it exists.
     # This is a simplified approach for this use case.
-    sender_name_slug = "".join(filter(str.isalnum, sender.get('name', ''))).lower()
-    if not sender_name_slug:
+    dummy_email = placeholder_email(sender.get('name'))
+    if not dummy_email:
         return jsonify({"error": "Sender name is required to associate a user."}), 400
-        
-    dummy_email = f"{sender_name_slug}@desktop-app-user.local"
-    user = User.query.filter_by(email=dummy_email).first()
-
-    if not user:
-        name_parts = sender.get('name', 'Placeholder').split(' ')
-        first_name = name_parts[0]
-        last_name = ' '.join(name_parts[1:]) if len(name_parts) > 1 else 'User'
-
-        user = User(
-            email=dummy_email,
-            password=generate_password_hash(generate_shipment_id_str()), # Random password
-            first_name=first_name,
-            last_name=last_name,
-            is_admin=False
-        )
-        db.session.add(user)
-        db.session.flush() # Flush to get the user ID before committing
 
     # --- Price Calculation ---
     total_amount = float(transaction.get('amount', 0))
     if total_amount <= 0:
         return jsonify({"error": "Transaction amount must be positive."}), 400
-    
-    price_without_tax = round(total_amount / 1.18, 2)
-    tax_amount = round(total_amount - price_without_tax, 2)
 
-    # --- Shipment Creation ---
-    now_iso = datetime.utcnow().isoformat()
-    tracking_history = [{
-        "stage": "Booked",
-        "date": now_iso,
-        "location": sender.get("city", "Origin"),
-        "activity": "Shipment booked and payment confirmed via desktop app."
-    }]
+    error = validate_desktop_fields(transaction, sender, receiver)
+    if error:
+        return jsonify({"error": error}), 400
 
-    new_shipment = Shipment(
-        user_id=user.id,
-        user_email=user.email,
-        shipment_id_str=generate_shipment_id_str(),
-        status="Booked",  # Directly set to "Booked"
-        tracking_history=tracking_history,
-        price_without_tax=price_without_tax,
-        tax_amount_18_percent=tax_amount,
-        total_with_tax_18_percent=total_amount,
-        sender_name=sender.get('name'),
-        sender_address_street=f"{sender.get('address_line1', '')}, {sender.get('address_line2', '')}",
-        sender_address_city=sender.get('city'),
-        sender_address_state=sender.get('state'),
-        sender_address_pincode=sender.get('pincode'),
-        sender_address_country=sender.get('country'),
-        sender_phone=sender.get('phone'),
-        receiver_name=receiver.get('name'),
-        receiver_address_street=f"{receiver.get('address_line1', '')}, {receiver.get('address_line2', '')}",
-        receiver_address_city=receiver.get('city'),
-        receiver_address_state=receiver.get('state'),
-        receiver_address_pincode=receiver.get('pincode'),
-        receiver_address_country=receiver.get('country'),
-        receiver_phone=receiver.get('phone'),
-        package_weight_kg=transaction.get('weight', 1),
-        # Using dummy values for dimensions as they are not in the request
-        package_width_cm=10,
-        package_height_cm=10,
-        package_length_cm=10,
-        pickup_date=datetime.strptime(transaction.get('date'), '%Y-%m-%d').date(),
-        service_type="Express" # Defaulting to Express, can be changed if needed
-    )
+    user = upsert_placeholder_users({dummy_email: sender.get('name')})[dummy_email]
+
+    # --- Shipment Creation ---
+    new_shipment = build_desktop_shipment(user, transaction, sender, receiver, generate_shipment_id_str())
+    tracking_history = new_shipment.tracking_history
     db.session.add(new_shipment)
     db.session.flush() # Flush to get the shipment ID
+    record_shipments([new_shipment])
 
     # --- Payment Request Creation ---
     new_payment_request = PaymentRequest(
@@ -164,6 +135,9 @@ def create_invoice_from_payment():
     )
     db.session.add(new_payment_request)
     
+    notify_shipment_changed(new_shipment.shipment_id_str, new_shipment.user_email, new_shipment.status,
+                            tracking_history[0], event_type="created")
+
     # --- Final Commit ---
     db.session.commit()
 
@@ -176,13 +150,38 @@ def create_invoice_from_payment():
     }), 201
 
 
+@shipments_bp.route("/create-invoices-from-payments", methods=["POST"])
+@query_budget(None)
+@idempotent
+def sync_invoices_from_payments():
+    """Batch form of create-invoice-from-payment for desktop clients syncing many transactions at once."""
+    data = request.get_json()
+    if not data or not isinstance(data.get("transactions"), list):
+        return jsonify({"error": "Invalid request body. Missing transactions list."}), 400
+
+    transactions = data["transactions"]
+    max_batch = current_app.config.get("DESKTOP_SYNC_MAX_BATCH", 1000)
+    if len(transactions) > max_batch:
+        return jsonify({"error": f"At most {max_batch} transactions can be synced per request."}), 400
+
+    results = sync_desktop_transactions(transactions)
+
+    return jsonify({
+        "message": "Desktop transactions synced.",
+        "created": sum(1 for r in results.values() if r["status"] == "created"),
+        "duplicates": sum(1 for r in results.values() if r["status"] == "duplicate"),
+        "failed": sum(1 for r in results.values() if r["status"] == "error"),
+        "results": results
+    }), 200
+
 @shipments_bp.route("/payments", methods=["POST"])
+@query_budget(11)
+@idempotent
 def submit_payment():
-    schema = PaymentSubmitSchema()
     data = request.get_json()
 
     try:
-        payment_data = schema.load(data)
+        payment_data = payment_submit_schema.load(data)
     except Exception as e:
         return jsonify({"error": "Invalid payment details", "details": e.messages}), 400
     
@@ -213,7 +212,24 @@ def submit_payment():
         "status": new_payment_request.status
     }), 201
 
+def _user_shipments_marker():
+    if not request.args.get("email"):
+        return None
+    return table_versions("shipments")
+
+def _shipment_marker(shipment_id_str):
+    # The cached response body itself: no query unless the cache misses
+    entry = get_tracking_entry(shipment_id_str)
+    return (entry[1],) if entry else None
+
+def _user_payments_marker():
+    if not request.args.get("email"):
+        return None
+    return table_versions("payment_requests")
+
 @shipments_bp.route("/shipments", methods=["GET"])
+@query_budget(4)
+@conditional(_user_shipments_marker)
 def get_user_shipments():
     user_email = request.args.get("email")
     if not user_email:
@@ -235,39 +251,115 @@ def get_user_shipments():
         })
     return jsonify(result), 200
 
+@shipments_bp.route("/shipments/changes", methods=["GET"])
+@query_budget(3)
+def get_user_shipment_changes():
+    """A user's shipments created or changed since ``cursor``, so clients can poll instead of re-fetching the list."""
+    user_email = request.args.get("email")
+    if not user_email:
+        return jsonify({"error": "Missing email parameter"}), 400
+
+    def serialize(s):
+        return {
+            "id": s.id,
+            "shipment_id_str": s.shipment_id_str,
+            "sender_name": s.sender_name,
+            "receiver_name": s.receiver_name,
+            "service_type": s.service_type,
+            "booking_date": s.booking_date.isoformat(),
+            "status": s.status,
+            "total_with_tax_18_percent": float(s.total_with_tax_18_percent),
+            "updated_at": s.updated_at.isoformat(),
+        }
+
+    try:
+        return jsonify(change_feed_page(Shipment.query.filter_by(user_email=user_email), Shipment, request.args, serialize)), 200
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
 @shipments_bp.route("/shipments/<shipment_id_str>", methods=["GET"])
+@query_budget(4)
+@conditional(_shipment_marker)
 def get_shipment_detail(shipment_id_str):
-    shipment = Shipment.query.filter_by(shipment_id_str=shipment_id_str).first()
-    if not shipment:
+    payload = get_tracking_payload(shipment_id_str)
+    if payload is None:
         return jsonify({"error": "Shipment not found"}), 404
 
-    return jsonify({
-        "id": shipment.id,
-        "shipment_id_str": shipment.shipment_id_str,
-        "sender_name": shipment.sender_name,
-        "sender_address_street": shipment.sender_address_street,
-        "sender_address_city": shipment.sender_address_city,
-        "sender_address_state": shipment.sender_address_state,
-        "sender_address_pincode": shipment.sender_address_pincode,
-        "sender_address_country": shipment.sender_address_country,
-        "sender_phone": shipment.sender_phone,
-        "receiver_name": shipment.receiver_name,
-        "receiver_address_street": shipment.receiver_address_street,
-        "receiver_address_city": shipment.receiver_address_city,
-        "receiver_address_state": shipment.receiver_address_state,
-        "receiver_address_pincode": shipment.receiver_address_pincode,
-        "receiver_address_country": shipment.receiver_address_country,
-        "receiver_phone": shipment.receiver_phone,
-        "package_weight_kg": float(shipment.package_weight_kg),
-        "booking_date": shipment.booking_date.isoformat(),
-        "status": shipment.status,
-        "price_without_tax": float(shipment.price_without_tax),
-        "tax_amount_18_percent": float(shipment.tax_amount_18_percent),
-        "total_with_tax_18_percent": float(shipment.total_with_tax_18_percent),
-        "tracking_history": shipment.tracking_history,
-    }), 200
+    return jsonify(payload), 200
+
+@shipments_bp.route("/shipments/<shipment_id_str>/events", methods=["GET"])
+@query_budget(3)
+def stream_shipment_events(shipment_id_str):
+    # Taken before the snapshot is read, so an update committed in between is
+    # streamed rather than lost; read from the database because this worker's
+    # cache may not have seen another worker's write yet
+    position = event_bus.position()
+    entry = load_tracking_entry(shipment_id_str)
+    if entry is None:
+        return jsonify({"error": "Shipment not found"}), 404
+
+    return _event_stream(shipment_channel(shipment_id_str), snapshot=entry[1], position=position)
+
+@shipments_bp.route("/user/events", methods=["GET"])
+@query_budget(2)
+def stream_user_events():
+    user_email = request.args.get("email")
+    if not user_email:
+        return jsonify({"error": "Missing email parameter"}), 400
+
+    return _event_stream(user_channel(user_email))
+
+def _event_stream(channel, snapshot=None, position=None):
+    """
+    Server-Sent Events response for a live-update channel.
+
+    Clients resume with the standard Last-Event-ID header (or ?last_event_id=);
+    a fresh connection to a shipment stream first receives a snapshot event and
+    then every event delivered after ``position`` (taken before the snapshot was
+    read; default: when the request was handled, not when the body starts).
+    """
+    if position is None:
+        position = event_bus.position()
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+
+    heartbeat = current_app.config.get("SSE_HEARTBEAT_SECONDS", 15)
+    max_duration = current_app.config.get("SSE_MAX_STREAM_SECONDS", 300)
+    # A stream occupies a server thread until it ends, so cap them per worker to
+    # leave threads for ordinary requests
+    if not event_bus.open_stream():
+        response = jsonify({"error": "Too many live streams on this server; poll the changes feed instead"})
+        response.status_code = 503
+        response.headers["Retry-After"] = "30"
+        return response
+    # Return the pooled connection now; the stream itself never touches the database.
+    db.session.close()
+
+    def generate():
+        yield "retry: 3000\n\n"
+        if snapshot is not None and last_event_id is None:
+            yield f"event: snapshot\ndata: {json.dumps(snapshot)}\n\n"
+        for event in event_bus.listen(channel, last_event_id, heartbeat, max_duration, position):
+            if event is None:
+                yield ": heartbeat\n\n"
+                continue
+            event_id, event_type, data = event
+            yield f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+    response = Response(stream_with_context(generate()), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no",
+    })
+    # Called by the server when the stream ends or the client goes away
+    response.call_on_close(event_bus.close_stream)
+    return response
 
 @shipments_bp.route("/user/payments", methods=["GET"])
+@query_budget(4)
+@conditional(_user_payments_marker)
 def get_user_payments():
     user_email = request.args.get("email")
     if not user_email:
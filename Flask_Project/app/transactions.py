@@ -0,0 +1,63 @@
+from flask import current_app
+from sqlalchemy import event
+
+
+def install_transaction_hooks(db):
+    """
+    Lets code queue work on the outcome of the current session transaction:
+    ``before_commit`` callbacks run inside it just before COMMIT (and may issue
+    SQL), ``after_commit`` callbacks once it has committed. Both queues, and the
+    dict returned by ``transaction_state``, are dropped when the transaction ends,
+    whether it committed, rolled back or the session closed.
+    """
+    if not event.contains(db.session, "before_commit", _run_before_commit):
+        event.listen(db.session, "before_commit", _run_before_commit)
+        event.listen(db.session, "after_commit", _run_after_commit)
+        event.listen(db.session, "after_transaction_end", _discard_pending)
+
+
+def before_commit(callback):
+    _pending("before_commit").append(callback)
+
+
+def after_commit(callback):
+    _pending("after_commit").append(callback)
+
+
+def transaction_state():
+    """A dict that lives as long as the current transaction, for batching work until commit."""
+    return _session().info.setdefault("transaction_state", {})
+
+
+def _pending(stage):
+    return _session().info.setdefault(stage, [])
+
+
+def _session():
+    session = current_app.extensions["sqlalchemy"].session()
+    if not session.in_transaction():
+        # Begun explicitly so that a rollback before any SQL still discards the work
+        session.begin()
+    return session
+
+
+def _run_before_commit(session):
+    # This event fires before the commit's own flush; flush first so callbacks see
+    # (and anything they track from flushes has seen) every pending change.
+    # Callbacks may queue more callbacks (or flush), so drain until empty
+    session.flush()
+    callbacks = session.info.get("before_commit")
+    while callbacks:
+        callbacks.pop(0)()
+
+
+def _run_after_commit(session):
+    for callback in session.info.pop("after_commit", ()):
+        callback()
+
+
+def _discard_pending(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("before_commit", None)
+        session.info.pop("after_commit", None)
+        session.info.pop("transaction_state", None)
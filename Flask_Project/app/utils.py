@@ -1,6 +1,17 @@
 import random
 import string
+from sqlalchemy.dialects import postgresql, sqlite
+from app.extensions import db
 
 def generate_shipment_id_str():
     """Generates a random shipment ID like RS123456."""
     return "RS" + "".join(random.choices(string.digits, k=6))
+
+def dialect_insert(model):
+    """
+    Returns an INSERT for the active database that supports ``on_conflict_do_*``
+    (PostgreSQL in production, SQLite in local setups).
+    """
+    if db.engine.dialect.name == "sqlite":
+        return sqlite.insert(model)
+    return postgresql.insert(model)
@@ -0,0 +1,59 @@
+import gc
+from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
+from .extensions import db
+from .services.pricing_service import load_rate_card
+from .services.domestic_pricing_service import DOMESTIC_PRICES, DOMESTIC_ZONES
+from .services.export_jobs import export_jobs
+
+
+def warm_up(app):
+    """
+    Pays a fresh process's first-request costs in create_app: parses the rate
+    cards, connects once to each database (initialising the dialect), fails export
+    jobs orphaned by a previous process, and then moves everything allocated so far
+    out of the garbage collector's reach with ``gc.freeze()``. Under gunicorn's
+    preload_app this runs in the master, so the forked workers share those pages
+    copy-on-write instead of dirtying them on their first collection.
+    """
+    state = app.extensions.setdefault("warmup", {"ready": False})
+    state["rate_cards"] = load_rate_card() is not None and bool(DOMESTIC_ZONES and DOMESTIC_PRICES)
+    state["ready"] = prime_pool(app)
+    if state["ready"]:
+        fail_orphaned_exports(app)
+
+    # Connections must not be shared across fork; each worker primes its own (gunicorn.conf.py)
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose()
+
+    gc.collect()
+    gc.freeze()
+
+
+def fail_orphaned_exports(app):
+    """Fails export jobs left queued or running by a process that has since exited."""
+    with app.app_context():
+        try:
+            export_jobs.expire_stale()
+        except SQLAlchemyError:
+            # e.g. create_tables.py starting the app before the table exists
+            db.session.rollback()
+
+
+def prime_pool(app):
+    """
+    Opens one pooled connection per engine and returns True if the primary
+    answered. An unreachable read replica does not count against readiness, as
+    replica reads fall back to the primary.
+    """
+    ok = True
+    with app.app_context():
+        for key, engine in db.engines.items():
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+            except SQLAlchemyError:
+                if key is None:
+                    ok = False
+    return ok
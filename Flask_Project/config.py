@@ -1,3 +1,5 @@
+import os
+
 
 class Config:
     # Hardcoded configuration variables
@@ -12,27 +14,130 @@ class Config:
     db_name = "shedload"
 
     # SQLAlchemy Configuration
-    SQLALCHEMY_DATABASE_URI = (
+    SQLALCHEMY_DATABASE_URI = os.environ.get("DATABASE_URL") or (
         f"postgresql://{db_user}:{db_password}"
         f"@{db_host}:{db_port}/{db_name}"
     )
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Database engine profile (PostgreSQL only; see app/db_profile.py), set from the environment
+    DB_POOL_SIZE = int(os.environ.get("DB_POOL_SIZE", 5))
+    DB_MAX_OVERFLOW = int(os.environ.get("DB_MAX_OVERFLOW", 10))
+    DB_POOL_TIMEOUT = int(os.environ.get("DB_POOL_TIMEOUT", 10))  # seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.environ.get("DB_POOL_RECYCLE", 280))  # seconds; below the host's idle disconnect
+    DB_POOL_PRE_PING = os.environ.get("DB_POOL_PRE_PING", "1") == "1"
+    DB_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_STATEMENT_TIMEOUT_MS", 5000))
+    DB_LONG_STATEMENT_TIMEOUT_MS = int(os.environ.get("DB_LONG_STATEMENT_TIMEOUT_MS", 120000))  # admin, exports, scripts
+    # Behind PgBouncer in transaction-pooling mode. EVENT_BROKER="postgres" needs a
+    # session-mode connection for LISTEN, so the app refuses to start with both.
+    DB_PGBOUNCER = os.environ.get("DB_PGBOUNCER", "0") == "1"
+
+    # Read replica for heavy admin, analytics and export reads (see app/db_routing.py);
+    # unset means everything uses the primary
+    DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL")
+    REPLICA_PIN_SECONDS = 10  # a client reads from the primary this long after its own writes
+    REPLICA_RETRY_SECONDS = 30  # how long a failed replica is skipped
+
     # CORS Configuration
     CORS_ORIGINS = "*"
 
+    # Public tracking cache (GET /api/shipments/<shipment_id_str>)
+    TRACKING_CACHE_TTL = 60  # seconds
+    TRACKING_CACHE_NEGATIVE_TTL = 10  # seconds to remember unknown shipment IDs
+    TRACKING_CACHE_MAX_ENTRIES = 10000
+
+    # Hub-scan ingestion (POST /api/admin/scans): events applied per transaction
+    HUB_SCAN_BATCH_SIZE = 200
+
+    # Live tracking push (Server-Sent Events)
+    EVENT_BROKER = os.environ.get("EVENT_BROKER", "memory")  # "memory" (single process) or "postgres" (LISTEN/NOTIFY across workers)
+    EVENT_BACKLOG = 100  # events kept per channel for Last-Event-ID resume
+    EVENT_MAX_CHANNELS = 10000  # channels with a backlog per process; least recently used dropped first
+    SSE_HEARTBEAT_SECONDS = 15
+    SSE_MAX_STREAM_SECONDS = 300  # clients reconnect and resume after this
+    # Open streams per worker process. Each holds a server thread for its whole life,
+    # so keep this below the worker's thread count (GUNICORN_THREADS); past it new
+    # streams get 503 and clients fall back to polling the change feeds.
+    SSE_MAX_STREAMS = int(os.environ.get("SSE_MAX_STREAMS", 4))
+
+    # Idempotency-Key support on write endpoints
+    IDEMPOTENCY_TTL_HOURS = 24
+    IDEMPOTENCY_WAIT_SECONDS = 10  # how long a duplicate waits for the first request
+    IDEMPOTENCY_STALE_SECONDS = 300  # an in-progress key older than this is taken over (its worker died)
+    IDEMPOTENCY_PURGE_PROBABILITY = 0.01  # chance a request also purges expired keys
+
+    # Desktop batch sync (POST /api/create-invoices-from-payments)
+    DESKTOP_SYNC_MAX_BATCH = 1000
+
+    # Bulk payment approve/reject (PUT /api/admin/payments/status)
+    BULK_PAYMENT_MAX_BATCH = 500
+
+    # Admin listing totals: cached briefly per filter, estimated for large unfiltered tables
+    COUNT_CACHE_TTL = 30  # seconds
+    COUNT_CACHE_MAX_ENTRIES = 1000
+    COUNT_ESTIMATE_THRESHOLD = 100000  # rows
+
+    # Admin search: "trigram" (pg_trgm indexes), "ngram" (in-process index for SQLite/tests) or "auto"
+    SEARCH_BACKEND = "auto"
+    SEARCH_NGRAM_MAX_CANDIDATES = 5000
+
+    # CSV exports: rows fetched from the server-side cursor per chunk
+    EXPORT_CHUNK_SIZE = 1000
+
+    # Background export jobs (POST /api/admin/exports); files go to EXPORT_DIR,
+    # which defaults to <instance path>/exports. Only the host that built a file
+    # can serve it, so use shared storage when running on more than one host
+    EXPORT_JOB_WORKERS = 2
+    EXPORT_JOB_RETENTION_HOURS = 24
+    # A queued or running job whose process has not reported in for this long is
+    # failed, so identical submits stop attaching to it. Jobs report per chunk on
+    # PostgreSQL; SQLite exports only report at the start, so keep this above the
+    # longest SQLite export.
+    EXPORT_JOB_LEASE_SECONDS = 900
+
+    # Change feeds (/shipments/changes, /payments/changes): on PostgreSQL rows newer
+    # than the oldest uncommitted write are held back (at most
+    # DB_LONG_STATEMENT_TIMEOUT_MS), so slow in-flight transactions are not skipped;
+    # the settle window is an extra margin for clock skew
+    CHANGE_FEED_SETTLE_SECONDS = 2
+    CHANGE_FEED_MAX_LIMIT = 500
+
+    # Threads for the concurrent sub-queries of GET /api/admin/dashboard; each holds
+    # its own pooled connection while it runs
+    PARALLEL_QUERY_WORKERS = 4
+
+    # Parse rate cards, connect to the database and gc.freeze() at the end of create_app
+    # (see app/warmup.py); /readyz reports ready once the database has answered
+    WARMUP_ON_START = True
+
+    # Per-request SQL limits for routes without their own @query_budget (app/instrumentation.py).
+    # Over budget logs a warning, or raises under TESTING so N+1 regressions fail tests.
+    QUERY_BUDGET_DEFAULT = 25
+    QUERY_REPEAT_LIMIT = 5  # times one statement may run in a request
+
 
 class DevelopmentConfig(Config):
     DEBUG = True
 
 
 class ProductionConfig(Config):
-    # Set to True based on user request (FLASK_DEBUG=1) for debugging in production
-    DEBUG = True
+    # Debug mode reloads templates, pretty-prints JSON and exposes tracebacks; never in production
+    DEBUG = False
+    # Production runs several worker processes, which only share events through Postgres
+    EVENT_BROKER = os.environ.get("EVENT_BROKER", "postgres")
+
+
+class TestingConfig(Config):
+    # In-memory SQLite for the pytest suite (tests/); query budgets raise instead of logging
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    EVENT_BROKER = "memory"
+    WARMUP_ON_START = False
 
 
 config = {
     "development": DevelopmentConfig,
     "production": ProductionConfig,
+    "testing": TestingConfig,
     "default": DevelopmentConfig,
 }
@@ -8,6 +8,41 @@ if project_home not in sys.path:
     sys.path.insert(0, project_home)
 
 from app import create_app, db
+from app.models import SHIPMENT_SEARCH_COLUMNS, USER_SEARCH_COLUMNS
+from sqlalchemy import text
+
+# create_all() only creates missing tables, so columns added to existing tables
+# are applied here. Every statement must be safe to run more than once.
+POSTGRES_SCHEMA_UPGRADES = [
+    # Credential-less placeholder accounts for desktop-app senders
+    "ALTER TABLE users ALTER COLUMN password DROP NOT NULL",
+    "ALTER TABLE users ADD COLUMN IF NOT EXISTS is_placeholder BOOLEAN NOT NULL DEFAULT false",
+    "UPDATE users SET is_placeholder = true, password = NULL"
+    " WHERE email LIKE '%@desktop-app-user.local' AND is_placeholder = false",
+] + [
+    # Change feed / conditional GET columns, backfilled from the creation time of existing rows
+    statement
+    for table, source, index in (
+        ("shipments", "booking_date", "ix_shipments_updated_at_id ON shipments (updated_at, id)"),
+        ("payment_requests", "created_at", "ix_payment_requests_updated_at_id ON payment_requests (updated_at, id)"),
+        ("users", "created_at", "ix_users_updated_at ON users (updated_at)"),
+    )
+    for statement in (
+        f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP",
+        f"UPDATE {table} SET updated_at = COALESCE({source}, now() at time zone 'utc') WHERE updated_at IS NULL",
+        f"ALTER TABLE {table} ALTER COLUMN updated_at SET NOT NULL",
+        f"CREATE INDEX IF NOT EXISTS {index}",
+    )
+] + [
+    # Export job leases
+    "ALTER TABLE export_jobs ADD COLUMN IF NOT EXISTS owner VARCHAR(100)",
+    "ALTER TABLE export_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP",
+] + [
+    # Trigram indexes for admin substring search
+    f"CREATE INDEX IF NOT EXISTS ix_{table}_{column}_trgm ON {table} USING gin ({column} gin_trgm_ops)"
+    for table, columns in (("users", USER_SEARCH_COLUMNS), ("shipments", SHIPMENT_SEARCH_COLUMNS))
+    for column in columns
+]
 
 # Create an app instance. The environment doesn't matter here
 # as we just need the application context and db configuration.
@@ -16,8 +51,18 @@ app = create_app()
 with app.app_context():
     print("Creating database tables...")
     try:
+        if db.engine.dialect.name == "postgresql":
+            # Needed by the trigram search indexes
+            db.session.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            db.session.commit()
         db.create_all()
         print("Tables created successfully!")
+        if db.engine.dialect.name == "postgresql":
+            for statement in POSTGRES_SCHEMA_UPGRADES:
+                db.session.execute(text(statement))
+            db.session.commit()
+            print("Schema upgrades applied.")
         print("You should now see 'users', 'shipments', and 'payment_requests' tables in your database.")
+        print("Run rebuild_analytics.py to fill the analytics rollups from existing data.")
     except Exception as e:
         print(f"An error occurred while creating tables: {e}")
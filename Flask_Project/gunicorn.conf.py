@@ -0,0 +1,83 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+
+def _cpu_count():
+    # Respect CPU affinity / container limits where the platform exposes them
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return multiprocessing.cpu_count()
+
+
+bind = os.environ.get("BIND", f"0.0.0.0:{os.environ.get('PORT', '8000')}")
+
+# Requests mostly wait on the database, so each worker runs several threads. An SSE
+# stream holds one thread for up to SSE_MAX_STREAM_SECONDS; the app caps them at
+# SSE_MAX_STREAMS per worker (default 4), so keep threads comfortably above that.
+# Every worker has its own connection pool of up to DB_POOL_SIZE + DB_MAX_OVERFLOW
+# connections; keep workers * that below the database's connection limit.
+workers = int(os.environ.get("WEB_CONCURRENCY", _cpu_count() * 2 + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+
+# Import the app (blueprints, rate cards) once in the master and fork workers from it
+preload_app = True
+
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 60))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# Recycle workers now and then so slow leaks cannot build up; jitter avoids all restarting together
+max_requests = int(os.environ.get("GUNICORN_MAX_REQUESTS", 2000))
+max_requests_jitter = 200
+
+accesslog = "-"
+errorlog = "-"
+
+
+# Prometheus multiprocess mode: each process writes its samples under this directory
+# and /metrics merges them (app/metrics.py). It has to be set before the app is
+# preloaded and creates its metrics. This file is executed again on every config
+# reload (SIGHUP), so the previous run's files are cleared in on_starting instead,
+# which runs once per master; clearing here would wipe the live workers' totals.
+os.environ.setdefault("PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "shedload-prometheus"))
+os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+
+def on_starting(server):
+    # Runs after the preload, so the master's own files (startup warmup only) go too;
+    # workers open fresh files under their own pids after forking
+    shutil.rmtree(os.environ["PROMETHEUS_MULTIPROC_DIR"], ignore_errors=True)
+    os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+
+    # Events published in one worker never reach streams held by another with the
+    # in-process broker, so refuse that combination instead of silently dropping updates
+    from wsgi import app
+
+    if server.cfg.workers > 1 and app.config.get("EVENT_BROKER") == "memory":
+        raise RuntimeError("EVENT_BROKER=memory only works with one worker; use EVENT_BROKER=postgres or WEB_CONCURRENCY=1")
+
+
+def post_fork(server, worker):
+    # Connections opened by the master during preload must not be shared across
+    # processes; drop them from the inherited pools without closing the master's sockets
+    from wsgi import app
+    from app.extensions import db
+    from app.warmup import prime_pool
+
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    # Open this worker's own first connection before it takes traffic; /readyz retries if this fails
+    app.extensions.setdefault("warmup", {})["ready"] = prime_pool(app)
+
+
+def child_exit(server, worker):
+    # Stop reporting the exited worker's live gauges; its counters and histograms stay in the totals
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,24 @@
+import os
+import sys
+
+# This is important to ensure the app can be found by the script
+project_home = os.path.dirname(os.path.abspath(__file__))
+if project_home not in sys.path:
+    sys.path.insert(0, project_home)
+
+from app import create_app
+from app.services.analytics_service import rebuild_rollups, rollup_totals
+
+# Recomputes the analytics rollup tables from shipments and users. Run it once after
+# the rollup tables are first created, and any time the rollups are suspected to
+# have drifted (e.g. after editing shipments directly in the database).
+app = create_app()
+
+with app.app_context():
+    print("Rebuilding analytics rollups...")
+    try:
+        rebuild_rollups()
+        orders, revenue, users = rollup_totals()
+        print(f"Rollups rebuilt: {orders} orders, {revenue} revenue, {users} users.")
+    except Exception as e:
+        print(f"An error occurred while rebuilding rollups: {e}")
@@ -0,0 +1,23 @@
+import os
+import sys
+
+from gunicorn.app.wsgiapp import run
+
+# Production launcher: runs gunicorn with gunicorn.conf.py against wsgi:app.
+# Extra arguments are passed through to gunicorn, e.g. `python serve.py --workers 3`.
+#
+# Reloading: `kill -HUP <master pid>` replaces the workers gracefully (in-flight
+# requests finish within graceful_timeout). Because the app is preloaded in the
+# master, new code needs a new master: send USR2 to start one alongside the old,
+# then QUIT to the old master once the new workers are up.
+project_home = os.path.dirname(os.path.abspath(__file__))
+
+if __name__ == "__main__":
+    sys.argv = [
+        "gunicorn",
+        "--config", os.path.join(project_home, "gunicorn.conf.py"),
+        "--chdir", project_home,
+        *sys.argv[1:],
+        "wsgi:app",
+    ]
+    run()
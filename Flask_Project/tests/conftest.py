@@ -0,0 +1,126 @@
+import pytest
+
+import config
+from app import create_app
+from app.extensions import db
+from app.models import PaymentRequest, User
+
+
+SHIPMENT = {
+    "sender_name": "Sam Gill",
+    "sender_address_street": "18 Model Town",
+    "sender_address_city": "Ludhiana",
+    "sender_address_state": "Punjab",
+    "sender_address_pincode": "141001",
+    "sender_address_country": "India",
+    "sender_phone": "9999999999",
+    "receiver_name": "Rita Rao",
+    "receiver_address_street": "4 Park Street",
+    "receiver_address_city": "Delhi",
+    "receiver_address_state": "Delhi",
+    "receiver_address_pincode": "110001",
+    "receiver_address_country": "India",
+    "receiver_phone": "8888888888",
+    "package_weight_kg": 2,
+    "package_width_cm": 10,
+    "package_height_cm": 10,
+    "package_length_cm": 10,
+    "pickup_date": "2026-10-20",
+    "service_type": "Express",
+    "final_total_price_with_tax": 1180,
+}
+
+USER_EMAILS = ["asha@example.com", "bilal@example.com", "chen@example.com"]
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "file_db: use a SQLite file instead of the in-memory database")
+
+
+@pytest.fixture
+def app(request, tmp_path, monkeypatch):
+    if request.node.get_closest_marker("file_db"):
+        # In-memory SQLite is one connection shared by every thread, so work that
+        # runs in other threads (export jobs, parallel queries) would share the
+        # test's transaction and interleave on the connection
+        monkeypatch.setattr(config.TestingConfig, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'test.db'}")
+    app = create_app("testing")
+    app.config["EXPORT_DIR"] = str(tmp_path / "exports")
+    with app.app_context():
+        db.create_all(bind_key=None)
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all(bind_key=None)
+        db.engine.dispose()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def book_shipment(client, user_email, **fields):
+    response = client.post("/api/shipments", json={**SHIPMENT, "user_email": user_email, **fields})
+    assert response.status_code == 201, response.get_json()
+    return response.get_json()["shipment_id_str"]
+
+
+def desktop_transaction(n):
+    party = {"city": "Ludhiana", "state": "Punjab", "pincode": "141001", "country": "India"}
+    return {
+        "transaction": {"id": f"TXN{n}", "amount": 500 + n, "utr": f"DESK{n:08d}", "date": "2026-10-19"},
+        "sender": {**party, "name": f"Desk Sender {n}", "phone": f"70000000{n:02d}"},
+        "receiver": {**party, "name": f"Desk Receiver {n}", "city": "Delhi", "state": "Delhi",
+                     "pincode": "110001", "phone": f"60000000{n:02d}"},
+    }
+
+
+@pytest.fixture
+def seeded(app, client):
+    """
+    Several users with several shipments each, one user with several payments
+    (some approved), tracking history on a few shipments and desktop-app
+    placeholder users, so list and detail routes read more than one row of
+    everything they join or batch.
+    """
+    shipments = {}
+    for email in USER_EMAILS:
+        response = client.post("/api/auth/signup", json={
+            "first_name": email.split("@")[0].title(), "last_name": "Test", "email": email, "password": "secret1",
+        })
+        assert response.status_code == 201, response.get_json()
+        shipments[email] = [book_shipment(client, email) for _ in range(4)]
+
+    payer = USER_EMAILS[0]
+    for n, shipment_id_str in enumerate(shipments[payer]):
+        response = client.post("/api/payments", json={
+            "shipment_id_str": shipment_id_str, "utr": f"{n:012d}", "amount": 1180,
+        })
+        assert response.status_code in (200, 201), response.get_json()
+
+    with app.app_context():
+        payment_ids = [p.id for p in PaymentRequest.query.order_by(PaymentRequest.id)]
+    response = client.put("/api/admin/payments/status", json={"status": "Approved", "payment_ids": payment_ids[:2]})
+    assert response.status_code == 200, response.get_json()
+
+    for shipment_id_str in shipments[USER_EMAILS[1]][:2]:
+        response = client.put(f"/api/admin/shipments/{shipment_id_str}/status",
+                              json={"status": "In Transit", "location": "Ludhiana Hub"})
+        assert response.status_code == 200, response.get_json()
+
+    response = client.post("/api/create-invoices-from-payments",
+                           json={"transactions": [desktop_transaction(n) for n in range(3)]})
+    assert response.status_code == 200, response.get_json()
+
+    with app.app_context():
+        user_ids = {u.email: u.id for u in User.query}
+        placeholder_ids = [u.id for u in User.query.filter_by(is_placeholder=True)]
+
+    return {
+        "shipments": shipments,
+        "payer": payer,
+        "payment_ids": payment_ids,
+        "user_ids": user_ids,
+        "placeholder_ids": placeholder_ids,
+    }
@@ -0,0 +1,21 @@
+from .conftest import SHIPMENT, USER_EMAILS
+
+
+def user_stats(client):
+    response = client.get("/api/admin/users?limit=50")
+    assert response.status_code == 200, response.get_json()
+    return {u["email"]: u for u in response.get_json()["users"]}
+
+
+def test_total_spend_counts_paid_shipments_only(client, seeded):
+    price = SHIPMENT["final_total_price_with_tax"]
+    stats = user_stats(client)
+    # Two of the payer's four shipments were approved (Booked); the rest await payment
+    assert stats[seeded["payer"]]["shipment_count"] == 4
+    assert stats[seeded["payer"]]["total_spend"] == 2 * price
+    assert stats[USER_EMAILS[2]]["total_spend"] == 0
+
+    booked = seeded["shipments"][seeded["payer"]][0]
+    response = client.put(f"/api/admin/shipments/{booked}/status", json={"status": "Cancelled"})
+    assert response.status_code == 200, response.get_json()
+    assert user_stats(client)[seeded["payer"]]["total_spend"] == price
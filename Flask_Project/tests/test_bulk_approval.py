@@ -0,0 +1,68 @@
+import threading
+
+import pytest
+
+from app.extensions import db
+from app.models import PaymentRequest, Shipment
+
+
+def approve(client, payment_ids, status="Approved"):
+    response = client.put("/api/admin/payments/status", json={"status": status, "payment_ids": payment_ids})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def test_outcome_per_payment(client, seeded):
+    approved, pending = seeded["payment_ids"][:2], seeded["payment_ids"][2:]
+    body = approve(client, [approved[0], pending[0], pending[0], 99999])
+
+    assert body["results"] == {
+        str(approved[0]): "already_processed",
+        str(pending[0]): "approved",
+        str(99999): "not_found",
+    }
+    assert body["summary"] == {"already_processed": 1, "approved": 1, "not_found": 1}
+
+
+def test_decided_payments_are_not_decided_again(app, client, seeded):
+    pending = seeded["payment_ids"][2:]
+    assert approve(client, pending, "Rejected")["summary"] == {"rejected": len(pending)}
+    assert approve(client, pending)["summary"] == {"already_processed": len(pending)}
+
+    with app.app_context():
+        assert {p.status for p in PaymentRequest.query.filter(PaymentRequest.id.in_(pending))} == {"Rejected"}
+
+
+def test_invalid_requests_are_rejected(client, seeded):
+    for body in ({"status": "Approved"}, {"status": "Approved", "payment_ids": []},
+                 {"status": "Approved", "payment_ids": ["1"]}, {"status": "Paid", "payment_ids": [1]}):
+        assert client.put("/api/admin/payments/status", json=body).status_code == 400
+
+
+@pytest.mark.file_db
+def test_concurrent_overlapping_approvals_decide_each_payment_once(app, seeded):
+    pending = seeded["payment_ids"][2:]
+    barrier = threading.Barrier(2)
+    results = []
+
+    def run(payment_ids):
+        client = app.test_client()
+        barrier.wait()
+        results.append(approve(client, payment_ids)["results"])
+
+    threads = [threading.Thread(target=run, args=(ids,)) for ids in (pending, list(reversed(pending)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(results) == 2
+    for payment_id in map(str, pending):
+        assert sorted(r[payment_id] for r in results) == ["already_processed", "approved"]
+
+    with app.app_context():
+        payments = PaymentRequest.query.filter(PaymentRequest.id.in_(pending)).all()
+        assert {p.status for p in payments} == {"Approved"}
+        for shipment in db.session.query(Shipment).filter(Shipment.id.in_([p.shipment_id for p in payments])):
+            assert shipment.status == "Booked"
+            assert [e["stage"] for e in shipment.tracking_history].count("Booked") == 1
@@ -0,0 +1,100 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import update
+
+from app.extensions import db
+from app.models import Shipment
+from app.services.change_feed import settled_before
+
+from .conftest import USER_EMAILS
+
+SETTLED = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def feed(client, **params):
+    response = client.get("/api/admin/shipments/changes", query_string=params)
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def stamp(app, shipment_ids, updated_at):
+    with app.app_context():
+        db.session.execute(update(Shipment).where(Shipment.id.in_(shipment_ids)).values(updated_at=updated_at))
+        db.session.commit()
+
+
+def all_shipment_ids(app):
+    with app.app_context():
+        return [s.id for s in Shipment.query.order_by(Shipment.id)]
+
+
+def test_changes_inside_the_settle_window_are_held_back(app, client, seeded):
+    assert feed(client) == {"changes": [], "cursor": None, "has_more": False}
+
+    app.config["CHANGE_FEED_SETTLE_SECONDS"] = 0
+    assert len(feed(client, limit=500)["changes"]) == len(all_shipment_ids(app))
+
+
+def test_pages_through_rows_sharing_a_timestamp(app, client, seeded):
+    ids = all_shipment_ids(app)
+    stamp(app, ids, SETTLED)
+
+    served, cursor, has_more = [], None, True
+    while has_more:
+        page = feed(client, limit=5, **({"cursor": cursor} if cursor else {}))
+        assert len(page["changes"]) <= 5
+        served += [c["id"] for c in page["changes"]]
+        cursor, has_more = page["cursor"], page["has_more"]
+    assert served == ids
+
+    assert feed(client, cursor=cursor) == {"changes": [], "cursor": cursor, "has_more": False}
+
+
+def test_row_changed_after_the_cursor_is_served_again(app, client, seeded):
+    stamp(app, all_shipment_ids(app), SETTLED)
+    cursor = feed(client, limit=500)["cursor"]
+
+    shipment_id_str = seeded["shipments"][USER_EMAILS[1]][0]
+    response = client.put(f"/api/admin/shipments/{shipment_id_str}/status", json={"status": "Delivered"})
+    assert response.status_code == 200, response.get_json()
+    assert feed(client, cursor=cursor)["changes"] == []
+
+    app.config["CHANGE_FEED_SETTLE_SECONDS"] = 0
+    changes = feed(client, cursor=cursor)["changes"]
+    assert [(c["shipment_id_str"], c["status"]) for c in changes] == [(shipment_id_str, "Delivered")]
+
+
+def test_user_feed_only_serves_the_users_shipments(app, client, seeded):
+    app.config["CHANGE_FEED_SETTLE_SECONDS"] = 0
+    email = USER_EMAILS[1]
+    response = client.get("/api/shipments/changes", query_string={"email": email, "limit": 500})
+    assert response.status_code == 200, response.get_json()
+    assert sorted(c["shipment_id_str"] for c in response.get_json()["changes"]) == sorted(seeded["shipments"][email])
+
+    assert client.get("/api/shipments/changes").status_code == 400
+    assert client.get("/api/shipments/changes", query_string={"email": email, "cursor": "nope"}).status_code == 400
+
+
+def postgres_session(oldest_write):
+    return SimpleNamespace(
+        get_bind=lambda: SimpleNamespace(dialect=SimpleNamespace(name="postgresql")),
+        execute=lambda statement: SimpleNamespace(scalar=lambda: oldest_write),
+    )
+
+
+def test_watermark_stops_at_the_oldest_open_write(app):
+    app.config["DB_LONG_STATEMENT_TIMEOUT_MS"] = 60000
+    with app.app_context():
+        # A transaction that started 10s ago may still commit rows stamped since then
+        open_since = datetime.utcnow() - timedelta(seconds=10)
+        assert settled_before(postgres_session(open_since), 2) == open_since - timedelta(seconds=2)
+
+        # ...but one stuck longer than the long statement timeout does not hold the feed back
+        before = datetime.utcnow()
+        watermark = settled_before(postgres_session(before - timedelta(hours=1)), 2)
+        assert before - timedelta(seconds=62) <= watermark <= datetime.utcnow() - timedelta(seconds=62)
+
+        before = datetime.utcnow()
+        watermark = settled_before(postgres_session(None), 2)
+        assert before - timedelta(seconds=2) <= watermark <= datetime.utcnow() - timedelta(seconds=2)
@@ -0,0 +1,61 @@
+from datetime import datetime
+
+from sqlalchemy import update
+
+from app.extensions import db
+from app.models import Shipment
+from app.services.table_versions import table_versions
+
+from .conftest import USER_EMAILS
+
+
+def etag(response):
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response.headers["ETag"]
+
+
+def test_unchanged_list_is_not_modified(client, seeded):
+    first = client.get("/api/admin/shipments?limit=50")
+    assert "Last-Modified" not in first.headers
+
+    again = client.get("/api/admin/shipments?limit=50", headers={"If-None-Match": etag(first)})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == first.headers["ETag"]
+    assert again.get_data() == b""
+
+
+def test_write_with_an_older_timestamp_changes_the_etag(app, client, seeded):
+    # A transaction stamped before the client's copy but committed after it
+    before = etag(client.get("/api/admin/shipments?limit=50"))
+    with app.app_context():
+        db.session.execute(
+            update(Shipment).where(Shipment.shipment_id_str == seeded["shipments"][USER_EMAILS[1]][0])
+            .values(status="Delivered", updated_at=datetime(2000, 1, 1))
+        )
+        db.session.commit()
+
+    response = client.get("/api/admin/shipments?limit=50", headers={"If-None-Match": before})
+    assert etag(response) != before
+
+
+def test_rolled_back_write_keeps_the_version(app, seeded):
+    with app.app_context():
+        versions = table_versions("shipments", "users")
+        db.session.get(Shipment, 1).status = "Delivered"
+        db.session.flush()
+        db.session.rollback()
+        assert table_versions("shipments", "users") == versions
+
+
+def test_dependent_table_write_changes_the_etag(client, seeded):
+    # An approval changes both the customer's and the admin's payments lists
+    before = etag(client.get("/api/user/payments", query_string={"email": seeded["payer"]}))
+    admin_before = etag(client.get("/api/admin/payments?limit=50"))
+
+    response = client.put("/api/admin/payments/status",
+                          json={"status": "Approved", "payment_ids": seeded["payment_ids"][2:3]})
+    assert response.status_code == 200, response.get_json()
+
+    assert etag(client.get("/api/user/payments", query_string={"email": seeded["payer"]},
+                           headers={"If-None-Match": before})) != before
+    assert etag(client.get("/api/admin/payments?limit=50", headers={"If-None-Match": admin_before})) != admin_before
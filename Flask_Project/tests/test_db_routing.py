@@ -0,0 +1,98 @@
+import json
+import time
+
+import pytest
+
+import config
+from app import create_app, db_routing
+from app.db_routing import READ_AFTER_HEADER
+from app.extensions import db
+
+from .conftest import SHIPMENT
+
+
+def make_app(monkeypatch, primary_url, replica_url):
+    monkeypatch.setattr(config.TestingConfig, "SQLALCHEMY_DATABASE_URI", primary_url)
+    monkeypatch.setattr(config.TestingConfig, "DATABASE_REPLICA_URL", replica_url, raising=False)
+    monkeypatch.setattr(db_routing, "_replica_down_until", 0.0)
+    return create_app("testing")
+
+
+@pytest.fixture
+def replica_app(tmp_path, monkeypatch):
+    """Primary and replica as two SQLite files; the replica never receives the primary's writes."""
+    app = make_app(monkeypatch, f"sqlite:///{tmp_path / 'primary.db'}", f"sqlite:///{tmp_path / 'replica.db'}")
+    with app.app_context():
+        db.create_all(bind_key=None)
+        db.metadata.create_all(db.engines["replica"])
+    yield app
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def signup(client, email):
+    response = client.post("/api/auth/signup", json={
+        "first_name": "Pat", "last_name": "Lee", "email": email, "password": "secret1",
+    })
+    assert response.status_code == 201, response.get_json()
+    return response
+
+
+def listed_emails(response):
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return [u["email"] for u in response.get_json()["users"]]
+
+
+def test_reads_go_to_the_replica(replica_app):
+    # No cookies, like the cross-origin frontend
+    client = replica_app.test_client(use_cookies=False)
+    signup(client, "pat@example.com")
+    assert listed_emails(client.get("/api/admin/users")) == []
+
+
+def test_client_is_pinned_to_the_primary_after_its_write(replica_app):
+    client = replica_app.test_client(use_cookies=False)
+    read_after = signup(client, "pat@example.com").headers[READ_AFTER_HEADER]
+
+    pinned = client.get("/api/admin/users", headers={READ_AFTER_HEADER: read_after})
+    assert listed_emails(pinned) == ["pat@example.com"]
+
+    expired = str(float(read_after) - replica_app.config["REPLICA_PIN_SECONDS"] - 1)
+    assert listed_emails(client.get("/api/admin/users", headers={READ_AFTER_HEADER: expired})) == []
+
+
+def test_same_origin_client_is_pinned_by_cookie(replica_app):
+    client = replica_app.test_client()
+    signup(client, "pat@example.com")
+    assert listed_emails(client.get("/api/admin/users")) == ["pat@example.com"]
+
+
+def test_streamed_write_pins_the_client(replica_app):
+    client = replica_app.test_client(use_cookies=False)
+    signup(client, "pat@example.com")
+    shipment_id_str = client.post("/api/shipments", json={**SHIPMENT, "user_email": "pat@example.com"}).get_json()["shipment_id_str"]
+
+    scan = json.dumps({"shipment_id_str": shipment_id_str, "status": "In Transit", "location": "Hub"})
+    response = client.post("/api/admin/scans", data=scan, content_type="application/x-ndjson")
+    assert READ_AFTER_HEADER in response.headers
+    response.get_data()
+    response.close()
+
+
+def test_replica_failure_falls_back_to_the_primary(tmp_path, monkeypatch):
+    app = make_app(monkeypatch, f"sqlite:///{tmp_path / 'primary.db'}",
+                   f"sqlite:///{tmp_path / 'missing' / 'replica.db'}")
+    with app.app_context():
+        db.create_all(bind_key=None)
+    client = app.test_client(use_cookies=False)
+    signup(client, "pat@example.com")
+
+    assert listed_emails(client.get("/api/admin/users")) == ["pat@example.com"]
+    # The replica is skipped for a while instead of failing every request first
+    assert db_routing._replica_down_until > time.monotonic()
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
@@ -0,0 +1,67 @@
+import pytest
+
+from app import create_app
+from app.extensions import db, event_bus
+from app.services.event_broker import InMemoryBroker
+from app.services.tracking_service import notify_shipment_changed, shipment_channel
+
+from .conftest import USER_EMAILS
+
+
+def take(listener, n):
+    events = []
+    for event in listener:
+        if event is not None:
+            events.append(event)
+        if len(events) == n:
+            return events
+    return events
+
+
+def test_late_delivered_event_is_not_skipped():
+    broker = InMemoryBroker()
+    listener = broker.listen("c", heartbeat=0.01, max_duration=0.5)
+    broker._deliver("c", 200, "status", {"n": 1})
+    broker._deliver("c", 100, "status", {"n": 2})
+    assert [e[0] for e in take(listener, 2)] == [200, 100]
+
+
+def test_resume_after_last_event_id():
+    broker = InMemoryBroker()
+    for event_id in (100, 300, 200):
+        broker._deliver("c", event_id, "status", {})
+    listener = broker.listen("c", last_event_id=300, heartbeat=0.01, max_duration=0.1)
+    assert [e[0] for e in take(listener, 5)] == [200]
+
+    # Unknown to this process (another worker delivered it): newer IDs are replayed
+    listener = broker.listen("c", last_event_id=150, heartbeat=0.01, max_duration=0.1)
+    assert [e[0] for e in take(listener, 5)] == [300, 200]
+
+
+def test_events_are_sent_on_commit_only(app):
+    with app.app_context():
+        listener = event_bus.listen("shipment:S1", heartbeat=0.01, max_duration=0.2)
+        notify_shipment_changed("S1", "a@example.com", "In Transit")
+        db.session.rollback()
+        notify_shipment_changed("S1", "a@example.com", "Delivered")
+        db.session.commit()
+        assert [e[2]["status"] for e in take(listener, 5)] == ["Delivered"]
+
+
+def test_stream_includes_update_committed_after_snapshot_position(app, client, seeded):
+    shipment_id_str = seeded["shipments"][USER_EMAILS[0]][0]
+    with app.app_context():
+        position = event_bus.position()
+        notify_shipment_changed(shipment_id_str, USER_EMAILS[0], "In Transit")
+        db.session.commit()
+        listener = event_bus.listen(shipment_channel(shipment_id_str), heartbeat=0.01, max_duration=0.2,
+                                    position=position)
+        assert [e[2]["status"] for e in take(listener, 1)] == ["In Transit"]
+
+
+def test_postgres_broker_refuses_pgbouncer(monkeypatch):
+    import config
+    monkeypatch.setattr(config.TestingConfig, "EVENT_BROKER", "postgres")
+    monkeypatch.setattr(config.TestingConfig, "DB_PGBOUNCER", True)
+    with pytest.raises(RuntimeError, match="PgBouncer|DB_PGBOUNCER"):
+        create_app("testing")
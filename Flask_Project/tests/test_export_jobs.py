@@ -0,0 +1,53 @@
+import os
+import threading
+from datetime import datetime
+
+import pytest
+from sqlalchemy import update
+
+from app.extensions import db
+from app.models import ExportJob
+from app.services import export_jobs as export_jobs_module
+from app.services.export_jobs import ExportJobRunner
+
+
+@pytest.mark.file_db
+def test_job_failed_while_running_is_not_completed(app, client, seeded, monkeypatch):
+    iter_export = export_jobs_module.iter_export
+    finished = threading.Event()
+    finish = ExportJobRunner._finish
+
+    def lease_lost_midway(kind, filters, **kwargs):
+        # expire_stale in another worker decides this one is gone
+        with app.app_context():
+            db.session.execute(update(ExportJob).values(status="failed", error="interrupted"))
+            db.session.commit()
+        yield from iter_export(kind, filters, **kwargs)
+
+    def finish_and_signal(self, job_id, **values):
+        try:
+            return finish(self, job_id, **values)
+        finally:
+            finished.set()
+
+    monkeypatch.setattr(export_jobs_module, "iter_export", lease_lost_midway)
+    monkeypatch.setattr(ExportJobRunner, "_finish", finish_and_signal)
+
+    job_id = client.post("/api/admin/exports", json={"kind": "shipments"}).get_json()["job_id"]
+    assert finished.wait(10)
+
+    job = client.get(f"/api/admin/exports/{job_id}").get_json()
+    assert (job["status"], job["error"]) == ("failed", "interrupted")
+    assert os.listdir(app.config["EXPORT_DIR"]) == []
+
+
+def test_file_built_on_another_host_is_not_found(app, client):
+    with app.app_context():
+        db.session.add(ExportJob(
+            id="j1", kind="shipments", filters={}, compress=False, fingerprint="f", status="completed",
+            owner="export-host-2:1234", file_path="/nonexistent/j1.csv", finished_at=datetime.utcnow(),
+        ))
+        db.session.commit()
+    response = client.get("/api/admin/exports/j1/download")
+    assert response.status_code == 404
+    assert "another server" in response.get_json()["error"]
@@ -0,0 +1,43 @@
+import json
+
+from app.models import Shipment
+from app.services import hub_scan_service
+
+from .conftest import USER_EMAILS
+
+
+def post_scans(client, shipment_ids, status):
+    scans = "\n".join(json.dumps({"shipment_id_str": s, "status": status, "location": "Delhi Hub"})
+                      for s in shipment_ids)
+    response = client.post("/api/admin/scans", data=scans, content_type="application/x-ndjson")
+    outcomes = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    response.close()
+    return outcomes
+
+
+def test_failed_batch_reports_every_event_and_the_stream_continues(app, client, seeded, monkeypatch):
+    app.config["HUB_SCAN_BATCH_SIZE"] = 2
+    shipment_ids = seeded["shipments"][USER_EMAILS[2]]
+    record_status_changes = hub_scan_service.record_status_changes
+    calls = []
+
+    def fail_first_batch(changes):
+        calls.append(changes)
+        if len(calls) == 1:
+            raise RuntimeError("lock timeout")
+        return record_status_changes(changes)
+
+    monkeypatch.setattr(hub_scan_service, "record_status_changes", fail_first_batch)
+    outcomes = post_scans(client, shipment_ids, "In Transit")
+
+    assert [o["result"] for o in outcomes[:-1]] == ["error", "error", "applied", "applied"]
+    assert outcomes[-1] == {"done": True, "applied": 2, "rejected": 0, "failed": 2}
+    with app.app_context():
+        statuses = {s.shipment_id_str: s.status for s in Shipment.query.filter(Shipment.shipment_id_str.in_(shipment_ids))}
+    assert [statuses[s] for s in shipment_ids] == ["Pending Payment", "Pending Payment", "In Transit", "In Transit"]
+
+
+def test_unknown_shipment_is_rejected(client, seeded):
+    outcomes = post_scans(client, ["NOPE", seeded["shipments"][USER_EMAILS[2]][0]], "In Transit")
+    assert [o["result"] for o in outcomes[:-1]] == ["rejected", "applied"]
+    assert outcomes[-1]["rejected"] == 1
@@ -0,0 +1,108 @@
+import hashlib
+import json
+import threading
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app.extensions import db
+from app.instrumentation import query_budget
+from app.models import IdempotencyKey, Shipment, User
+from app.services import idempotency
+from app.services.idempotency import IdempotencyKeyLost, idempotent
+
+from .conftest import SHIPMENT
+
+
+@pytest.fixture
+def customer(client):
+    response = client.post("/api/auth/signup", json={
+        "first_name": "Pat", "last_name": "Lee", "email": "pat@example.com", "password": "secret1",
+    })
+    assert response.status_code == 201, response.get_json()
+    return {**SHIPMENT, "user_email": "pat@example.com"}
+
+
+def shipment_count(app):
+    with app.app_context():
+        return Shipment.query.count()
+
+
+def test_repeat_is_replayed(app, client, customer):
+    first = client.post("/api/shipments", json=customer, headers={"Idempotency-Key": "k1"})
+    again = client.post("/api/shipments", json=customer, headers={"Idempotency-Key": "k1"})
+    assert first.status_code == again.status_code == 201
+    assert again.headers["Idempotent-Replayed"] == "true"
+    assert again.get_json() == first.get_json()
+    assert shipment_count(app) == 1
+
+    other = client.post("/api/shipments", json={**customer, "package_weight_kg": 3}, headers={"Idempotency-Key": "k1"})
+    assert other.status_code == 422
+
+
+@pytest.mark.file_db
+def test_concurrent_repeats_create_one_shipment(app, customer):
+    responses = []
+
+    def post():
+        response = app.test_client().post("/api/shipments", json=customer, headers={"Idempotency-Key": "k1"})
+        responses.append((response.status_code, response.get_json()))
+
+    threads = [threading.Thread(target=post) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert [status for status, _ in responses] == [201] * 4
+    assert len({body["shipment_id_str"] for _, body in responses}) == 1
+    assert shipment_count(app) == 1
+
+
+def test_key_committed_without_a_response_is_not_rerun(app, client, customer, monkeypatch):
+    # The worker dies after the view's commit, before the response is stored
+    monkeypatch.setattr(idempotency, "_store", lambda *args: None)
+    assert client.post("/api/shipments", json=customer, headers={"Idempotency-Key": "k1"}).status_code == 201
+    monkeypatch.undo()
+    with app.app_context():
+        assert IdempotencyKey.query.one().status == "committed"
+
+    app.config["IDEMPOTENCY_STALE_SECONDS"] = 0
+    retry = client.post("/api/shipments", json=customer, headers={"Idempotency-Key": "k1"})
+    assert retry.status_code == 409
+    assert shipment_count(app) == 1
+
+
+def test_stale_key_without_a_commit_is_taken_over(app, client, customer):
+    body = json.dumps(customer)
+    # The worker died before committing anything
+    with app.app_context():
+        db.session.add(IdempotencyKey(
+            key="k1", endpoint="/api/shipments", status="in_progress",
+            request_hash=hashlib.sha256(body.encode()).hexdigest(),
+            created_at=datetime.utcnow() - timedelta(hours=1), expires_at=datetime.utcnow() + timedelta(hours=1),
+        ))
+        db.session.commit()
+
+    retry = client.post("/api/shipments", data=body, content_type="application/json",
+                        headers={"Idempotency-Key": "k1"})
+    assert retry.status_code == 201
+    assert shipment_count(app) == 1
+
+
+def test_commit_is_refused_after_a_takeover(app, client):
+    @app.route("/_test/slow-write", methods=["POST"])
+    @query_budget(None)
+    @idempotent
+    def slow_write():
+        # Meanwhile a retry decided this request was dead and took the key over
+        db.session.execute(update(IdempotencyKey).values(created_at=datetime.utcnow() + timedelta(seconds=1)))
+        db.session.add(User(first_name="Pat", last_name="Lee", email="pat@example.com"))
+        db.session.commit()
+        return "", 204
+
+    with pytest.raises(IdempotencyKeyLost):
+        client.post("/_test/slow-write", json={}, headers={"Idempotency-Key": "k1"})
+    with app.app_context():
+        assert User.query.count() == 0
@@ -0,0 +1,17 @@
+from app.services import pricing_service
+from app.services.pricing_service import calculate_international_price, load_rate_card
+
+
+def test_failed_rate_card_read_is_retried(monkeypatch):
+    pricing_service._read_rate_card.cache_clear()
+
+    def unreadable(*args, **kwargs):
+        raise IOError("pricing.json is being replaced")
+
+    monkeypatch.setattr(pricing_service, "open", unreadable, raising=False)
+    assert load_rate_card() is None
+    assert calculate_international_price("USA", 2) == {"error": "Could not load pricing data."}
+
+    monkeypatch.delattr(pricing_service, "open")
+    assert load_rate_card()
+    assert "error" not in calculate_international_price("USA", 2)
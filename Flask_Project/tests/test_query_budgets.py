@@ -0,0 +1,210 @@
+"""
+Runs every route against multi-row data under TESTING, where a request that
+breaks its @query_budget (too many statements, or one statement repeated per
+row) raises QueryBudgetExceeded out of the test client.
+"""
+import json
+import time
+
+import pytest
+from flask import Response, g, stream_with_context
+
+from app.extensions import db
+from app.instrumentation import QueryBudgetExceeded, query_budget
+from app.models import User
+from app.services.parallel_queries import parallel_queries
+
+from .conftest import USER_EMAILS, book_shipment, desktop_transaction
+
+
+def test_every_route_declares_a_budget(app):
+    missing = sorted(
+        rule.rule for rule in app.url_map.iter_rules()
+        if rule.endpoint != "static" and not hasattr(app.view_functions[rule.endpoint], "query_budget")
+    )
+    assert missing == []
+
+
+@pytest.mark.parametrize("url", [
+    "/api/admin/shipments?limit=50",
+    "/api/admin/shipments?limit=50&facets=1",
+    "/api/admin/shipments?q=rita",
+    "/api/admin/payments?limit=50",
+    "/api/admin/users?limit=50",
+    "/api/admin/users?q=desk",
+    "/api/admin/users/{payer_id}",
+    "/api/admin/dashboard",
+    "/api/admin/web_analytics",
+    "/api/admin/analytics/shipments",
+    "/api/admin/analytics/users",
+    "/api/admin/analytics/lanes",
+    "/api/admin/shipments/changes",
+    "/api/admin/payments/changes",
+    "/api/shipments?email={payer}",
+    "/api/shipments/changes?email={payer}",
+    "/api/shipments/{shipment_id_str}",
+    "/api/user/payments?email={payer}",
+    "/api/company-details",
+    "/healthz",
+    "/readyz",
+    "/metrics",
+    "/",
+])
+def test_reads_stay_within_budget(client, seeded, url):
+    url = url.format(
+        payer=seeded["payer"],
+        payer_id=seeded["user_ids"][seeded["payer"]],
+        shipment_id_str=seeded["shipments"][USER_EMAILS[1]][0],
+    )
+    response = client.get(url)
+    assert response.status_code == 200, response.get_data(as_text=True)
+
+
+def test_writes_stay_within_budget(app, client, seeded):
+    payer = seeded["payer"]
+    new_ids = [book_shipment(client, payer) for _ in range(3)]
+    for n, shipment_id_str in enumerate(new_ids):
+        response = client.post("/api/payments", json={
+            "shipment_id_str": shipment_id_str, "utr": f"{100 + n:012d}", "amount": 1180,
+        })
+        assert response.status_code in (200, 201), response.get_json()
+
+    payment_ids = seeded["payment_ids"]
+    response = client.put(f"/api/admin/payments/{payment_ids[2]}/status", json={"status": "Rejected"})
+    assert response.status_code == 200, response.get_json()
+
+    statement = "utr,amount\n" + "\n".join(f"{100 + n:012d},1180" for n in range(3))
+    response = client.post("/api/admin/payments/reconcile", data=statement, content_type="text/csv")
+    assert response.status_code == 200, response.get_json()
+
+    response = client.put(f"/api/admin/shipments/{new_ids[0]}/status", json={"status": "Delivered"})
+    assert response.status_code == 200, response.get_json()
+
+    response = client.post("/api/create-invoice-from-payment", json=desktop_transaction(10))
+    assert response.status_code == 201, response.get_json()
+
+    response = client.post("/api/create-invoices-from-payments",
+                           json={"transactions": [desktop_transaction(n) for n in range(20, 30)]})
+    assert response.status_code == 200, response.get_json()
+
+    response = client.post(f"/api/admin/users/{seeded['placeholder_ids'][0]}/upgrade", json={
+        "first_name": "Desk", "last_name": "Sender", "email": "desk@example.com", "password": "secret1",
+    })
+    assert response.status_code == 200, response.get_json()
+
+    assert client.post("/api/auth/login", json={"email": payer, "password": "secret1"}).status_code == 200
+    assert client.post("/api/auth/login", json={"email": payer, "password": "wrong"}).status_code == 401
+
+
+def test_pricing_routes_run_no_queries(client):
+    for prefix in ("/api/domestic", "/api/international"):
+        client.post(f"{prefix}/price", json={"state": "Punjab", "city": "Ludhiana", "country": "USA",
+                                             "mode": "express", "weight": 2})
+        assert client.post(f"{prefix}/reverse-price", json={"amount": 1000}).status_code == 200
+    assert client.post("/api/destination-suggestion", json={"amount": 1000}).status_code == 200
+
+
+def test_streamed_routes_stay_within_budget(client, seeded):
+    shipment_ids = seeded["shipments"][USER_EMAILS[2]]
+    scans = "\n".join(json.dumps({"shipment_id_str": s, "status": "In Transit", "location": "Delhi Hub"})
+                      for s in shipment_ids)
+    response = client.post("/api/admin/scans", data=scans, content_type="application/x-ndjson")
+    outcomes = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    response.close()
+    assert outcomes[-1] == {"done": True, "applied": len(shipment_ids), "rejected": 0, "failed": 0}
+
+    for kind in ("shipments", "payments", "users"):
+        response = client.get(f"/api/admin/{kind}/export")
+        assert response.status_code == 200
+        assert len(response.get_data(as_text=True).splitlines()) > 1
+        response.close()
+
+    for url in (f"/api/shipments/{shipment_ids[0]}/events", f"/api/user/events?email={seeded['payer']}"):
+        response = client.get(url)
+        assert response.status_code == 200
+        assert response.mimetype == "text/event-stream"
+        response.close()
+
+
+@pytest.mark.file_db
+def test_export_job_routes_stay_within_budget(client, seeded):
+    response = client.post("/api/admin/exports", json={"kind": "shipments"})
+    assert response.status_code == 202, response.get_json()
+    job_id = response.get_json()["job_id"]
+
+    deadline = time.monotonic() + 10
+    while True:
+        job = client.get(f"/api/admin/exports/{job_id}").get_json()
+        if job["status"] not in ("queued", "running") or time.monotonic() > deadline:
+            break
+        time.sleep(0.05)
+    assert job["status"] == "completed", job
+    assert job["rows_written"] == sum(len(ids) for ids in seeded["shipments"].values()) + 3
+
+    response = client.get(f"/api/admin/exports/{job_id}/download")
+    assert response.status_code == 200
+    response.close()
+
+
+def test_over_budget_request_raises(app, client):
+    @app.route("/_test/over-budget")
+    @query_budget(1)
+    def over_budget():
+        User.query.count()
+        User.query.count()
+        return "", 204
+
+    with pytest.raises(QueryBudgetExceeded, match="2 queries, budget 1"):
+        client.get("/_test/over-budget")
+
+
+def test_repeated_statement_raises(app, client):
+    @app.route("/_test/n-plus-one")
+    @query_budget(50, max_repeats=3)
+    def n_plus_one():
+        for user_id in range(5):
+            db.session.get(User, user_id)
+        return "", 204
+
+    with pytest.raises(QueryBudgetExceeded, match="likely N\\+1"):
+        client.get("/_test/n-plus-one")
+
+
+def test_n_plus_one_in_streamed_body_raises(app, client):
+    @app.route("/_test/streamed-n-plus-one")
+    @query_budget(50, max_repeats=3)
+    def streamed_n_plus_one():
+        def generate():
+            for user_id in range(5):
+                db.session.get(User, user_id)
+                yield f"{user_id}\n"
+        return Response(stream_with_context(generate()))
+
+    response = client.get("/_test/streamed-n-plus-one")
+    response.get_data()
+    with pytest.raises(QueryBudgetExceeded, match="likely N\\+1"):
+        response.close()
+
+
+@pytest.mark.file_db
+def test_parallel_queries_count_towards_the_request(app, client):
+    @app.route("/_test/parallel")
+    @query_budget(1)
+    def parallel():
+        parallel_queries.run(first=lambda: User.query.count(), second=lambda: User.query.count())
+        return "", 204
+
+    with pytest.raises(QueryBudgetExceeded, match="2 queries, budget 1"):
+        client.get("/_test/parallel")
+
+
+def test_uncounted_statements_are_not_counted(app):
+    with app.test_request_context("/"):
+        app.preprocess_request()
+        connection = db.session.connection()
+        connection.info["uncounted_statement"] = True
+        connection.exec_driver_sql("SELECT 1")
+        connection.info.pop("uncounted_statement")
+        connection.exec_driver_sql("SELECT 2")
+        assert g.db_stats.queries == 1
+        assert list(g.db_stats.statements) == ["SELECT 2"]
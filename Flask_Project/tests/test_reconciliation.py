@@ -0,0 +1,97 @@
+import pytest
+
+from app.models import PaymentRequest, Shipment
+
+from .conftest import book_shipment
+
+
+@pytest.fixture
+def payments(app, client):
+    """Pending payments, one per shipment, keyed by a label; several share a UTR on purpose."""
+    response = client.post("/api/auth/signup", json={
+        "first_name": "Pat", "last_name": "Lee", "email": "pat@example.com", "password": "secret1",
+    })
+    assert response.status_code == 201, response.get_json()
+    utrs = {"exact": "100000000001", "short": "100000000002", "twice_in_statement": "100000000003",
+            "shared_a": "100000000004", "shared_b": "100000000004", "missing": "100000000006"}
+    ids = {}
+    for label, utr in utrs.items():
+        shipment_id_str = book_shipment(client, "pat@example.com")
+        response = client.post("/api/payments", json={"shipment_id_str": shipment_id_str, "utr": utr, "amount": 1180})
+        assert response.status_code == 201, response.get_json()
+        ids[label] = response.get_json()["payment_id"]
+    return ids
+
+
+def reconcile(client, statement, dry_run=False):
+    response = client.post("/api/admin/payments/reconcile" + ("?dry_run=true" if dry_run else ""),
+                           data=statement, content_type="text/csv")
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+def statuses(app):
+    with app.app_context():
+        return dict(PaymentRequest.query.with_entities(PaymentRequest.id, PaymentRequest.status))
+
+
+STATEMENT = "\n".join([
+    "Date,Reference No,Credit Amount",
+    "2026-10-19,100000000001,\"₹1,180.00\"",
+    "2026-10-19,100000000002,1100",
+    "2026-10-19,100000000003,1180",
+    "2026-10-19,100000000003,1180",
+    "2026-10-19,100000000004,1180",
+    "2026-10-19,999999999999,not a number",
+])
+
+
+def test_edge_cases_are_flagged_and_only_exact_matches_approved(app, client, payments):
+    report = reconcile(client, STATEMENT)
+
+    assert [m["payment_id"] for m in report["matched"]] == [payments["exact"]]
+    reasons = {f["payment_id"]: f["reason"] for f in report["flagged"]}
+    assert reasons[payments["short"]].startswith("Amount mismatch")
+    assert reasons[payments["twice_in_statement"]] == "UTR appears more than once in the statement"
+    assert reasons[payments["shared_a"]] == reasons[payments["shared_b"]] == \
+        "UTR was submitted for more than one pending payment"
+    assert report["summary"] == {"pending": 6, "approved": 1, "matched": 1, "flagged": 4, "unmatched": 1}
+    assert report["statement"]["duplicate_utrs"] == ["100000000003"]
+    assert len(report["statement"]["errors"]) == 1
+
+    current = statuses(app)
+    assert current.pop(payments["exact"]) == "Approved"
+    assert set(current.values()) == {"Pending"}
+    with app.app_context():
+        booked = Shipment.query.join(PaymentRequest, PaymentRequest.shipment_id == Shipment.id).filter(
+            PaymentRequest.id == payments["exact"]
+        ).one()
+        assert booked.status == "Booked"
+
+
+def test_dry_run_changes_nothing(app, client, payments):
+    before = statuses(app)
+    report = reconcile(client, STATEMENT, dry_run=True)
+    assert report["summary"]["matched"] == 1
+    assert report["summary"]["approved"] == 0
+    assert statuses(app) == before
+
+
+def test_utr_reused_after_approval_is_flagged(app, client, payments):
+    reconcile(client, STATEMENT)
+    response = client.post("/api/payments", json={
+        "shipment_id_str": book_shipment(client, "pat@example.com"), "utr": "100000000001", "amount": 1180,
+    })
+    reused = response.get_json()["payment_id"]
+
+    report = reconcile(client, "utr,amount\n100000000001,1180")
+    assert report["matched"] == []
+    reasons = {f["payment_id"]: f["reason"] for f in report["flagged"]}
+    assert reasons[reused] == "UTR was already approved for another payment"
+    assert statuses(app)[reused] == "Pending"
+
+
+def test_statement_without_usable_columns_is_rejected(client, payments):
+    response = client.post("/api/admin/payments/reconcile", data="date,narration\n2026-10-19,x",
+                           content_type="text/csv")
+    assert response.status_code == 400
@@ -0,0 +1,65 @@
+import json
+
+from app.models import DailyLaneRollup, DailyShipmentRollup, DailyUserRollup
+from app.services.analytics_service import rebuild_rollups
+
+from .conftest import USER_EMAILS, book_shipment, desktop_transaction
+
+
+def rollup_rows():
+    """Every rollup row with a non-zero counter; incremental maintenance can leave emptied rows behind."""
+    rows = {}
+    for model, keys in ((DailyShipmentRollup, ("day", "status", "service_type")),
+                        (DailyLaneRollup, ("day", "origin_city", "destination_city", "destination_country")),
+                        (DailyUserRollup, ("day",))):
+        counters = [c.name for c in model.__table__.columns if c.name not in keys]
+        rows[model.__tablename__] = {
+            tuple(getattr(row, k) for k in keys): tuple(getattr(row, c) for c in counters)
+            for row in model.query if any(getattr(row, c) for c in counters)
+        }
+    return rows
+
+
+def test_incremental_rollups_match_a_rebuild(app, client, seeded):
+    payer = seeded["payer"]
+    new_ids = [book_shipment(client, payer, receiver_address_city="Mumbai", package_weight_kg=5,
+                             final_total_price_with_tax=2360) for _ in range(2)]
+    for n, shipment_id_str in enumerate(new_ids):
+        response = client.post("/api/payments", json={
+            "shipment_id_str": shipment_id_str, "utr": f"{500 + n:012d}", "amount": 2360,
+        })
+        assert response.status_code == 201, response.get_json()
+
+    response = client.post("/api/admin/payments/reconcile", data=f"utr,amount\n{500:012d},2360",
+                           content_type="text/csv")
+    assert response.status_code == 200, response.get_json()
+    response = client.put("/api/admin/payments/status",
+                          json={"status": "Rejected", "payment_ids": seeded["payment_ids"][2:3]})
+    assert response.status_code == 200, response.get_json()
+
+    response = client.put(f"/api/admin/shipments/{new_ids[0]}/status", json={"status": "Delivered"})
+    assert response.status_code == 200, response.get_json()
+    response = client.put(f"/api/admin/shipments/{seeded['shipments'][USER_EMAILS[1]][0]}/status",
+                          json={"status": "Cancelled"})
+    assert response.status_code == 200, response.get_json()
+
+    scans = "\n".join(json.dumps({"shipment_id_str": s, "status": "Out for Delivery"})
+                      for s in seeded["shipments"][USER_EMAILS[2]][:2])
+    response = client.post("/api/admin/scans", data=scans, content_type="application/x-ndjson")
+    response.get_data()
+    response.close()
+
+    response = client.post("/api/create-invoice-from-payment", json=desktop_transaction(40))
+    assert response.status_code == 201, response.get_json()
+    response = client.post(f"/api/admin/users/{seeded['placeholder_ids'][0]}/upgrade", json={
+        "first_name": "Desk", "last_name": "Sender", "email": "desk@example.com", "password": "secret1",
+    })
+    assert response.status_code == 200, response.get_json()
+
+    with app.app_context():
+        maintained = rollup_rows()
+        rebuild_rollups()
+        rebuilt = rollup_rows()
+
+    assert all(maintained.values())
+    assert maintained == rebuilt
@@ -0,0 +1,49 @@
+import pytest
+from sqlalchemy import inspect
+
+from app import create_app
+from app.extensions import db
+from app.models import User
+from app.services.search_service import search_index
+
+
+def search_users(q):
+    return [u.email for u in search_index.filter(User.query, User, q)]
+
+
+@pytest.mark.file_db
+def test_update_is_indexed_when_it_commits(app):
+    with app.app_context():
+        db.session.add(User(first_name="Patricia", last_name="Lee", email="pat@example.com"))
+        db.session.commit()
+        assert search_users("patricia") == ["pat@example.com"]
+
+        db.session.get(User, 1).first_name = "Zelda"
+        db.session.flush()
+        # Another request searches before the update commits, reading the old row
+        with app.app_context():
+            assert search_users("patricia") == ["pat@example.com"]
+        db.session.commit()
+
+        assert search_users("zelda") == ["pat@example.com"]
+        assert search_users("patricia") == []
+
+
+def test_rolled_back_update_leaves_the_index(app):
+    with app.app_context():
+        db.session.add(User(first_name="Patricia", last_name="Lee", email="pat@example.com"))
+        db.session.commit()
+        search_users("patricia")
+
+        db.session.get(User, 1).first_name = "Zelda"
+        db.session.flush()
+        db.session.rollback()
+        assert search_index.backend._stale[User] == set()
+        assert search_users("patricia") == ["pat@example.com"]
+
+
+def test_listeners_are_registered_once(app):
+    listeners = len(inspect(User).dispatch.after_update)
+    create_app("testing")
+    create_app("testing")
+    assert len(inspect(User).dispatch.after_update) == listeners
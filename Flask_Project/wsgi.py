@@ -0,0 +1,15 @@
+import os
+import sys
+
+# This is important to ensure the app can be found by the WSGI server
+project_home = os.path.dirname(os.path.abspath(__file__))
+if project_home not in sys.path:
+    sys.path.insert(0, project_home)
+
+from app import create_app
+
+# WSGI entry point for production servers (gunicorn via serve.py, uWSGI, PythonAnywhere).
+# run.py stays the development entry point.
+# create_app warms up (rate cards, first connection, gc.freeze) before returning, so with
+# preload_app the master does this once and the forked workers share the result
+app = create_app(os.environ.get("APP_CONFIG", "production"))
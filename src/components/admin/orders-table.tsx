@@ -8,6 +8,7 @@ import { Input } from "@/components/ui/input";
 import { Select, SelectContent, SelectItem, SelectTrigger, SelectValue } from "@/components/ui/select";
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from "@/components/ui/card";
 import { useToast } from "@/hooks/use-toast";
+import { apiFetch } from "@/lib/api-client";
 import { DropdownMenu, DropdownMenuContent, DropdownMenuItem, DropdownMenuLabel, DropdownMenuTrigger } from "@/components/ui/dropdown-menu";
 import { MoreHorizontal, Loader2, Search, Download, ListOrdered, Filter } from "lucide-react";
 
@@ -57,7 +58,7 @@ export default function OrdersTable() {
       if (query) url.searchParams.append("q", query);
       if (status) url.searchParams.append("status", status);
       
-      const response = await fetch(url.toString());
+      const response = await apiFetch(url.toString());
       if (!response.ok) throw new Error("Failed to fetch shipments");
       const result: ApiResponse = await response.json();
 
@@ -93,7 +94,7 @@ export default function OrdersTable() {
 
     setUpdatingStatusId(shipment.id);
     try {
-      const response = await fetch(`https://www.server.shedloadoverseas.com/api/admin/shipments/${shipmentIdStr}/status`, {
+      const response = await apiFetch(`https://www.server.shedloadoverseas.com/api/admin/shipments/${shipmentIdStr}/status`, {
         method: 'PUT',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ status, location: "Admin Panel", activity: `Status updated to ${status} by admin.` }),
@@ -118,7 +119,7 @@ export default function OrdersTable() {
         if (appliedFilters.q) url.searchParams.append("q", appliedFilters.q);
         if (appliedFilters.status) url.searchParams.append("status", appliedFilters.status);
 
-        const response = await fetch(url.toString());
+        const response = await apiFetch(url.toString());
         if (!response.ok) throw new Error("Failed to fetch data for export");
         const allData: ApiResponse = await response.json();
         
@@ -1,6 +1,26 @@
 
 import { API_BASE_URL } from './constants';
 
+// After a write the API returns its time in this header; sending it back for a
+// short while makes the API serve our reads from the primary database instead of a
+// replica that may not have the write yet.
+const READ_AFTER_HEADER = 'X-Read-After';
+const READ_AFTER_WINDOW_MS = 60_000;
+let readAfter: { value: string; receivedAt: number } | null = null;
+
+export async function apiFetch(input: string, init: RequestInit = {}): Promise<Response> {
+  const headers = new Headers(init.headers || {});
+  if (readAfter && Date.now() - readAfter.receivedAt < READ_AFTER_WINDOW_MS) {
+    headers.set(READ_AFTER_HEADER, readAfter.value);
+  }
+  const response = await fetch(input, { ...init, headers });
+  const value = response.headers.get(READ_AFTER_HEADER);
+  if (value) {
+    readAfter = { value, receivedAt: Date.now() };
+  }
+  return response;
+}
+
 async function apiClient<T>(
   endpoint: string,
   options: RequestInit = {}
@@ -8,7 +28,7 @@ async function apiClient<T>(
   const headers = new Headers(options.headers || {});
   headers.set('Content-Type', 'application/json');
 
-  const response = await fetch(`${API_BASE_URL}${endpoint}`, {
+  const response = await apiFetch(`${API_BASE_URL}${endpoint}`, {
     ...options,
     headers,
   });